@@ -0,0 +1,122 @@
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+# pChEMBL values are published with two decimals, so a 0.01-wide histogram
+# gives exact order statistics in constant memory.
+PCHEMBL_RESOLUTION = 0.01
+PCHEMBL_MAX = 20.0
+_BINS = int(round(PCHEMBL_MAX / PCHEMBL_RESOLUTION)) + 1
+
+# Fields the aggregator reads; used to project upstream pages
+ACTIVITY_FIELDS = ('molecule_chembl_id', 'standard_type', 'pchembl_value')
+
+
+class _Summary:
+    """Histogram-backed count/min/median/max accumulator"""
+
+    def __init__(self):
+        self.rows = 0
+        self.actives = 0
+        self.histogram = np.zeros(_BINS, dtype=np.int64)
+
+    def add(self, rows: int, bins: np.ndarray, actives: int):
+        self.rows += rows
+        self.actives += actives
+        if bins.size:
+            self.histogram += np.bincount(bins, minlength=_BINS)
+
+    def _order_statistic(self, cumulative: np.ndarray, k: int) -> float:
+        return float(np.searchsorted(cumulative, k, side='right')) * PCHEMBL_RESOLUTION
+
+    def result(self) -> Dict[str, Any]:
+        cumulative = np.cumsum(self.histogram)
+        n = int(cumulative[-1])
+        summary = {'count': self.rows, 'pchembl_count': n, 'active_count': self.actives,
+                   'pchembl_min': None, 'pchembl_median': None, 'pchembl_max': None}
+        if n:
+            nonzero = np.flatnonzero(self.histogram)
+            lower = self._order_statistic(cumulative, (n - 1) // 2)
+            upper = self._order_statistic(cumulative, n // 2)
+            summary['pchembl_min'] = round(float(nonzero[0]) * PCHEMBL_RESOLUTION, 2)
+            summary['pchembl_median'] = round((lower + upper) / 2, 3)
+            summary['pchembl_max'] = round(float(nonzero[-1]) * PCHEMBL_RESOLUTION, 2)
+        return summary
+
+
+class ActivityAggregator:
+    """Fold activity records page by page into summary statistics
+
+    Memory is bounded by the number of distinct standard types and molecules,
+    never by the number of activity rows.
+
+    Args:
+        active_threshold: pChEMBL value at or above which an activity counts as active
+    """
+
+    def __init__(self, active_threshold: float = 6.0):
+        self.active_threshold = active_threshold
+        self.pages = 0
+        self.overall = _Summary()
+        self.by_type: Dict[str, _Summary] = {}
+        self.best_by_molecule: Dict[str, float] = {}
+
+    def add_page(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        self.pages += 1
+        values = np.array([_to_float(r.get('pchembl_value')) for r in records], dtype=np.float64)
+        types = np.array([r.get('standard_type') or 'UNKNOWN' for r in records], dtype=object)
+        valid = ~np.isnan(values)
+        bins = np.clip(np.rint(values[valid] / PCHEMBL_RESOLUTION), 0, _BINS - 1).astype(np.int64)
+        active = valid & (np.nan_to_num(values, nan=-np.inf) >= self.active_threshold)
+        self.overall.add(len(records), bins, int(active.sum()))
+
+        unique_types, inverse = np.unique(types.astype(str), return_inverse=True)
+        valid_inverse = inverse[valid]
+        for i, standard_type in enumerate(unique_types):
+            summary = self.by_type.setdefault(standard_type, _Summary())
+            summary.add(int(np.count_nonzero(inverse == i)), bins[valid_inverse == i],
+                        int(np.count_nonzero(active[inverse == i])))
+
+        best = self.best_by_molecule
+        for record, value in zip(records, values):
+            molecule = record.get('molecule_chembl_id')
+            if molecule is None or np.isnan(value):
+                continue
+            if value > best.get(molecule, -np.inf):
+                best[molecule] = float(value)
+
+    def add_pages(self, pages: Iterable[List[Dict[str, Any]]]) -> 'ActivityAggregator':
+        for page in pages:
+            self.add_page(page)
+        return self
+
+    def result(self, top_n: int = 20) -> Dict[str, Any]:
+        """Return the aggregate summary
+
+        Args:
+            top_n: Number of molecules with the best pChEMBL value to include
+
+        Returns:
+            Dictionary with overall statistics, a per-standard_type breakdown
+            and the best value per molecule for the top_n molecules
+        """
+        ranked = sorted(self.best_by_molecule.items(), key=lambda item: item[1], reverse=True)
+        result = self.overall.result()
+        result.update({
+            'pages': self.pages,
+            'active_threshold': self.active_threshold,
+            'molecule_count': len(self.best_by_molecule),
+            'by_standard_type': {t: s.result() for t, s in sorted(self.by_type.items())},
+            'top_molecules': [{'molecule_chembl_id': m, 'best_pchembl_value': v} for m, v in ranked[:top_n]],
+        })
+        return result
+
+
+def _to_float(value: Optional[Any]) -> float:
+    if value is None or value == '':
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
@@ -0,0 +1,251 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Alert definitions file read by the local engine; set from the server command line
+alerts_path = os.path.join(tempfile.gettempdir(), 'chembl_alerts.json')
+
+# Whether example_structuralAlerts screens locally instead of calling the utils service; set from the server command line
+local_single = False
+
+# Fields of an alert returned for a match, as by the ChEMBL utils structuralAlerts service
+ALERT_FIELDS = ('alert_id', 'alert_name', 'set_name', 'smarts')
+
+# Molecules held in one substructure library while a batch is screened
+LIBRARY_SIZE = 10000
+
+# Batches at least this large are screened with a multi-threaded substructure library
+MIN_LIBRARY_BATCH = 64
+
+_ALERTS_QUERY = """
+    SELECT a.alert_id, a.alert_name, s.set_name, s.priority, a.smarts
+    FROM structural_alerts a JOIN structural_alert_sets s ON s.alert_set_id = a.alert_set_id
+    ORDER BY a.alert_id
+"""
+
+
+def _rdkit():
+    try:
+        from rdkit import Chem, RDLogger
+        from rdkit.Chem import rdSubstructLibrary
+    except ImportError:
+        raise ImportError("Local structural alert screening requires RDKit; install it with 'pip install rdkit'")
+    RDLogger.DisableLog('rdApp.*')
+    return Chem, rdSubstructLibrary
+
+
+def rdkit_available() -> bool:
+    try:
+        _rdkit()
+    except ImportError:
+        return False
+    return True
+
+
+def alerts_from_sqlite(path: str) -> Dict[str, Any]:
+    """Read the structural alert sets from a ChEMBL SQLite release dump, e.g. chembl_35.db
+
+    Returns:
+        Alerts document with the release and one entry per alert
+    """
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        connection.row_factory = sqlite3.Row
+        alerts = [dict(row) for row in connection.execute(_ALERTS_QUERY)]
+        try:
+            release = connection.execute("SELECT name FROM version").fetchone()[0]
+        except sqlite3.Error:
+            release = None
+    finally:
+        connection.close()
+    return {'release': release, 'built': time.time(), 'alerts': alerts}
+
+
+def write_alerts(path: str, document: Dict[str, Any]):
+    """Write an alerts document atomically"""
+    partial = path + '.part'
+    with open(partial, 'w') as f:
+        json.dump(document, f)
+    os.replace(partial, path)
+
+
+class AlertEngine:
+    """Screens molecules against structural alert SMARTS patterns compiled once
+
+    Single molecules are matched pattern by pattern. Batches are loaded into
+    RDKit substructure libraries of LIBRARY_SIZE molecules, which screen
+    each pattern with substructure fingerprints before matching and match
+    on all cores outside the GIL. Matches are reported like the ChEMBL utils
+    structuralAlerts service: one entry per matching alert, in alert order.
+
+    Args:
+        alerts: Alert definitions with alert_id, alert_name, set_name and smarts
+        release: ChEMBL release the alerts were taken from
+    """
+
+    def __init__(self, alerts: Iterable[Dict[str, Any]], release: Optional[str] = None):
+        Chem, _ = _rdkit()
+        self.release = release
+        self.alerts: List[Dict[str, Any]] = []
+        self.patterns = []
+        self.invalid: List[Dict[str, Any]] = []
+        for alert in alerts:
+            pattern = Chem.MolFromSmarts(alert['smarts'])
+            if pattern is None:
+                self.invalid.append({field: alert.get(field) for field in ALERT_FIELDS})
+                continue
+            self.alerts.append({field: alert.get(field) for field in ALERT_FIELDS})
+            self.patterns.append(pattern)
+        if self.invalid:
+            logging.warning(f"Skipped {len(self.invalid)} structural alerts whose SMARTS RDKit cannot parse")
+
+    @classmethod
+    def load(cls, path: str) -> 'AlertEngine':
+        with open(path) as f:
+            document = json.load(f)
+        return cls(document['alerts'], document.get('release'))
+
+    def _selected(self, sets: Optional[Sequence[str]]) -> List[int]:
+        if not sets:
+            return list(range(len(self.alerts)))
+        known = {alert['set_name'] for alert in self.alerts}
+        unknown = [name for name in sets if name not in known]
+        if unknown:
+            raise ValueError(f"Unknown alert set(s) {', '.join(unknown)}; sets are {', '.join(sorted(known))}")
+        return [i for i, alert in enumerate(self.alerts) if alert['set_name'] in sets]
+
+    def screen(self, smiles: str, sets: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Alerts matched by one molecule
+
+        Args:
+            smiles: SMILES string
+            sets: Alert sets to screen against, e.g. ['PAINS', 'Glaxo'] (all sets if omitted)
+
+        Returns:
+            List of matching alerts with alert_id, alert_name, set_name and smarts
+        """
+        Chem, _ = _rdkit()
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            raise ValueError(f"Invalid SMILES: {smiles!r}")
+        return [dict(self.alerts[i]) for i in self._selected(sets) if mol.HasSubstructMatch(self.patterns[i])]
+
+    def screen_many(self, smiles: Sequence[str], sets: Optional[Sequence[str]] = None,
+                    threads: int = -1) -> List[Dict[str, Any]]:
+        """Alerts matched by each of a batch of molecules
+
+        Args:
+            smiles: SMILES strings
+            sets: Alert sets to screen against (all sets if omitted)
+            threads: Threads matching each pattern; -1 uses every core
+
+        Returns:
+            One entry per SMILES, in input order, with smiles and either alerts or error
+        """
+        selected = self._selected(sets)
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(smiles), LIBRARY_SIZE):
+            results.extend(self._screen_library(smiles[start:start + LIBRARY_SIZE], selected, threads))
+        return results
+
+    def _screen_library(self, smiles: Sequence[str], selected: List[int], threads: int) -> List[Dict[str, Any]]:
+        Chem, rdSubstructLibrary = _rdkit()
+        results = [{'smiles': s, 'alerts': []} for s in smiles]
+        mols = []
+        for result in results:
+            mol = Chem.MolFromSmiles(result['smiles'])
+            if mol is None:
+                result['error'] = 'Invalid SMILES'
+                del result['alerts']
+            else:
+                mols.append((result, mol))
+        if len(mols) < MIN_LIBRARY_BATCH:
+            for result, mol in mols:
+                result['alerts'] = [dict(self.alerts[i]) for i in selected if mol.HasSubstructMatch(self.patterns[i])]
+            return results
+        library = rdSubstructLibrary.SubstructLibrary(rdSubstructLibrary.MolHolder(),
+                                                      rdSubstructLibrary.PatternHolder())
+        for _, mol in mols:
+            library.AddMol(mol)
+        for i in selected:
+            # HasSubstructMatch ignores stereochemistry by default, and so does the utils service
+            for index in library.GetMatches(self.patterns[i], useChirality=False, numThreads=threads,
+                                            maxResults=len(mols)):
+                mols[index][0]['alerts'].append(dict(self.alerts[i]))
+        return results
+
+    def info(self) -> Dict[str, Any]:
+        sets: Dict[str, int] = {}
+        for alert in self.alerts:
+            sets[alert['set_name']] = sets.get(alert['set_name'], 0) + 1
+        return {'release': self.release, 'alerts': len(self.alerts), 'sets': sets,
+                'invalid_smarts': len(self.invalid)}
+
+
+_engine: Optional[AlertEngine] = None
+_engine_lock = threading.Lock()
+
+
+def local_alerts_available() -> bool:
+    """Whether example_structuralAlerts screens locally: opted in, RDKit is installed and the alerts file exists"""
+    return local_single and os.path.exists(alerts_path) and rdkit_available()
+
+
+def get_engine() -> AlertEngine:
+    """Return the engine for alerts_path, compiling its patterns on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            if not os.path.exists(alerts_path):
+                raise FileNotFoundError(f"No structural alerts file at {alerts_path}; build it from a ChEMBL "
+                                        f"SQLite dump with: python chembl_alerts.py --from-sqlite chembl_XX.db "
+                                        f"--output {alerts_path}")
+            _engine = AlertEngine.load(alerts_path)
+            logging.info(f"Compiled {len(_engine.alerts)} structural alerts from {alerts_path}")
+        return _engine
+
+
+def _read_smiles(path: str) -> Iterator[str]:
+    # One molecule per line; anything after the SMILES, such as an ID, is ignored
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields and not fields[0].startswith('#'):
+                yield fields[0]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Build the structural alerts file of the ChEMBL MCP server, or screen a library against it')
+    parser.add_argument('--from-sqlite', type=str, default=None, help='ChEMBL SQLite dump to read the alert sets from')
+    parser.add_argument('--output', type=str, default=None, help='Alerts file to write, or JSON-lines results of --screen (default: stdout)')
+    parser.add_argument('--alerts', type=str, default=alerts_path, help='Alerts file to screen against')
+    parser.add_argument('--screen', type=str, default=None, help='SMILES file to screen, one molecule per line')
+    parser.add_argument('--sets', type=str, nargs='*', default=None, help='Alert sets to screen against (default: all)')
+    parser.add_argument('--threads', type=int, default=-1, help='Threads used for screening (default: every core)')
+    args = parser.parse_args()
+    if args.from_sqlite:
+        document = alerts_from_sqlite(args.from_sqlite)
+        write_alerts(args.output or alerts_path, document)
+        logging.info(f"Wrote {len(document['alerts'])} structural alerts of {document['release']} to {args.output or alerts_path}")
+    elif args.screen:
+        engine = AlertEngine.load(args.alerts)
+        library = list(_read_smiles(args.screen))
+        started = time.time()
+        results = engine.screen_many(library, args.sets, args.threads)
+        out = open(args.output, 'w') if args.output else None
+        try:
+            for result in results:
+                print(json.dumps(result), file=out)
+        finally:
+            if out is not None:
+                out.close()
+        logging.info(f"Screened {len(library)} molecules against {len(engine.alerts)} alerts in {time.time() - started:.1f} seconds")
+    else:
+        parser.error("Give --from-sqlite to build the alerts file or --screen to screen a library")
@@ -0,0 +1,322 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import fnmatch
+import json
+import logging
+import threading
+import time
+from chembl_metrics import Counters
+from chembl_shared_cache import SharedCache, wall_clock
+
+# Returned by Cache.lookup for keys without a live entry
+MISSING = object()
+
+# Background refreshes of stale entries
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache_refresh')
+
+# Writes to the shared tier, in the order entries were set, off the caller's thread
+_share_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache_share')
+
+# expires (monotonic), value, release, stored (monotonic)
+Entry = Tuple[float, Any, Optional[str], float]
+
+
+def key_group(key: Hashable) -> str:
+    """Tool or entity an entry belongs to, e.g. 'example_drug' or 'molecule'"""
+    if not isinstance(key, tuple) or not key:
+        return type(key).__name__
+    if key[0] == 'tool' and len(key) > 1:
+        return str(key[1])
+    return str(key[0])
+
+
+def key_text(key: Hashable) -> str:
+    """Readable form of a key that purge patterns are matched against
+
+    e.g. "example_drug [('molecule_chembl_id', 'CHEMBL25')]" or "molecule molecule_chembl_id CHEMBL25 None"
+    """
+    if not isinstance(key, tuple):
+        return repr(key)
+    if key and key[0] == 'tool':
+        key = key[1:]
+    return ' '.join(str(part) for part in key)
+
+
+class Cache:
+    """Thread-safe in-memory LRU cache with per-entry expiry and release stamps
+
+    Keys are tuples whose first element names the entity or tool the entry
+    belongs to, e.g. ('molecule', 'molecule_chembl_id', 'CHEMBL25', None).
+    Every entry is stamped with the ChEMBL release current when it was
+    stored. After set_release() switches to a new release, entries of the
+    old release stay readable but are stale: get_or_fetch serves them while
+    refreshing them in the background.
+
+    With a shared tier set, entries are also written to it and local misses
+    are looked up there, so server processes on one host fetch an entry
+    once. Entries read from the shared tier keep their expiry and release.
+
+    Args:
+        maxsize: Maximum number of entries
+        ttl: Default time to live in seconds
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 24 * 60 * 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.release: Optional[str] = None
+        self._entries: 'OrderedDict[Hashable, Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, threading.Lock] = {}
+        self._refreshing: Set[Hashable] = set()
+        self.shared: Optional[SharedCache] = None
+        self.counters = Counters()
+
+    def lookup(self, key: Hashable, max_stale: float = 0, count: bool = True) -> Tuple[Any, bool]:
+        """Return (value, current) for key; value is MISSING without a live entry
+
+        current is False for entries stored under an earlier release and for
+        entries that expired less than max_stale seconds ago. Unless count is
+        False, the lookup is counted as a hit, stale hit or miss of the key's group.
+        """
+        value, current = self._lookup(key, max_stale)
+        if count:
+            event = 'miss' if value is MISSING else 'hit' if current else 'stale_hit'
+            self.counters.increment(key_group(key), event)
+        return value, current
+
+    def _lookup(self, key: Hashable, max_stale: float) -> Tuple[Any, bool]:
+        local = (MISSING, False)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                local = self._check(key, entry, max_stale)
+        if local[1] or self.shared is None:
+            return local
+        # Another process may have stored the entry, or refreshed it for the current release
+        found = self.shared.get(key, not_before=time.time() - max_stale)
+        if found is None:
+            return local
+        expires, release, value = found
+        now = time.monotonic()
+        entry = (now + expires - time.time(), value, release, now)
+        with self._lock:
+            if local[0] is not MISSING and not (release == self.release and entry[0] >= now):
+                return local
+            self._store(key, entry)
+            return self._check(key, entry, max_stale)
+
+    def _check(self, key: Hashable, entry: Entry, max_stale: float) -> Tuple[Any, bool]:
+        expires, value, release, _ = entry
+        now = time.monotonic()
+        if expires + max_stale < now:
+            del self._entries[key]
+            return MISSING, False
+        self._entries.move_to_end(key)
+        return value, release == self.release and expires >= now
+
+    def _store(self, key: Hashable, entry: Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value, _ = self.lookup(key)
+        return default if value is MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        now = time.monotonic()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, (expires, value, self.release, now))
+            release = self.release
+        if self.shared is not None:
+            _share_executor.submit(self.shared.put, key, value, wall_clock(expires), release)
+
+    def set_release(self, release: str) -> int:
+        """Switch to a new ChEMBL release
+
+        Returns:
+            Number of entries that became stale
+        """
+        with self._lock:
+            if release == self.release:
+                return 0
+            self.release = release
+            return sum(1 for _, _, entry_release, _ in self._entries.values() if entry_release != release)
+
+    def carry_over(self, groups: Set[str], changed: Set[Tuple[Hashable, ...]], previous: Optional[str],
+                   release: str) -> Tuple[int, int]:
+        """Move entries of groups stored under release previous to release, dropping changed ones
+
+        Used when a change feed lists every record of groups that differs
+        between the two releases: entries it does not touch are still
+        correct and need no refresh.
+
+        Args:
+            groups: First key elements of the entries to carry over, e.g. {'molecule', 'mechanism'}
+            changed: First three key elements of entries to drop, e.g. ('mechanism', 'molecule_chembl_id', 'CHEMBL25')
+            previous: Release the feed starts from
+            release: Release the feed leads to
+
+        Returns:
+            Numbers of entries carried over and dropped
+        """
+        carried = dropped = 0
+        with self._lock:
+            for key, (expires, value, entry_release, stored) in list(self._entries.items()):
+                if entry_release != previous or not isinstance(key, tuple) or key[0] not in groups:
+                    continue
+                if key[:3] in changed:
+                    del self._entries[key]
+                    dropped += 1
+                else:
+                    self._entries[key] = (expires, value, release, stored)
+                    carried += 1
+        return carried, dropped
+
+    def refresh_in_background(self, key: Hashable, fetch: Callable[[], Any]):
+        """Run fetch on the refresh pool unless a refresh for key is already running
+
+        fetch is expected to store its results itself. Refreshes do not
+        inherit the caller's deadline.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                fetch()
+            except Exception as e:
+                logging.warning(f"Background refresh of {key!r} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        _refresh_executor.submit(refresh)
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value for key, calling fetch once on a miss
+
+        Concurrent callers missing on the same key wait for the first one's
+        fetch instead of issuing duplicate upstream requests. Entries of an
+        earlier release are returned as they are and refreshed in the background.
+        """
+        value, current = self.lookup(key)
+        if value is not MISSING:
+            if not current:
+                self.refresh_in_background(key, lambda: self.set(key, fetch(), ttl))
+            return value
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        with key_lock:
+            value, _ = self.lookup(key, count=False)
+            if value is MISSING:
+                value = fetch()
+                self.set(key, value, ttl)
+        with self._lock:
+            if self._inflight.get(key) is key_lock and not key_lock.locked():
+                del self._inflight[key]
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _matching(self, pattern: Optional[str], release: Optional[str]) -> List[Tuple[Hashable, Entry]]:
+        with self._lock:
+            items = list(self._entries.items())
+        return [(key, entry) for key, entry in items
+                if (pattern is None or fnmatch.fnmatchcase(key_text(key), pattern))
+                and (release is None or entry[2] == release)]
+
+    def entries(self, pattern: Optional[str] = None, release: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Describe the entries matching pattern and release, most recently used first
+
+        Args:
+            pattern: Glob matched against key_text of each key, e.g. 'example_drug *' or '*CHEMBL25*'
+            release: Only entries stored under this release
+
+        Returns:
+            One dictionary per entry with group, key, release, current, age and
+            expires_in in seconds and bytes (size of its JSON encoding)
+        """
+        now = time.monotonic()
+        described = []
+        for key, (expires, value, entry_release, stored) in reversed(self._matching(pattern, release)):
+            described.append({
+                'group': key_group(key),
+                'key': key_text(key),
+                'release': entry_release,
+                'current': entry_release == self.release and expires >= now,
+                'age': round(now - stored, 1),
+                'expires_in': round(expires - now, 1),
+                'bytes': _size(value),
+            })
+        return described
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Entries, bytes, ages and lookup counts of each group"""
+        groups: Dict[str, Dict[str, Any]] = {}
+        for entry in self.entries():
+            group = groups.setdefault(entry['group'], {'entries': 0, 'current': 0, 'bytes': 0,
+                                                       'oldest_age': 0.0, 'newest_age': None})
+            group['entries'] += 1
+            group['current'] += entry['current']
+            group['bytes'] += entry['bytes']
+            group['oldest_age'] = max(group['oldest_age'], entry['age'])
+            group['newest_age'] = entry['age'] if group['newest_age'] is None else min(group['newest_age'], entry['age'])
+        for name, events in self.counters.snapshot().items():
+            group = groups.setdefault(name, {'entries': 0, 'current': 0, 'bytes': 0,
+                                             'oldest_age': None, 'newest_age': None})
+            lookups = sum(events.values())
+            group['lookups'] = events
+            group['hit_ratio'] = round(events.get('hit', 0) / lookups, 3) if lookups else None
+        return groups
+
+    def purge(self, pattern: Optional[str] = None, release: Optional[str] = None) -> int:
+        """Drop the entries matching pattern and release, here and in the shared tier
+
+        Without pattern and release every entry is dropped, and the shared
+        tier is cleared for all processes. Otherwise only the matching keys
+        this process holds are dropped from the shared tier.
+
+        Returns:
+            Number of entries dropped from this process
+        """
+        if pattern is None and release is None:
+            with self._lock:
+                purged = len(self._entries)
+                self._entries.clear()
+            if self.shared is not None:
+                _share_executor.submit(self.shared.clear)
+            return purged
+        purged = 0
+        for key, entry in self._matching(pattern, release):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    purged += 1
+            if self.shared is not None:
+                _share_executor.submit(self.shared.discard, key)
+        return purged
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _size(value: Any) -> int:
+    # Sizes are reported as the JSON encoding clients receive
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+# Cache shared by all tools of the server process. Entries are refreshed when
+# ChEMBL publishes a new release, so they can be kept for a long time.
+cache = Cache(ttl=30 * 24 * 60 * 60)
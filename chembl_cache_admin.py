@@ -0,0 +1,73 @@
+from typing import Any, Dict, Optional
+import asyncio
+import json
+import sys
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from chembl_warming import load_calls, CONCURRENCY, TOP_CALLS
+
+# Seconds between progress checks of warm --wait
+POLL_INTERVAL = 2.0
+
+
+async def call(session: ClientSession, tool: str, arguments: Optional[Dict[str, Any]] = None) -> Any:
+    """Call an admin tool and return its result, raising RuntimeError if the tool failed"""
+    result = await session.call_tool(tool, arguments or {})
+    if result.isError:
+        raise RuntimeError(' '.join(getattr(c, 'text', '') for c in result.content))
+    structured = result.structuredContent
+    if structured is None:
+        return json.loads(result.content[0].text)
+    return structured['result'] if set(structured) == {'result'} else structured
+
+
+async def run(url: str, command: str, args) -> Any:
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            if command == 'stats':
+                return await call(session, 'cache_stats')
+            if command == 'list':
+                return await call(session, 'cache_entries', {'pattern': args.pattern, 'release': args.release,
+                                                             'limit': args.limit})
+            if command == 'purge':
+                return await call(session, 'purge_cache', {'pattern': args.pattern, 'release': args.release})
+            if command == 'stop':
+                return await call(session, 'stop_warming')
+            # warm: read the calls here, so the file need not be on the server's host
+            calls = [{'tool': tool, 'arguments': arguments} for tool, arguments in load_calls(args.file, args.top)]
+            status = await call(session, 'warm_cache', {'calls': calls, 'top': args.top,
+                                                        'concurrency': args.concurrency})
+            while args.wait and status['running']:
+                await asyncio.sleep(POLL_INTERVAL)
+                status = (await call(session, 'cache_stats'))['warming']
+                print(f"{status['done']}/{status['calls']} calls warmed", file=sys.stderr)
+            return status
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect, purge and warm the cache of a running ChEMBL MCP server')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8000/mcp', help='Streamable HTTP endpoint of the server')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='Cache policies, counters and contents by tool and entity')
+    listing = commands.add_parser('list', help='List cached entries, most recently used first')
+    purge = commands.add_parser('purge', help='Drop cached entries; without --pattern and --release, all of them')
+    for subparser in (listing, purge):
+        subparser.add_argument('--pattern', type=str, default=None, help="Glob matched against entry keys, e.g. 'example_drug *'")
+        subparser.add_argument('--release', type=str, default=None, help='Only entries stored under this ChEMBL release')
+    listing.add_argument('--limit', type=int, default=100, help='Maximum number of entries listed')
+    warm = commands.add_parser('warm', help='Replay the most frequent calls of a query log, or the calls of a scenario')
+    warm.add_argument('file', type=str, help='Query log written with --query-log, or load test scenario')
+    warm.add_argument('--top', type=int, default=TOP_CALLS, help='Most calls replayed')
+    warm.add_argument('--concurrency', type=int, default=CONCURRENCY, help='Calls running at once')
+    warm.add_argument('--wait', action='store_true', help='Wait until the warm-up has finished')
+    commands.add_parser('stop', help='Cancel a running warm-up')
+    args = parser.parse_args()
+
+    try:
+        print(json.dumps(asyncio.run(run(args.url, args.command, args)), indent=2))
+    except RuntimeError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,152 @@
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import os
+import re
+import tempfile
+import uuid
+from chembl_schema import resource_schema
+from chembl_paging import iter_pages
+
+# Directory export files are written to; set from the server command line
+export_dir = os.path.join(tempfile.gettempdir(), 'chembl_exports')
+
+EXPORT_URI_PREFIX = 'chembl://exports/'
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Largest export file returned through its resource URI; larger ones are read from their local path
+MAX_RESOURCE_BYTES = 32 * 1024 * 1024
+
+_EXPORT_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Exports require pyarrow; install it with 'pip install pyarrow'")
+    return pyarrow
+
+
+def _arrow_type(pa, field_type: Optional[str]):
+    if field_type == 'integer':
+        return pa.int64()
+    if field_type in ('float', 'decimal'):
+        return pa.float64()
+    if field_type == 'boolean':
+        return pa.bool_()
+    return pa.string()
+
+
+def _convert(value: Any, arrow_type, pa) -> Any:
+    if value is None or value == '':
+        return None
+    try:
+        if arrow_type == pa.int64():
+            return int(value)
+        if arrow_type == pa.float64():
+            return float(value)
+        if arrow_type == pa.bool_():
+            return value if isinstance(value, bool) else str(value).lower() in ('1', 'true')
+    except (TypeError, ValueError):
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _arrow_schema(pa, resource: str, fields: Optional[List[str]], first_page: List[Dict[str, Any]]):
+    schema = resource_schema(resource) or {}
+    if fields:
+        names = list(fields)
+    elif schema:
+        names = list(schema)
+    else:
+        names = list(dict.fromkeys(k for record in first_page for k in record))
+    return pa.schema([pa.field(name, _arrow_type(pa, (schema.get(name) or {}).get('type'))) for name in names])
+
+
+def export_path(name: str) -> str:
+    """Return the path of an export file, rejecting names that escape export_dir"""
+    if not _EXPORT_NAME.match(name) or name.startswith('.'):
+        raise ValueError(f"Invalid export name: {name!r}")
+    return os.path.join(export_dir, name)
+
+
+def read_export(name: str) -> bytes:
+    """Return the contents of an export file no larger than MAX_RESOURCE_BYTES"""
+    path = export_path(name)
+    size = os.path.getsize(path)
+    if size > MAX_RESOURCE_BYTES:
+        raise ValueError(f"Export {name} is {size / 1e6:.1f} MB, more than the {MAX_RESOURCE_BYTES / 1e6:.0f} MB "
+                         f"served as a resource; read or memory-map it from {path} instead")
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def export_pages(resource: str, pages: Iterable[List[Dict[str, Any]]], fields: Optional[List[str]] = None,
+                 format: str = 'parquet') -> Dict[str, Any]:
+    """Write result pages to a columnar file one page at a time
+
+    Column types are derived from the resource schema; nested values are
+    stored as JSON strings. The file only appears under its final name once
+    completely written.
+
+    Args:
+        resource: Resource name the records belong to
+        pages: Iterable of record pages
+        fields: Columns to write (all schema fields if omitted)
+        format: 'parquet' or 'arrow' (Arrow IPC file)
+
+    Returns:
+        Dictionary with the resource URI, file path, row count and column schema
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format {format!r}; choose from {', '.join(FORMATS)}")
+    pa = _arrow()
+    os.makedirs(export_dir, exist_ok=True)
+    name = f"{resource}-{uuid.uuid4().hex[:12]}{FORMATS[format]}"
+    path = export_path(name)
+    partial = path + '.part'
+    rows = 0
+    writer = None
+    schema = None
+    try:
+        for page in pages:
+            if writer is None:
+                schema = _arrow_schema(pa, resource, fields, page)
+                if format == 'parquet':
+                    writer = pa.parquet.ParquetWriter(partial, schema)
+                else:
+                    writer = pa.ipc.new_file(partial, schema)
+            columns = [pa.array([_convert(record.get(f.name), f.type, pa) for record in page], type=f.type)
+                       for f in schema]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            rows += len(page)
+        if writer is None:
+            schema = _arrow_schema(pa, resource, fields, [])
+            writer = pa.parquet.ParquetWriter(partial, schema) if format == 'parquet' else pa.ipc.new_file(partial, schema)
+        writer.close()
+        os.replace(partial, path)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return {
+        'uri': EXPORT_URI_PREFIX + name,
+        'path': path,
+        'format': format,
+        'rows': rows,
+        'bytes': os.path.getsize(path),
+        'schema': [{'name': f.name, 'type': str(f.type)} for f in schema],
+    }
+
+
+def export_queryset(resource: str, queryset, fields: Optional[List[str]] = None,
+                    format: str = 'parquet') -> Dict[str, Any]:
+    """Stream every page of queryset into an export file; see export_pages"""
+    return export_pages(resource, iter_pages(queryset), fields, format)
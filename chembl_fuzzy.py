@@ -0,0 +1,300 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import chembl_settings  # applies CHEMBL_API_URL before the client loads its API description
+from chembl_webresource_client.new_client import new_client
+from chembl_paging import fetch_all
+from chembl_releases import current_release
+
+# Entities the index covers
+ENTITIES = ('compound', 'drug', 'target', 'indication')
+
+# Index file read by fuzzy_search; set from the server command line
+index_path = os.path.join(tempfile.gettempdir(), 'chembl_fuzzy_index.json.gz')
+
+# Names sharing the most trigrams with a query that are scored by trigram overlap
+CANDIDATES = 1000
+
+# Candidates re-ranked by edit similarity for each query, per result requested
+RERANK_FACTOR = 10
+
+# ChEMBL IDs listed per match, e.g. for a MeSH heading shared by many drugs
+MAX_IDS = 25
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+# Name sources appended to drug synonyms, e.g. 'ASPIRIN (BAN; INN; USAN)'
+_NAME_SOURCES = re.compile(r'\s*\([A-Z0-9 ;,_-]+\)$')
+
+
+def normalize(text: str) -> str:
+    """Lower-case text and reduce punctuation and whitespace runs to single spaces"""
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+def trigrams(normalized: str) -> List[str]:
+    """Distinct character trigrams of a normalized string, padded so word starts and ends count"""
+    padded = f"  {normalized} "
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+class FuzzyIndex:
+    """In-memory trigram index of names, each mapped to an entity type and ChEMBL IDs
+
+    Candidates are the names sharing the most trigrams with the query; the
+    best of them are re-ranked by a blend of trigram overlap and edit
+    similarity, so misspellings, missing hyphens and partial names still
+    find their entry.
+
+    Args:
+        names: Tuples of display name, entity and ChEMBL IDs
+        release: ChEMBL release the names were taken from
+        built: Unix time the index was built
+        generation: Incremented each time the index is rebuilt or changes are applied to it
+    """
+
+    def __init__(self, names: List[Tuple[str, str, List[str]]], release: Optional[str] = None,
+                 built: Optional[float] = None, generation: int = 1):
+        self.names = names
+        self.release = release
+        self.built = built
+        self.generation = generation
+        self.normalized = [normalize(name) for name, _, _ in names]
+        self.sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for row, text in enumerate(self.normalized):
+            grams = trigrams(text)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(row)
+
+    @classmethod
+    def from_records(cls, entries: Iterable[Tuple[str, str, str]], release: Optional[str] = None,
+                     generation: int = 1) -> 'FuzzyIndex':
+        """Build an index from (name, entity, chembl_id) tuples, merging the IDs of repeated names"""
+        merged: Dict[Tuple[str, str], Tuple[str, List[str]]] = {}
+        _merge(merged, entries)
+        return cls(_merged_names(merged), release, time.time(), generation)
+
+    def with_changes(self, removed: Dict[str, Set[str]], unlinked: Set[Tuple[str, str, str]],
+                     added: Iterable[Tuple[str, str, str]], release: Optional[str]) -> 'FuzzyIndex':
+        """Build the next generation of the index with some names replaced
+
+        Args:
+            removed: Entity to ChEMBL IDs whose names are all dropped, e.g. of updated or deleted records
+            unlinked: (name, entity, chembl_id) tuples whose ID is dropped from that name only
+            added: (name, entity, chembl_id) tuples to add
+            release: Release of the new generation
+
+        Returns:
+            New index; this one is unchanged
+        """
+        unlinked_ids: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        for name, entity, chembl_id in unlinked:
+            if name:
+                unlinked_ids[(normalize(name), entity)].add(chembl_id)
+        merged: Dict[Tuple[str, str], Tuple[str, List[str]]] = {}
+        for (name, entity, ids), text in zip(self.names, self.normalized):
+            drop = removed.get(entity, set()) | unlinked_ids.get((text, entity), set())
+            if drop:
+                ids = [i for i in ids if i not in drop]
+                if not ids:
+                    continue
+            merged[(text, entity)] = (name, list(ids))
+        _merge(merged, added)
+        return FuzzyIndex(_merged_names(merged), release, time.time(), self.generation + 1)
+
+    def search(self, text: str, entity: Optional[str] = None, top_k: int = 10) -> List[Dict[str, Any]]:
+        """Rank the indexed names closest to text
+
+        Args:
+            text: Name to look up, possibly misspelled or partial
+            entity: Only match names of this entity
+            top_k: Number of matches to return
+
+        Returns:
+            Matches, best first, with name, entity, ChEMBL IDs and a score between 0 and 1
+        """
+        query = normalize(text)
+        if not query:
+            return []
+        grams = trigrams(query)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        if entity is not None:
+            shared = Counter({row: n for row, n in shared.items() if self.names[row][1] == entity})
+        candidates = []
+        for row, n in shared.most_common(max(CANDIDATES, top_k * RERANK_FACTOR)):
+            dice = 2 * n / (len(grams) + self.sizes[row])
+            candidates.append((dice, n / len(grams), row))
+        candidates.sort(reverse=True)
+        scored = []
+        for dice, coverage, row in candidates[:max(50, top_k * RERANK_FACTOR)]:
+            similarity = SequenceMatcher(None, query, self.normalized[row], autojunk=False).ratio()
+            score = 1.0 if self.normalized[row] == query else 0.4 * dice + 0.3 * coverage + 0.3 * similarity
+            scored.append((score, row))
+        scored.sort(key=lambda item: (-item[0], len(self.normalized[item[1]])))
+        matches = []
+        for score, row in scored[:top_k]:
+            name, row_entity, ids = self.names[row]
+            matches.append({'name': name, 'entity': row_entity, 'chembl_ids': ids[:MAX_IDS],
+                            'id_count': len(ids), 'score': round(score, 3)})
+        return matches
+
+    def stats(self) -> Dict[str, Any]:
+        counts = Counter(entity for _, entity, _ in self.names)
+        return {'release': self.release, 'generation': self.generation, 'built': self.built, 'names': len(self.names),
+                'by_entity': dict(counts), 'trigrams': len(self.postings)}
+
+    def save(self, path: str):
+        """Write the index as gzipped JSON; trigram postings are rebuilt on load"""
+        document = {'release': self.release, 'built': self.built, 'generation': self.generation,
+                    'names': [[name, ENTITIES.index(entity), ids] for name, entity, ids in self.names]}
+        tmp = f"{path}.tmp"
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(document, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'FuzzyIndex':
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            document = json.load(f)
+        names = [(name, ENTITIES[entity], ids) for name, entity, ids in document['names']]
+        return cls(names, document.get('release'), document.get('built'), document.get('generation', 1))
+
+
+def _merge(merged: Dict[Tuple[str, str], Tuple[str, List[str]]], entries: Iterable[Tuple[str, str, str]]):
+    for name, entity, chembl_id in entries:
+        if not name or not normalize(name):
+            continue
+        display, ids = merged.setdefault((normalize(name), entity), (name, []))
+        if chembl_id and chembl_id not in ids:
+            ids.append(chembl_id)
+
+
+def _merged_names(merged: Dict[Tuple[str, str], Tuple[str, List[str]]]) -> List[Tuple[str, str, List[str]]]:
+    return [(display, entity, ids) for (_, entity), (display, ids) in merged.items()]
+
+
+def _synonyms(values: Optional[List[Any]], key: str) -> List[str]:
+    names = []
+    for value in values or []:
+        name = value.get(key) if isinstance(value, dict) else value
+        if isinstance(name, str):
+            names.append(name)
+    return names
+
+
+# Resources the index is built from, with the fields fetched and the field holding the ID each name maps to
+SOURCES = {
+    'molecule': (('molecule_chembl_id', 'pref_name', 'molecule_synonyms'), 'molecule_chembl_id'),
+    'drug': (('molecule_chembl_id', 'pref_name', 'synonyms'), 'molecule_chembl_id'),
+    'target': (('target_chembl_id', 'pref_name', 'target_components'), 'target_chembl_id'),
+    'drug_indication': (('molecule_chembl_id', 'mesh_heading'), 'molecule_chembl_id'),
+}
+
+# Entity of the names taken from each resource
+SOURCE_ENTITIES = {'molecule': 'compound', 'drug': 'drug', 'target': 'target', 'drug_indication': 'indication'}
+
+
+def record_names(resource: str, record: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+    """Names a record of one of the SOURCES contributes to the index, as (name, entity, chembl_id) tuples
+
+    Only named molecules are indexed, so their synonyms are skipped too.
+    """
+    chembl_id = record.get(SOURCES[resource][1])
+    entity = SOURCE_ENTITIES[resource]
+    if resource == 'drug_indication':
+        return [(record.get('mesh_heading'), entity, chembl_id)]
+    if not record.get('pref_name') and resource == 'molecule':
+        return []
+    names = [record.get('pref_name')]
+    if resource == 'molecule':
+        names += _synonyms(record.get('molecule_synonyms'), 'molecule_synonym')
+    elif resource == 'drug':
+        names += [_NAME_SOURCES.sub('', synonym) for synonym in _synonyms(record.get('synonyms'), 'synonyms')]
+    else:
+        for component in record.get('target_components') or []:
+            names += _synonyms(component.get('target_component_synonyms'), 'component_synonym')
+    return [(name, entity, chembl_id) for name in names if name]
+
+
+def index_entries() -> Iterable[Tuple[str, str, str]]:
+    """Fetch the names to index from ChEMBL as (name, entity, chembl_id) tuples
+
+    Covers preferred names and synonyms of named compounds and of drugs,
+    preferred names and component synonyms of targets, and the MeSH headings
+    of drug indications, mapped to the drugs indicated.
+    """
+    for resource, (fields, _) in SOURCES.items():
+        logging.info(f"Fetching {resource} names")
+        queryset = getattr(new_client, resource).only(*fields)
+        if resource == 'molecule':
+            queryset = queryset.filter(pref_name__isnull=False)
+        for record in fetch_all(queryset):
+            yield from record_names(resource, record)
+
+
+def index_meta(path: str) -> Dict[str, Any]:
+    """Release and generation of the index file at path; generation 0 if there is none"""
+    if not os.path.exists(path):
+        return {'release': None, 'generation': 0}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        document = json.load(f)
+    return {'release': document.get('release'), 'generation': document.get('generation', 1)}
+
+
+def build_index(path: str) -> FuzzyIndex:
+    """Build the index from ChEMBL and write it to path"""
+    try:
+        release = current_release()
+    except Exception as e:
+        logging.warning(f"Could not determine the ChEMBL release: {str(e)}")
+        release = None
+    generation = index_meta(path)['generation'] + 1
+    index = FuzzyIndex.from_records(index_entries(), release, generation)
+    index.save(path)
+    logging.info(f"Wrote {len(index.names)} names to {path}")
+    return index
+
+
+_index: Optional[FuzzyIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> FuzzyIndex:
+    """Return the index at index_path, loading it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            if not os.path.exists(index_path):
+                raise FileNotFoundError(f"No fuzzy search index at {index_path}; "
+                                        f"build it with: python chembl_fuzzy.py --output {index_path}")
+            _index = FuzzyIndex.load(index_path)
+            logging.info(f"Loaded fuzzy search index of {len(_index.names)} names from {index_path}")
+        return _index
+
+
+def install_index(index: FuzzyIndex):
+    """Search index from now on; searches already running finish with the previous one"""
+    global _index
+    with _index_lock:
+        _index = index
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Build the fuzzy name search index of the ChEMBL MCP server')
+    parser.add_argument('--output', type=str, default=index_path, help='Index file to write')
+    args = parser.parse_args()
+    build_index(args.output)
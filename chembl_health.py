@@ -0,0 +1,212 @@
+from typing import Any, Callable, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import threading
+import time
+import requests
+from chembl_webresource_client.settings import Settings
+from chembl_releases import status_url
+
+# Seconds between probes of each upstream family
+PROBE_INTERVAL = 30.0
+
+# Seconds a probe may take before it counts as failed
+PROBE_TIMEOUT = 5.0
+
+# Consecutive failed probes after which an upstream family counts as down
+FAILURES_BEFORE_DOWN = 2
+
+# Seconds between event loop lag measurements
+LAG_INTERVAL = 0.25
+
+# Lag measurements the recent maximum is taken over (5 seconds' worth)
+LAG_WINDOW = 20
+
+# Readiness thresholds; set from the server command line
+MAX_LOOP_LAG = 0.5
+MAX_QUEUED = 64
+
+
+def data_status_url() -> str:
+    """URL of the status document of the data web services"""
+    return f"{Settings.Instance().NEW_CLIENT_URL}/status.json"
+
+
+# Upstream families probed, each with the URL of a cheap status document
+UPSTREAMS: Dict[str, Callable[[], str]] = {
+    'data': data_status_url,
+    'utils': status_url,
+}
+
+
+class UpstreamProber:
+    """Probes each upstream family in a background thread and keeps the latest results
+
+    Health checks read the kept results, so however often a load balancer
+    asks, EBI sees one request per family per interval. Probes use plain
+    requests, so an answer never comes from the HTTP cache.
+
+    Args:
+        interval: Seconds between probes
+        upstreams: Family name to status URL callables
+    """
+
+    def __init__(self, interval: float = PROBE_INTERVAL, upstreams: Optional[Dict[str, Callable[[], str]]] = None):
+        self.interval = interval
+        self.upstreams = upstreams or UPSTREAMS
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._documents: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='chembl_upstream_prober', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self.probe()
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=PROBE_TIMEOUT + 1)
+            self._thread = None
+
+    def probe(self):
+        """Probe every family now"""
+        for name, url in self.upstreams.items():
+            started = time.monotonic()
+            error = document = None
+            try:
+                res = requests.get(url(), timeout=PROBE_TIMEOUT)
+                res.raise_for_status()
+                document = res.json()
+            except Exception as e:
+                error = str(e)
+            latency = time.monotonic() - started
+            with self._lock:
+                previous = self._results.get(name, {})
+                failures = 0 if error is None else previous.get('consecutive_failures', 0) + 1
+                if error is None:
+                    self._documents[name] = document
+                elif failures == FAILURES_BEFORE_DOWN:
+                    logging.warning(f"Upstream {name} is down after {failures} failed probes: {error}")
+                self._results[name] = {
+                    'ok': error is None,
+                    'latency_ms': round(latency * 1000, 1),
+                    'checked_at': time.time(),
+                    'last_ok_at': time.time() if error is None else previous.get('last_ok_at'),
+                    'consecutive_failures': failures,
+                    'error': error,
+                }
+
+    def up(self, name: str) -> bool:
+        """Whether a family answered one of its last FAILURES_BEFORE_DOWN probes, within a few intervals"""
+        with self._lock:
+            result = self._results.get(name)
+        if result is None:
+            return False
+        fresh = time.time() - result['checked_at'] <= 3 * self.interval + PROBE_TIMEOUT
+        return fresh and result['consecutive_failures'] < FAILURES_BEFORE_DOWN
+
+    def document(self, name: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """Status document of the last successful probe of a family, if it is at most max_age seconds old"""
+        with self._lock:
+            result = self._results.get(name)
+            document = self._documents.get(name)
+        if result is None or document is None or not result['ok']:
+            return None
+        if max_age is not None and time.time() - result['checked_at'] > max_age:
+            return None
+        return document
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+        for name in self.upstreams:
+            results.setdefault(name, {'ok': None, 'checked_at': None})
+            results[name]['up'] = self.up(name)
+        return results
+
+
+class LoopMonitor:
+    """Measures how late the event loop wakes up a task that sleeps LAG_INTERVAL
+
+    A late wake-up means something blocked the loop or it had too many
+    ready callbacks; either way every tool call is delayed by as much.
+    """
+
+    def __init__(self):
+        self.lag = 0.0
+        self._recent: deque = deque(maxlen=LAG_WINDOW)
+        self._task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+
+    def start(self):
+        """Start measuring on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            before = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lag = max(0.0, loop.time() - before - LAG_INTERVAL)
+            self._recent.append(self.lag)
+
+    @property
+    def recent_max(self) -> float:
+        return max(self._recent, default=0.0)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Thread pool that counts the work waiting for a thread and the work running
+
+    Installed as the event loop's default executor, it makes the backlog
+    of asyncio.to_thread calls visible.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queued = 0
+        self.active = 0
+        self._counts_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._counts_lock:
+            self.queued += 1
+
+        def run():
+            with self._counts_lock:
+                self.queued -= 1
+                self.active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._counts_lock:
+                    self.active -= 1
+        return super().submit(run)
+
+    def stats(self) -> Dict[str, int]:
+        with self._counts_lock:
+            return {'workers': self._max_workers, 'active': self.active, 'queued': self.queued}
+
+
+# Prober, loop monitor and default executor of the server process
+prober = UpstreamProber()
+loop_monitor = LoopMonitor()
+executor = CountingExecutor(thread_name_prefix='chembl_worker')
@@ -0,0 +1,217 @@
+from typing import Any, Callable, Dict, Optional
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+import contextvars
+import math
+import threading
+import time
+from chembl_metrics import Counters
+
+# Percentile of recent upstream latencies after which a duplicate request is sent
+HEDGE_PERCENTILE = 95.0
+
+# Extra requests allowed, as a fraction of all hedgeable requests
+HEDGE_BUDGET = 0.05
+
+# Hedges that may be sent back to back before the budget has to refill
+HEDGE_BURST = 10
+
+# Bounds of the hedge delay in seconds
+MIN_DELAY = 0.05
+MAX_DELAY = 5.0
+
+# Latencies kept per endpoint, and how many are needed before an endpoint is hedged
+WINDOW = 200
+MIN_SAMPLES = 20
+
+# Worker threads sending hedged requests
+MAX_WORKERS = 32
+
+
+def endpoint_of(url: str) -> str:
+    """Group a request URL by API and resource, e.g. data/molecule or utils/smiles2ctab
+
+    Requests for single records are grouped with queries of the same resource
+    so their latencies share one distribution.
+    """
+    parts = [p for p in urlsplit(url).path.split('/') if p]
+    for api in ('data', 'utils'):
+        if api in parts:
+            index = parts.index(api)
+            if index + 1 < len(parts):
+                return f"{api}/{parts[index + 1].split('.')[0]}"
+            return api
+    return urlsplit(url).path
+
+
+class LatencyWindow:
+    """Recent latencies of one endpoint"""
+
+    def __init__(self, size: int = WINDOW):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, max(0, math.ceil(q / 100 * len(samples)) - 1))]
+
+
+class Hedger:
+    """Sends a duplicate of a slow idempotent request and returns whichever response arrives first
+
+    A request is hedged once it has been outstanding longer than the
+    configured percentile of the recent latencies of its endpoint. Extra load
+    is capped by a token bucket: every hedgeable request adds budget tokens,
+    every hedge spends one, so hedges never exceed that fraction of traffic.
+    Hedging is off until enable() is called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.percentile = HEDGE_PERCENTILE
+        self.budget = HEDGE_BUDGET
+        self.min_delay = MIN_DELAY
+        self.max_delay = MAX_DELAY
+        self.counters = Counters()
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._tokens = float(HEDGE_BURST)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def enable(self, percentile: Optional[float] = None, budget: Optional[float] = None,
+               min_delay: Optional[float] = None, max_delay: Optional[float] = None):
+        if percentile is not None:
+            if not 0 < percentile < 100:
+                raise ValueError("The hedge percentile must be between 0 and 100")
+            self.percentile = percentile
+        if budget is not None:
+            if budget < 0:
+                raise ValueError("The hedge budget must not be negative")
+            self.budget = budget
+        if min_delay is not None:
+            self.min_delay = min_delay
+        if max_delay is not None:
+            self.max_delay = max_delay
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='chembl_hedge')
+        self.enabled = True
+
+    def _window(self, endpoint: str) -> LatencyWindow:
+        window = self._windows.get(endpoint)
+        if window is None:
+            with self._lock:
+                window = self._windows.setdefault(endpoint, LatencyWindow())
+        return window
+
+    def delay(self, endpoint: str) -> Optional[float]:
+        """Seconds to wait before hedging a request to endpoint, or None while there are too few samples"""
+        window = self._window(endpoint)
+        if len(window) < MIN_SAMPLES:
+            return None
+        return min(self.max_delay, max(self.min_delay, window.percentile(self.percentile)))
+
+    def _earn(self):
+        with self._lock:
+            self._tokens = min(float(HEDGE_BURST), self._tokens + self.budget)
+
+    def _spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _timed(self, endpoint: str, send: Callable[[], Any]) -> Callable[[], Any]:
+        def run():
+            started = time.monotonic()
+            response = send()
+            self._window(endpoint).add(time.monotonic() - started)
+            return response
+        return run
+
+    def send(self, url: str, send: Callable[[], Any], on_hedge: Optional[Callable[[float], Any]] = None) -> Any:
+        """Call send, hedging it with a second call if the first is slow
+
+        Args:
+            url: URL of the request, used to pick its latency distribution
+            send: Sends the request and returns its response; must be safe to call twice at once
+            on_hedge: Called with the delay when a hedge is sent
+
+        Returns:
+            The first response to arrive; if both attempts fail, the primary's error is raised
+        """
+        endpoint = endpoint_of(url)
+        timed = self._timed(endpoint, send)
+        delay = self.delay(endpoint) if self.enabled else None
+        if delay is None:
+            return timed()
+        self._earn()
+        self.counters.increment(endpoint, 'requests')
+        primary = self._executor.submit(contextvars.copy_context().run, timed)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        if not self._spend():
+            self.counters.increment(endpoint, 'over_budget')
+            return primary.result()
+        self.counters.increment(endpoint, 'hedged')
+        if on_hedge is not None:
+            on_hedge(delay)
+        hedge = self._executor.submit(contextvars.copy_context().run, timed)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in done if f.exception() is None), None)
+            if winner is not None:
+                if winner is hedge:
+                    self.counters.increment(endpoint, 'hedge_won')
+                for loser in pending:
+                    self._discard(loser)
+                return winner.result()
+        return primary.result()
+
+    @staticmethod
+    def _discard(future: Future):
+        """Cancel the slower attempt, or close its response as soon as it arrives"""
+        if future.cancel():
+            return
+
+        def close(f: Future):
+            if f.exception() is None:
+                f.result().close()
+        future.add_done_callback(close)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = self.counters.snapshot()
+        endpoints = {}
+        for endpoint, window in list(self._windows.items()):
+            events = counts.get(endpoint, {})
+            delay = self.delay(endpoint)
+            endpoints[endpoint] = {
+                'samples': len(window),
+                'hedge_delay_ms': round(delay * 1000, 1) if delay is not None else None,
+                'requests': events.get('requests', 0),
+                'hedged': events.get('hedged', 0),
+                'hedge_won': events.get('hedge_won', 0),
+                'over_budget': events.get('over_budget', 0),
+            }
+        return {'enabled': self.enabled, 'percentile': self.percentile, 'budget': self.budget,
+                'hedged': sum(e['hedged'] for e in endpoints.values()),
+                'hedge_won': sum(e['hedge_won'] for e in endpoints.values()),
+                'endpoints': endpoints}
+
+
+# Hedger of the server process
+hedger = Hedger()
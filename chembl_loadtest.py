@@ -0,0 +1,263 @@
+from typing import Any, Dict, List, Optional
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import os
+import random
+import sys
+import time
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+# Scenario used without --scenario; its arguments match the data of chembl_standin
+DEFAULT_SCENARIO: Dict[str, Any] = {
+    'calls': [
+        {'tool': 'example_drug_warning', 'arguments': {'meddra_term': 'Liver injury'}, 'weight': 4},
+        {'tool': 'example_mechanism', 'arguments': [{'mechanism_of_action': 'ACE inhibitor'},
+                                                    {'mechanism_of_action': 'Kinase inhibitor'}], 'weight': 4},
+        {'tool': 'example_chembl_id_lookup', 'arguments': {'available_type': 'COMPOUND', 'q': 'CHEMBL_M1'}, 'weight': 3},
+        {'tool': 'example_canonicalizeSmiles', 'arguments': {'smiles': 'OCC'}, 'weight': 3},
+        {'tool': 'example_is3D', 'arguments': {'smiles': 'CCO'}, 'weight': 2},
+        {'tool': 'example_assay', 'arguments': [{'assay_type': 'B'}, {'assay_type': 'F'}], 'weight': 2},
+        {'tool': 'aggregate_activities', 'arguments': [{'target_chembl_id': 'CHEMBL_T1'},
+                                                       {'assay_chembl_id': 'CHEMBL_A2'}], 'weight': 1},
+        {'tool': 'molecule_full_profile', 'arguments': {'molecule_chembl_id': 'CHEMBL_M10'}, 'weight': 1},
+        {'tool': 'example_molecule', 'arguments': {'molecule_type': 'Small molecule'}, 'weight': 1},
+    ],
+    'stages': [
+        {'concurrency': 1, 'duration': 10},
+        {'concurrency': 4, 'duration': 10},
+        {'concurrency': 16, 'duration': 10},
+    ],
+}
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chembl_server.py')
+
+# Error texts that mark a tool call as having run out of time
+TIMEOUT_MARKERS = ('exceeded', 'timed out', 'timeout')
+
+
+def load_scenario(path: Optional[str]) -> Dict[str, Any]:
+    """Load and check a scenario file (JSON with 'calls' and 'stages')
+
+    Each call has a tool name, a weight and either one arguments object or a
+    list of them to pick from at random. Each stage runs a number of
+    concurrent callers for a duration in seconds.
+    """
+    scenario = DEFAULT_SCENARIO
+    if path:
+        with open(path) as f:
+            scenario = json.load(f)
+    if not scenario.get('calls') or not scenario.get('stages'):
+        raise ValueError("A scenario needs non-empty 'calls' and 'stages'")
+    for call in scenario['calls']:
+        if 'tool' not in call:
+            raise ValueError(f"Scenario call without a tool: {call!r}")
+        call.setdefault('weight', 1)
+        call.setdefault('arguments', {})
+    for stage in scenario['stages']:
+        if stage.get('concurrency', 0) < 1 or stage.get('duration', 0) <= 0:
+            raise ValueError(f"Stage needs a positive concurrency and duration: {stage!r}")
+    return scenario
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+class StageStats:
+    """Outcomes of the calls of one stage, per tool"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.calls: Dict[str, Dict[str, Any]] = {}
+        self.elapsed = 0.0
+
+    def record(self, tool: str, seconds: float, outcome: str):
+        stats = self.calls.setdefault(tool, {'latencies': [], 'ok': 0, 'partial': 0, 'error': 0, 'timeout': 0})
+        stats['latencies'].append(seconds)
+        stats[outcome] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        tools = {}
+        all_latencies: List[float] = []
+        totals = {'ok': 0, 'partial': 0, 'error': 0, 'timeout': 0}
+        for tool, stats in sorted(self.calls.items()):
+            latencies = stats['latencies']
+            all_latencies.extend(latencies)
+            for outcome in totals:
+                totals[outcome] += stats[outcome]
+            tools[tool] = self._row(latencies, stats)
+        result = {'concurrency': self.concurrency, 'seconds': round(self.elapsed, 2),
+                  'total': self._row(all_latencies, totals), 'tools': tools}
+        return result
+
+    def _row(self, latencies: List[float], counts: Dict[str, Any]) -> Dict[str, Any]:
+        calls = len(latencies)
+
+        def ms(fraction):
+            value = percentile(latencies, fraction)
+            return None if value is None else round(value * 1000, 1)
+        return {
+            'calls': calls,
+            'throughput': round(calls / self.elapsed, 2) if self.elapsed else None,
+            'p50_ms': ms(0.5), 'p90_ms': ms(0.9), 'p99_ms': ms(0.99),
+            'max_ms': round(max(latencies) * 1000, 1) if latencies else None,
+            'ok': counts['ok'], 'partial': counts['partial'],
+            'error_rate': round(counts['error'] / calls, 4) if calls else 0.0,
+            'timeout_rate': round(counts['timeout'] / calls, 4) if calls else 0.0,
+        }
+
+
+def classify(result) -> str:
+    """Outcome of a CallToolResult: ok, partial, error or timeout"""
+    if result.isError:
+        text = ' '.join(getattr(c, 'text', '') for c in result.content).lower()
+        return 'timeout' if any(marker in text for marker in TIMEOUT_MARKERS) else 'error'
+    structured = result.structuredContent or {}
+    if isinstance(structured.get('result'), dict) and structured['result'].get('partial'):
+        return 'partial'
+    return 'ok'
+
+
+async def run_stage(sessions: List[ClientSession], scenario: Dict[str, Any], stage: Dict[str, Any],
+                    call_timeout: float, rnd: random.Random) -> StageStats:
+    """Run stage['concurrency'] callers spread over the sessions for stage['duration'] seconds"""
+    calls = scenario['calls']
+    weights = [call['weight'] for call in calls]
+    stats = StageStats(stage['concurrency'])
+    stop_at = time.monotonic() + stage['duration']
+
+    async def caller(session: ClientSession):
+        while time.monotonic() < stop_at:
+            call = rnd.choices(calls, weights)[0]
+            arguments = call['arguments']
+            if isinstance(arguments, list):
+                arguments = rnd.choice(arguments)
+            started = time.perf_counter()
+            try:
+                result = await session.call_tool(call['tool'], arguments,
+                                                 read_timeout_seconds=datetime.timedelta(seconds=call_timeout))
+                outcome = classify(result)
+            except Exception as e:
+                text = str(e).lower()
+                outcome = 'timeout' if any(marker in text for marker in TIMEOUT_MARKERS) else 'error'
+            stats.record(call['tool'], time.perf_counter() - started, outcome)
+
+    started = time.monotonic()
+    await asyncio.gather(*(caller(sessions[i % len(sessions)]) for i in range(stage['concurrency'])))
+    stats.elapsed = time.monotonic() - started
+    return stats
+
+
+async def open_sessions(stack: contextlib.AsyncExitStack, count: int, url: Optional[str],
+                        env: Dict[str, str], server_log) -> List[ClientSession]:
+    """Open count MCP sessions, each on its own stdio server process, or all on the server at url"""
+    sessions = []
+    for _ in range(count):
+        if url:
+            read, write, _ = await stack.enter_async_context(streamablehttp_client(url))
+        else:
+            parameters = StdioServerParameters(command=sys.executable, env=env,
+                                               args=[SERVER_SCRIPT, '--transport', 'stdio', '--log-level', 'WARNING'])
+            read, write = await stack.enter_async_context(stdio_client(parameters, errlog=server_log))
+        session = await stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+        sessions.append(session)
+    return sessions
+
+
+async def run_load_test(scenario: Dict[str, Any], sessions: int = 4, url: Optional[str] = None,
+                        api_url: Optional[str] = None, call_timeout: float = 60.0, seed: Optional[int] = None,
+                        server_log=None) -> List[Dict[str, Any]]:
+    """Replay the scenario's weighted call mix through each of its stages in turn
+
+    Args:
+        scenario: Scenario as returned by load_scenario
+        sessions: Number of MCP sessions the callers are spread over
+        url: Streamable HTTP endpoint of a running server; stdio subprocesses are started if omitted
+        api_url: ChEMBL API base URL for the stdio server processes (CHEMBL_API_URL)
+        call_timeout: Client-side timeout of one tool call in seconds
+        seed: Random seed for the call mix
+        server_log: File the stdio servers' stderr goes to
+
+    Returns:
+        Summary of every stage
+    """
+    env = dict(os.environ)
+    if api_url:
+        env['CHEMBL_API_URL'] = api_url
+    rnd = random.Random(seed)
+    summaries = []
+    async with contextlib.AsyncExitStack() as stack:
+        opened = await open_sessions(stack, sessions, url, env, server_log or open(os.devnull, 'w'))
+        for stage in scenario['stages']:
+            stats = await run_stage(opened, scenario, stage, call_timeout, rnd)
+            summaries.append(stats.summary())
+            logging.info(f"Stage with {stage['concurrency']} callers done: {summaries[-1]['total']}")
+    return summaries
+
+
+def format_report(summaries: List[Dict[str, Any]]) -> str:
+    columns = ('calls', 'throughput', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'error_rate', 'timeout_rate', 'partial')
+    lines = []
+    for summary in summaries:
+        lines.append(f"\nConcurrency {summary['concurrency']} ({summary['seconds']} s)")
+        lines.append(f"{'tool':<32}" + ''.join(f"{c:>13}" for c in columns))
+        rows = list(summary['tools'].items()) + [('TOTAL', summary['total'])]
+        for tool, row in rows:
+            lines.append(f"{tool:<32}" + ''.join(f"{'-' if row[c] is None else row[c]:>13}" for c in columns))
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load test the ChEMBL MCP server')
+    parser.add_argument('--scenario', type=str, default=None, help='Scenario JSON file with weighted calls and stages')
+    parser.add_argument('--sessions', type=int, default=4, help='Number of MCP sessions (stdio server processes unless --url is given)')
+    parser.add_argument('--url', type=str, default=None, help='Streamable HTTP endpoint of a running server, e.g. http://127.0.0.1:8000/mcp')
+    parser.add_argument('--api-url', type=str, default=None, help='ChEMBL API base URL for the stdio server processes')
+    parser.add_argument('--standin', action='store_true', help='Serve the ChEMBL API from a local stand-in (stdio servers only)')
+    parser.add_argument('--standin-latency', type=float, default=0.05, help='Seconds added by the stand-in to every request')
+    parser.add_argument('--standin-jitter', type=float, default=0.05, help='Random extra seconds added by the stand-in')
+    parser.add_argument('--standin-slow-fraction', type=float, default=0.0, help='Fraction of stand-in requests that are slow')
+    parser.add_argument('--concurrency', type=str, default=None, help='Comma separated concurrency ramp overriding the scenario stages, e.g. 1,4,16')
+    parser.add_argument('--stage-duration', type=float, default=None, help='Seconds per stage when --concurrency is given')
+    parser.add_argument('--call-timeout', type=float, default=60.0, help='Client-side timeout of one tool call in seconds')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for the call mix')
+    parser.add_argument('--server-log', type=str, default=None, help='File the stdio servers write their logs to')
+    parser.add_argument('--output', type=str, default=None, help='Write the summary as JSON to this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    scenario = load_scenario(args.scenario)
+    if args.concurrency:
+        duration = args.stage_duration or scenario['stages'][0]['duration']
+        scenario['stages'] = [{'concurrency': int(c), 'duration': duration} for c in args.concurrency.split(',')]
+    api_url = args.api_url
+    if args.standin:
+        if args.url:
+            parser.error('--standin only applies to stdio servers started by the load test')
+        import chembl_standin
+        standin = chembl_standin.serve(port=0, state=chembl_standin.StandinState(
+            latency=args.standin_latency, jitter=args.standin_jitter, slow_fraction=args.standin_slow_fraction))
+        api_url = chembl_standin.api_url(standin)
+        # Measure the server rather than the client's on-disk HTTP cache
+        os.environ.setdefault('CHEMBL_HTTP_CACHE', '0')
+        logging.info(f"ChEMBL stand-in serving on {api_url}")
+
+    server_log = open(args.server_log, 'a') if args.server_log else None
+    summaries = asyncio.run(run_load_test(scenario, args.sessions, args.url, api_url,
+                                          args.call_timeout, args.seed, server_log))
+    print(format_report(summaries))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summaries, f, indent=2)
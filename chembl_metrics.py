@@ -0,0 +1,27 @@
+from typing import Dict
+from collections import defaultdict
+import threading
+
+
+class Counters:
+    """Thread-safe event counters grouped by name, e.g. counters.increment('example_drug', 'hit')"""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def increment(self, group: str, event: str, amount: int = 1):
+        with self._lock:
+            self._counts[group][event] += amount
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {group: dict(events) for group, events in self._counts.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+# Counters shared by the server process
+counters = Counters()
@@ -0,0 +1,420 @@
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextlib
+import contextvars
+import itertools
+import logging
+import threading
+import time
+import requests
+from requests_cache import CachedSession
+from requests_cache.policy import get_expiration_datetime, get_url_expiration
+from urllib3.util import Retry
+from chembl_webresource_client.query import Query
+from chembl_webresource_client.settings import Settings
+from chembl_webresource_client.http_errors import handle_http_error
+from chembl_tracing import span, current_span, queued, NOOP_SPAN
+from chembl_hedging import hedger
+from chembl_streaming import CollectionDecoder, iter_collection, projection, CHUNK_SIZE
+
+# Largest page the ChEMBL data API will serve in one request
+PAGE_SIZE = 1000
+
+# Maximum number of pages fetched at the same time for one query
+FAN_OUT = 8
+
+_session = None
+_streaming_session = None
+_session_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when upstream work is attempted after the current deadline"""
+
+
+class Deadline:
+    """Point in time by which the current call must finish
+
+    Args:
+        seconds: Time budget from now
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g} seconds exceeded")
+
+    def extend(self, seconds: float):
+        """Move the deadline to seconds from now unless it is already later"""
+        self.expires = max(self.expires, time.monotonic() + seconds)
+
+    def cancel(self):
+        """Expire the deadline now; work running under it stops at its next check"""
+        self.expires = time.monotonic()
+
+
+# Deadline of the call running in the current context; None means unbounded
+current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar('current_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds: float) -> Iterator[Deadline]:
+    """Run the enclosed block under a deadline of seconds from now
+
+    Deadlines are context variables, so they work in any thread and in
+    asyncio tasks, and they nest: an inner deadline never extends an outer one.
+    """
+    outer = current_deadline.get()
+    inner = Deadline(seconds)
+    if outer is not None and outer.expires < inner.expires:
+        inner = outer
+    token = current_deadline.set(inner)
+    try:
+        yield inner
+    finally:
+        current_deadline.reset(token)
+
+
+def submit_with_context(executor: ThreadPoolExecutor, fn: Callable, *args) -> Future:
+    """Submit fn to executor so it sees the caller's context variables, including the deadline"""
+    return executor.submit(contextvars.copy_context().run, queued(fn, *args))
+
+
+class DeadlineRetry(Retry):
+    """urllib3 retry policy that never retries or backs off past the current deadline"""
+
+    def increment(self, method=None, url=None, response=None, error=None, *args, **kwargs):
+        deadline = current_deadline.get()
+        if deadline is not None:
+            deadline.check()
+        current_span.get(NOOP_SPAN).event('retry', status=getattr(response, 'status', None),
+                                          error=str(error) if error else None)
+        return super().increment(method, url, response, error, *args, **kwargs)
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        deadline = current_deadline.get()
+        if deadline is None:
+            return backoff
+        return max(0.0, min(backoff, deadline.remaining()))
+
+
+class DeadlineAdapter(requests.adapters.HTTPAdapter):
+    """HTTP adapter that caps each request's timeout by the current deadline
+
+    Idempotent requests are hedged when hedging is enabled: reads, including
+    POSTs the client sends with X-HTTP-Method-Override: GET, and every
+    request of a session whose POSTs have no side effects (the utils API).
+    """
+
+    def __init__(self, *args, idempotent_posts: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.idempotent_posts = idempotent_posts
+
+    def _idempotent(self, request) -> bool:
+        if request.method in ('GET', 'HEAD'):
+            return True
+        if request.headers.get('X-HTTP-Method-Override', '').upper() == 'GET':
+            return True
+        return self.idempotent_posts and request.method == 'POST'
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        with span('http.request', method=request.method, url=request.url) as http_span:
+            if hedger.enabled and self._idempotent(request):
+                response = hedger.send(request.url, lambda: self._send(request.copy(), stream, timeout, **kwargs),
+                                       on_hedge=lambda delay: http_span.event('hedge', delay_ms=round(delay * 1000, 1)))
+            else:
+                response = self._send(request, stream, timeout, **kwargs)
+            length = response.headers.get('Content-Length')
+            http_span.set(status=response.status_code, bytes=int(length) if length and length.isdigit() else None)
+            return response
+
+    def _send(self, request, stream, timeout, **kwargs):
+        deadline = current_deadline.get()
+        if deadline is None:
+            return super().send(request, stream=stream, timeout=timeout, **kwargs)
+        deadline.check()
+        remaining = deadline.remaining()
+        if timeout is None or isinstance(timeout, tuple):
+            timeout = remaining
+        else:
+            timeout = min(timeout, remaining)
+        try:
+            return super().send(request, stream=stream, timeout=timeout, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            deadline.check()
+            raise
+
+
+def install_deadline_adapter(session, max_retries: Retry, idempotent_posts: bool = False):
+    """Mount a DeadlineAdapter with the given retry policy on session
+
+    Args:
+        session: requests session
+        max_retries: Retry policy
+        idempotent_posts: Whether POSTs on session are free of side effects and may be hedged
+    """
+    size = Settings.Instance().CONCURRENT_SIZE
+    adapter = DeadlineAdapter(pool_connections=size, pool_maxsize=size, pool_block=True, max_retries=max_retries,
+                              idempotent_posts=idempotent_posts)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def shared_session():
+    """Return the HTTP session shared by all paged queries
+
+    The client opens a new session (and connection pool) for every cloned
+    query; sharing one lets concurrent page requests reuse connections. The
+    session applies the current deadline to timeouts and retries.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = install_deadline_adapter(Query().session, _page_retry())
+        return _session
+
+
+def streaming_session():
+    """Return the uncached HTTP session that page requests missing the HTTP cache are sent through
+
+    The client's session is a requests_cache CachedSession unless HTTP
+    caching is off, and on a miss it reads the whole response body to
+    store it before handing it back, which would defeat decoding pages as
+    they arrive. Requests are prepared, and looked up in and saved to the
+    HTTP cache, with shared_session().
+    """
+    global _streaming_session
+    with _session_lock:
+        if _streaming_session is None:
+            _streaming_session = install_deadline_adapter(requests.Session(), _page_retry())
+        return _streaming_session
+
+
+def _page_retry() -> Retry:
+    s = Settings.Instance()
+    return DeadlineRetry(total=s.TOTAL_RETRIES, backoff_factor=s.BACKOFF_FACTOR,
+                         status_forcelist=(list(range(400, 421)) + list(range(500, 505))))
+
+
+def paged(queryset, page_size: int = PAGE_SIZE):
+    """Return a copy of queryset that fetches page_size records per request
+
+    Args:
+        queryset: chembl_webresource_client QuerySet
+        page_size: Number of records per upstream request
+
+    Returns:
+        Cloned QuerySet
+    """
+    clone = queryset.all()
+    clone.query.limit = page_size
+    clone.query.session = shared_session()
+    return clone
+
+
+def iter_pages(queryset, page_size: int = PAGE_SIZE, fields: Optional[List[str]] = None,
+               keep: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the result pages of queryset one at a time
+
+    Only the current page is held in memory, so callers can fold arbitrarily
+    large result sets without materialising them.
+
+    Args:
+        queryset: chembl_webresource_client QuerySet
+        page_size: Number of records per upstream request
+        fields: Fields to keep of each record (default: the fields the queryset asks for with only())
+        keep: Predicate records must satisfy to be yielded, applied as they are decoded
+
+    Returns:
+        Iterator over lists of records
+    """
+    deadline = current_deadline.get()
+    offset = 0
+    while True:
+        page, total, count = _fetch_page(queryset, offset, page_size, fields, keep)
+        if page:
+            yield page
+        offset += count
+        if not count or offset >= total:
+            return
+        if deadline is not None:
+            deadline.check()
+
+
+def _decode_page(query, project, keep) -> Tuple[List[Dict[str, Any]], CollectionDecoder]:
+    """Request one page and decode its records as the response body arrives
+
+    Records are decoded, projected and filtered chunk by chunk, so a page
+    never costs its full decoded tree on top of its kept records. A page
+    in the client's HTTP cache is decoded from there; any other is
+    streamed from upstream and, with the HTTP cache on, its body bytes
+    are collected while it is decoded and saved to the cache afterwards.
+    """
+    deadline = current_deadline.get()
+    decoder = CollectionDecoder(query.collection_name)
+    session = shared_session()
+    request = session.prepare_request(requests.Request('POST', query.base_url + '.json',
+                                                       json=query._prepare_url_params()))
+    http_cache = session.cache if isinstance(session, CachedSession) else None
+    cache_key = http_cache.create_key(request) if http_cache is not None else None
+    response = http_cache.get_response(cache_key) if http_cache is not None else None
+    body: Optional[List[bytes]] = None
+    if response is None or response.is_expired:
+        stream = streaming_session()
+        settings = stream.merge_environment_settings(request.url, session.proxies, True, None, None)
+        response = stream.send(request, timeout=query.timeout, **settings)
+        if http_cache is not None and response.ok:
+            body = []
+    try:
+        if not response.ok:
+            handle_http_error(response)
+        chunks = response.iter_content(CHUNK_SIZE)
+        if body is not None:
+            chunks = _collect(chunks, body)
+        records = []
+        for record in iter_collection(chunks, decoder, response.encoding or 'utf-8'):
+            if keep is not None and not keep(record):
+                continue
+            records.append(record if project is None else project(record))
+            if deadline is not None and decoder.count % 100 == 0:
+                deadline.check()
+    finally:
+        response.close()
+    if body is not None:
+        _save_page(session, cache_key, response, b''.join(body))
+    return records, decoder
+
+
+def _collect(chunks: Iterator[bytes], body: List[bytes]) -> Iterator[bytes]:
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+
+
+def _save_page(session, cache_key: str, response: requests.Response, content: bytes):
+    """Save a streamed page to the client's HTTP cache, as the CachedSession would have"""
+    response._content = content
+    try:
+        expire_after = get_url_expiration(response.url, session.settings.urls_expire_after) or session.settings.expire_after
+        session.cache.save_response(response, cache_key, get_expiration_datetime(expire_after))
+    except Exception as e:
+        logging.warning(f"Could not save a page of {response.url} to the HTTP cache: {str(e)}")
+
+
+def _fetch_page(queryset, offset: int, page_size: int, fields: Optional[List[str]] = None,
+                keep: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[List[Dict[str, Any]], int, int]:
+    """Fetch the page of queryset starting at offset
+
+    Returns:
+        The kept records, the total count upstream and the number of records the page held
+    """
+    deadline = current_deadline.get()
+    if deadline is not None:
+        deadline.check()
+    query = paged(queryset, page_size).query
+    query.set_limits(offset, offset + page_size)
+    with span('page', resource=query.model.name, offset=offset, page_size=page_size) as page_span:
+        records, decoder = _decode_page(query, projection(query.only if fields is None else fields), keep)
+        page_span.set(records=decoder.count)
+    return records, (decoder.meta.get('page_meta') or {}).get('total_count') or 0, decoder.count
+
+
+def fetch_page(queryset, offset: int, page_size: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Fetch the single page of queryset starting at offset
+
+    Args:
+        queryset: chembl_webresource_client QuerySet
+        offset: Index of the first record of the page
+        page_size: Number of records per upstream request
+
+    Returns:
+        List of records
+    """
+    return _fetch_page(queryset, offset, page_size)[0]
+
+
+def fetch_into(queryset, append: Callable[[List[Dict[str, Any]]], Any], start: int = 0,
+               stop: Optional[int] = None, page_size: int = PAGE_SIZE, fan_out: int = FAN_OUT,
+               on_total: Optional[Callable[[int], Any]] = None) -> int:
+    """Fetch records start..stop of queryset, handing pages to append in order
+
+    The first page reveals the total count; the remaining offsets are then
+    fetched by up to fan_out threads. Pages are passed to append in upstream
+    order as soon as all earlier pages have been appended, so a caller
+    interrupted part way, e.g. by DeadlineExceeded, keeps a gap-free prefix.
+    At most fan_out pages are requested ahead of the next one to append, so
+    pages that arrive early never pile up while an earlier one is slow.
+
+    Args:
+        queryset: chembl_webresource_client QuerySet
+        append: Called with each page of records
+        start: Index of the first record to fetch
+        stop: Index after the last record to fetch (all records if omitted)
+        page_size: Number of records per upstream request
+        fan_out: Maximum number of concurrent page requests
+        on_total: Called with the total count as soon as the first page arrives
+
+    Returns:
+        Total number of records matching the query upstream
+    """
+    with span('paginate', resource=queryset.query.model.name, start=start, stop=stop) as paginate_span:
+        first, total, _ = _fetch_page(queryset, start, page_size)
+        if on_total is not None:
+            on_total(total)
+        end = total if stop is None else min(total, stop)
+        append(first[:max(0, end - start)])
+        del first
+        offsets = range(start + page_size, end, page_size)
+        paginate_span.set(total=total, pages=1 + len(offsets))
+        if offsets:
+            with ThreadPoolExecutor(max_workers=min(fan_out, len(offsets))) as executor:
+                pending: Deque[Tuple[int, Future]] = deque()
+                upcoming = iter(offsets)
+                try:
+                    for offset in itertools.islice(upcoming, fan_out):
+                        pending.append((offset, submit_with_context(executor, fetch_page, queryset, offset, page_size)))
+                    while pending:
+                        offset, future = pending.popleft()
+                        page = future.result()
+                        for next_offset in itertools.islice(upcoming, 1):
+                            pending.append((next_offset, submit_with_context(executor, fetch_page, queryset,
+                                                                             next_offset, page_size)))
+                        append(page[:end - offset])
+                        del page
+                finally:
+                    for _, future in pending:
+                        future.cancel()
+        return total
+
+
+def fetch_all(queryset, page_size: int = PAGE_SIZE, fan_out: int = FAN_OUT,
+              max_records: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Fetch every record of queryset, requesting pages concurrently
+
+    Args:
+        queryset: chembl_webresource_client QuerySet
+        page_size: Number of records per upstream request
+        fan_out: Maximum number of concurrent page requests
+        max_records: Stop after this many records
+
+    Returns:
+        List of all records, in upstream order
+    """
+    if max_records is not None:
+        page_size = max(1, min(page_size, max_records))
+    records: List[Dict[str, Any]] = []
+    fetch_into(queryset, records.extend, 0, max_records, page_size, fan_out)
+    return records
@@ -0,0 +1,176 @@
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
+import logging
+import threading
+import time
+from chembl_metrics import Counters
+from chembl_paging import Deadline, DeadlineExceeded, current_deadline
+
+# Most pages fetched ahead of a reader
+MAX_PAGES_AHEAD = 4
+
+# Bytes of prefetched records not yet read, across all readers
+MAX_BYTES = 64 * 1024 * 1024
+
+# Seconds without a read after which a reader's prefetch is cancelled and its state dropped
+IDLE_TIMEOUT = 60.0
+
+# Background prefetches running at once
+MAX_WORKERS = 4
+
+
+class _Reader:
+    """Read pattern of one client on one cursor"""
+
+    def __init__(self, result_set):
+        self.result_set = result_set
+        self.next_offset: Optional[int] = None
+        self.streak = 0
+        self.prefetched_from = 0
+        self.prefetched_to = 0
+        self.record_bytes = 0
+        self.job: Optional[Future] = None
+        self.deadline: Optional[Deadline] = None
+        self.last_seen = time.monotonic()
+
+    @property
+    def running(self) -> bool:
+        return self.job is not None and not self.job.done()
+
+    def speculative_bytes(self) -> int:
+        unread = min(self.prefetched_to, len(self.result_set)) - max(self.next_offset or 0, self.prefetched_from)
+        return max(0, unread) * self.record_bytes
+
+
+class Prefetcher:
+    """Fetches the next pages of a cursor in the background while a client pages through it
+
+    A client that reads a cursor sequentially, each read starting where
+    the previous one ended, gets the following pages fetched into the
+    result store before it asks for them: one page after the second
+    sequential read, doubling with every further one up to max_pages.
+    Prefetched records not yet read are capped at max_bytes across all
+    clients. A prefetch runs under a deadline that every read by the same
+    client renews, so it is cancelled once the client stops reading for
+    idle_timeout seconds.
+    """
+
+    def __init__(self, max_pages: int = MAX_PAGES_AHEAD, max_bytes: int = MAX_BYTES,
+                 idle_timeout: float = IDLE_TIMEOUT):
+        self.enabled = True
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.counters = Counters()
+        self._readers: Dict[Tuple[str, str], _Reader] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='chembl_prefetch')
+
+    def _resource(self, result_set) -> str:
+        return result_set.queryset.query.model.name
+
+    def begin(self, client: str, result_set, offset: int, limit: int):
+        """Note a read of offset..offset + limit before it is served, counting whether a prefetch covered it"""
+        with self._lock:
+            self._expire()
+            reader = self._readers.get((client, result_set.cursor))
+            if reader is None:
+                return
+            reader.last_seen = time.monotonic()
+            if reader.deadline is not None:
+                reader.deadline.extend(self.idle_timeout)
+            if reader.prefetched_to <= reader.prefetched_from or offset < reader.prefetched_from:
+                return
+            stop = offset + limit if result_set.total is None else min(offset + limit, result_set.total)
+            if len(result_set) >= stop:
+                event = 'hit'
+            elif reader.running and reader.prefetched_to >= stop:
+                event = 'late'
+            else:
+                event = 'miss'
+        self.counters.increment(self._resource(result_set), event)
+
+    def end(self, client: str, result_set, offset: int, limit: int, records: List[Dict[str, Any]]):
+        """Note a served read and start prefetching if the client reads sequentially"""
+        if not self.enabled or limit < 1:
+            return
+        with self._lock:
+            key = (client, result_set.cursor)
+            reader = self._readers.get(key)
+            if reader is None or reader.result_set is not result_set:
+                reader = self._readers[key] = _Reader(result_set)
+            reader.streak = reader.streak + 1 if offset == reader.next_offset else 0
+            reader.next_offset = offset + limit
+            reader.last_seen = time.monotonic()
+            if records:
+                # Sizing every record would cost as much as serialising it; sample one
+                reader.record_bytes = len(json.dumps(records[0], default=str))
+            if reader.streak < 1 or result_set.complete or reader.running:
+                return
+            pages = min(self.max_pages, 2 ** (reader.streak - 1))
+            stop = reader.next_offset + pages * limit
+            if result_set.total is not None:
+                stop = min(stop, result_set.total)
+            start = max(len(result_set), reader.next_offset)
+            if stop <= start:
+                return
+            spare = self.max_bytes - sum(r.speculative_bytes() for r in self._readers.values())
+            if reader.record_bytes:
+                stop = min(stop, start + max(0, spare) // reader.record_bytes)
+            if stop <= start:
+                self.counters.increment(self._resource(result_set), 'over_budget')
+                return
+            if start > reader.prefetched_to:
+                reader.prefetched_from = start
+            reader.prefetched_to = stop
+            reader.deadline = Deadline(self.idle_timeout)
+            reader.job = self._executor.submit(self._run, reader, limit, stop, reader.deadline)
+        self.counters.increment(self._resource(result_set), 'started')
+        self.counters.increment(self._resource(result_set), 'records_requested', stop - start)
+
+    def _run(self, reader: _Reader, page: int, stop: int, deadline: Deadline):
+        resource = self._resource(reader.result_set)
+        token = current_deadline.set(deadline)
+        before = len(reader.result_set)
+        try:
+            # One page at a time, so a read of a page already fetched never waits for the whole prefetch
+            for page_stop in range(before + page, stop + page, page):
+                reader.result_set.fill(min(page_stop, stop))
+        except DeadlineExceeded:
+            self.counters.increment(resource, 'cancelled')
+        except Exception as e:
+            self.counters.increment(resource, 'error')
+            logging.warning(f"Prefetch of cursor {reader.result_set.cursor} failed: {str(e)}")
+        finally:
+            current_deadline.reset(token)
+            self.counters.increment(resource, 'records_fetched', max(0, len(reader.result_set) - before))
+
+    def _expire(self):
+        now = time.monotonic()
+        for key, reader in list(self._readers.items()):
+            if now - reader.last_seen > self.idle_timeout:
+                if reader.deadline is not None:
+                    reader.deadline.cancel()
+                del self._readers[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire()
+            readers = len(self._readers)
+            running = sum(1 for r in self._readers.values() if r.running)
+            speculative = sum(r.speculative_bytes() for r in self._readers.values())
+        by_resource = self.counters.snapshot()
+        totals: Dict[str, int] = {}
+        for events in by_resource.values():
+            for event, count in events.items():
+                totals[event] = totals.get(event, 0) + count
+        served = totals.get('hit', 0) + totals.get('late', 0) + totals.get('miss', 0)
+        return {'enabled': self.enabled, 'max_pages': self.max_pages, 'max_bytes': self.max_bytes,
+                'readers': readers, 'running': running, 'speculative_bytes': speculative,
+                'hit_rate': round(totals.get('hit', 0) / served, 3) if served else None,
+                'totals': totals, 'resources': by_resource}
+
+
+# Prefetcher of the server process
+prefetcher = Prefetcher()
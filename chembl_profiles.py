@@ -0,0 +1,187 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from chembl_webresource_client.new_client import new_client
+from chembl_paging import fetch_all, iter_pages, submit_with_context, FAN_OUT
+from chembl_aggregate import ActivityAggregator, ACTIVITY_FIELDS
+from chembl_cache import cache, MISSING
+from chembl_tracing import span
+
+# Number of IDs sent in one __in filter
+BATCH_SIZE = 100
+
+MOLECULE_FIELDS = ('molecule_chembl_id', 'pref_name', 'max_phase', 'molecule_type', 'molecule_structures')
+MECHANISM_FIELDS = ('molecule_chembl_id', 'mechanism_of_action', 'action_type', 'target_chembl_id')
+INDICATION_FIELDS = ('molecule_chembl_id', 'mesh_id', 'mesh_heading', 'efo_term', 'max_phase_for_ind')
+WARNING_FIELDS = ('molecule_chembl_id', 'warning_type', 'warning_class', 'meddra_term', 'warning_country')
+TARGET_FIELDS = ('target_chembl_id', 'pref_name', 'target_type', 'organism')
+PROFILE_ACTIVITY_FIELDS = ('molecule_chembl_id', 'standard_type', 'standard_value', 'standard_units', 'pchembl_value')
+
+
+def _fetch_and_cache(resource: str, key_field: str, ids: Sequence[str],
+                     fields: Optional[Tuple[str, ...]]) -> Dict[str, List[Dict[str, Any]]]:
+    def fetch(batch):
+        queryset = getattr(new_client, resource).filter(**{key_field + '__in': ','.join(batch)})
+        if fields:
+            queryset = queryset.only(*fields)
+        return fetch_all(queryset)
+
+    batches = [ids[i:i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+    fetched: Dict[str, List[Dict[str, Any]]] = {id: [] for id in ids}
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(FAN_OUT, len(batches))) as executor:
+            futures = [submit_with_context(executor, fetch, batch) for batch in batches]
+            for future in futures:
+                for record in future.result():
+                    fetched.setdefault(record.get(key_field), []).append(record)
+    for id in ids:
+        cache.set((resource, key_field, id, fields), fetched[id])
+    return fetched
+
+
+def fetch_related(resource: str, key_field: str, ids: Iterable[str],
+                  fields: Optional[Sequence[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetch the records of resource whose key_field is one of ids
+
+    IDs already in the shared cache are served from it; the rest are fetched
+    with batched key_field__in filters, concurrently, and cached per ID
+    (including IDs without records). IDs cached under an earlier ChEMBL
+    release are served as cached and refreshed in the background.
+
+    Args:
+        resource: Resource name, e.g. 'mechanism'
+        key_field: Field the IDs refer to, e.g. 'molecule_chembl_id'
+        ids: IDs to fetch
+        fields: Fields to return; key_field is always included
+
+    Returns:
+        Mapping of each ID to its list of records
+    """
+    fields = tuple(dict.fromkeys((key_field,) + tuple(fields))) if fields else None
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    missing = []
+    stale = []
+    with span('cache.lookup', resource=resource) as lookup_span:
+        for id in dict.fromkeys(ids):
+            records, current = cache.lookup((resource, key_field, id, fields))
+            if records is MISSING:
+                missing.append(id)
+                continue
+            results[id] = records
+            if not current:
+                stale.append(id)
+        lookup_span.set(hits=len(results), stale=len(stale), misses=len(missing))
+    if stale:
+        cache.refresh_in_background((resource, key_field, tuple(stale), fields),
+                                    lambda: _fetch_and_cache(resource, key_field, stale, fields))
+    if missing:
+        results.update(_fetch_and_cache(resource, key_field, missing, fields))
+    return results
+
+
+def _without(record: Dict[str, Any], field: str) -> Dict[str, Any]:
+    return {k: v for k, v in record.items() if k != field}
+
+
+def target_bioactivity_profile(target_chembl_id: str, min_pchembl: Optional[float] = None,
+                               max_molecules: int = 50, max_activities: int = 5000) -> Dict[str, Any]:
+    """Join a target with its most potent molecules, their mechanisms and indications
+
+    Args:
+        target_chembl_id: ChEMBL target ID
+        min_pchembl: Only consider activities with at least this pChEMBL value
+        max_molecules: Number of molecules to profile, best pChEMBL first
+        max_activities: Maximum number of activities to scan, best pChEMBL first
+
+    Returns:
+        Denormalised profile of the target
+    """
+    filters = {'target_chembl_id': target_chembl_id, 'pchembl_value__isnull': 'false'}
+    if min_pchembl is not None:
+        filters['pchembl_value__gte'] = min_pchembl
+    activities_qs = new_client.activity.filter(**filters).order_by('-pchembl_value').only(*PROFILE_ACTIVITY_FIELDS)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        target_future = submit_with_context(executor, fetch_related, 'target', 'target_chembl_id', [target_chembl_id], TARGET_FIELDS)
+        activities = fetch_all(activities_qs, max_records=max_activities)
+        target = target_future.result()[target_chembl_id]
+
+    by_molecule: Dict[str, List[Dict[str, Any]]] = {}
+    for activity in activities:
+        by_molecule.setdefault(activity.get('molecule_chembl_id'), []).append(activity)
+    molecule_ids = [m for m in by_molecule if m][:max_molecules]
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        molecules_future = submit_with_context(executor, fetch_related, 'molecule', 'molecule_chembl_id', molecule_ids, MOLECULE_FIELDS)
+        mechanisms_future = submit_with_context(executor, fetch_related, 'mechanism', 'molecule_chembl_id', molecule_ids, MECHANISM_FIELDS)
+        indications_future = submit_with_context(executor, fetch_related, 'drug_indication', 'molecule_chembl_id', molecule_ids, INDICATION_FIELDS)
+        molecules = molecules_future.result()
+        mechanisms = mechanisms_future.result()
+        indications = indications_future.result()
+
+    profiles = []
+    for molecule_id in molecule_ids:
+        molecule = (molecules[molecule_id] or [{}])[0]
+        molecule_activities = by_molecule[molecule_id]
+        structures = molecule.get('molecule_structures') or {}
+        profiles.append({
+            'molecule_chembl_id': molecule_id,
+            'pref_name': molecule.get('pref_name'),
+            'max_phase': molecule.get('max_phase'),
+            'molecule_type': molecule.get('molecule_type'),
+            'canonical_smiles': structures.get('canonical_smiles'),
+            'best_pchembl_value': molecule_activities[0].get('pchembl_value'),
+            'activity_count': len(molecule_activities),
+            'standard_types': sorted({a.get('standard_type') for a in molecule_activities if a.get('standard_type')}),
+            'mechanisms': [_without(r, 'molecule_chembl_id') for r in mechanisms[molecule_id]],
+            'drug_indications': [_without(r, 'molecule_chembl_id') for r in indications[molecule_id]],
+        })
+    return {
+        'target': target[0] if target else None,
+        'activities_scanned': len(activities),
+        'activities_truncated': len(activities) >= max_activities,
+        'molecule_count': len(by_molecule),
+        'molecules': profiles,
+    }
+
+
+def molecule_full_profile(molecule_chembl_id: str) -> Dict[str, Any]:
+    """Join a molecule with its activity summary, mechanisms, targets, indications and warnings
+
+    Args:
+        molecule_chembl_id: ChEMBL molecule ID
+
+    Returns:
+        Denormalised profile of the molecule
+    """
+    ids = [molecule_chembl_id]
+    activities_qs = new_client.activity.filter(molecule_chembl_id=molecule_chembl_id).only(*ACTIVITY_FIELDS)
+
+    def summarise_activities():
+        aggregator = ActivityAggregator()
+        aggregator.add_pages(iter_pages(activities_qs))
+        summary = aggregator.result(top_n=0)
+        del summary['top_molecules'], summary['molecule_count']
+        return summary
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        molecule_future = submit_with_context(executor, fetch_related, 'molecule', 'molecule_chembl_id', ids)
+        mechanisms_future = submit_with_context(executor, fetch_related, 'mechanism', 'molecule_chembl_id', ids, MECHANISM_FIELDS)
+        indications_future = submit_with_context(executor, fetch_related, 'drug_indication', 'molecule_chembl_id', ids, INDICATION_FIELDS)
+        warnings_future = submit_with_context(executor, fetch_related, 'drug_warning', 'molecule_chembl_id', ids, WARNING_FIELDS)
+        activities_future = submit_with_context(executor, summarise_activities)
+        molecule = molecule_future.result()[molecule_chembl_id]
+        mechanisms = mechanisms_future.result()[molecule_chembl_id]
+        indications = indications_future.result()[molecule_chembl_id]
+        warnings = warnings_future.result()[molecule_chembl_id]
+        activity_summary = activities_future.result()
+
+    target_ids = [m['target_chembl_id'] for m in mechanisms if m.get('target_chembl_id')]
+    targets = fetch_related('target', 'target_chembl_id', target_ids, TARGET_FIELDS)
+    return {
+        'molecule': molecule[0] if molecule else None,
+        'activity_summary': activity_summary,
+        'mechanisms': [dict(_without(m, 'molecule_chembl_id'), target=(targets.get(m.get('target_chembl_id')) or [None])[0])
+                       for m in mechanisms],
+        'drug_indications': [_without(r, 'molecule_chembl_id') for r in indications],
+        'drug_warnings': [_without(r, 'molecule_chembl_id') for r in warnings],
+    }
@@ -0,0 +1,271 @@
+from typing import Any, Callable, Dict, List, Optional
+from collections import Counter
+import asyncio
+import contextlib
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+PROFILE_MODES = ('deterministic', 'sampling')
+
+# Directory profiles are written to; set from the server command line
+profile_dir = os.path.join(tempfile.gettempdir(), 'chembl_profiles')
+
+# Seconds between stack samples in sampling mode
+SAMPLE_INTERVAL = 0.005
+
+# Allocation sites listed in the memory report
+MEMORY_TOP = 25
+
+# Profile run of the tool call executing in the current context
+active_run: contextvars.ContextVar[Optional['ProfileRun']] = contextvars.ContextVar('active_run', default=None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class ProfileRun:
+    """Profile of one tool call
+
+    Deterministic mode runs cProfile in every worker thread the call hands
+    work to and merges the results; sampling mode records the stacks of those
+    threads, and of the event loop thread, every SAMPLE_INTERVAL seconds.
+    Optionally tracemalloc snapshots are taken before and after the call;
+    the Profiler starts and stops tracemalloc itself, as runs may overlap.
+    """
+
+    def __init__(self, tool: str, mode: str, memory: bool):
+        self.tool = tool
+        self.mode = mode
+        self.memory = memory
+        self.name = f"{tool}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.stats: Optional[pstats.Stats] = None
+        self.stacks: Counter = Counter()
+        self.threads = {threading.get_ident()}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._snapshot = None
+        # Whether the traced memory peak was reset for this run alone, rather than shared with overlapping runs
+        self.own_peak = False
+        self.started = 0.0
+        self.duration = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.memory:
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.mode == 'sampling':
+            self._sampler = threading.Thread(target=self._sample, name='chembl_profile_sampler', daemon=True)
+            self._sampler.start()
+
+    def run(self, fn: Callable[[], Any]) -> Any:
+        """Run fn in the current worker thread as part of this profile"""
+        ident = threading.get_ident()
+        with self._lock:
+            self.threads.add(ident)
+        if self.mode != 'deterministic':
+            try:
+                return fn()
+            finally:
+                with self._lock:
+                    self.threads.discard(ident)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return fn()
+        finally:
+            profile.disable()
+            with self._lock:
+                self.threads.discard(ident)
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            with self._lock:
+                threads = set(self.threads)
+            for ident, frame in sys._current_frames().items():
+                if ident not in threads:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def end(self):
+        """Mark the end of the call, stopping the sampler"""
+        self.duration = time.perf_counter() - self.started
+        self._stop.set()
+
+    def write(self) -> List[str]:
+        """Write the files of the ended profile; slow, so run it in a worker thread
+
+        Returns:
+            Paths of the files written
+        """
+        if self._sampler is not None:
+            self._sampler.join()
+        os.makedirs(profile_dir, exist_ok=True)
+        base = os.path.join(profile_dir, self.name)
+        files = []
+        if self.stats is not None:
+            self.stats.dump_stats(base + '.pstats')
+            files.append(base + '.pstats')
+        if self.stacks:
+            with open(base + '.collapsed', 'w') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+            files.append(base + '.collapsed')
+        if self.memory:
+            files.extend(self._write_memory(base))
+        return files
+
+    def _write_memory(self, base: str) -> List[str]:
+        # Leave out the profilers' own bookkeeping
+        filters = [tracemalloc.Filter(False, module.__file__) for module in (tracemalloc, cProfile, pstats, sys.modules[__name__])]
+        snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot.dump(base + '.tracemalloc')
+        report = io.StringIO()
+        during = 'during the call' if self.own_peak else 'since an overlapping profiled call started'
+        report.write(f"{self.tool}: traced memory {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB {during}\n\n")
+        for stat in snapshot.compare_to(self._snapshot.filter_traces(filters), 'lineno')[:MEMORY_TOP]:
+            report.write(f"{stat}\n")
+        with open(base + '.memory.txt', 'w') as f:
+            f.write(report.getvalue())
+        return [base + '.tracemalloc', base + '.memory.txt']
+
+
+class Profiler:
+    """Arms profiling of the next calls of a tool, or of any tool with '*'"""
+
+    def __init__(self):
+        self._armed: Dict[str, Dict[str, Any]] = {}
+        self.written: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._memory_runs = 0
+        self._started_tracemalloc = False
+
+    def arm(self, tool: str, mode: str = 'deterministic', calls: int = 1, memory: bool = False) -> Dict[str, Any]:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}; choose from {', '.join(PROFILE_MODES)}")
+        if calls < 1:
+            raise ValueError("calls must be at least 1")
+        request = {'tool': tool, 'mode': mode, 'remaining': calls, 'memory': memory}
+        with self._lock:
+            self._armed[tool] = request
+        logging.info(f"Profiling the next {calls} call(s) of {tool} ({mode}{', memory' if memory else ''})")
+        return dict(request)
+
+    def disarm(self, tool: str) -> bool:
+        with self._lock:
+            return self._armed.pop(tool, None) is not None
+
+    def _take(self, tool: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            request = self._armed.get(tool) or self._armed.get('*')
+            if request is None:
+                return None
+            request['remaining'] -= 1
+            if request['remaining'] <= 0:
+                del self._armed[request['tool']]
+            return dict(request)
+
+    def _start_memory(self) -> bool:
+        """Start tracing allocations for a memory run
+
+        Returns:
+            Whether the run is the only memory run, so the traced peak was reset for it
+        """
+        with self._lock:
+            self._memory_runs += 1
+            if self._memory_runs > 1:
+                # Resetting the peak would corrupt the figure of the runs in progress
+                return False
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+            return True
+
+    def _stop_memory(self):
+        """Stop tracing allocations once the last memory run has written its files"""
+        with self._lock:
+            self._memory_runs -= 1
+            if self._memory_runs == 0 and self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+    def _finish(self, run: ProfileRun):
+        try:
+            files = run.write()
+        except Exception as e:
+            logging.error(f"Writing the profile of {run.tool} failed: {str(e)}")
+            files = []
+        finally:
+            if run.memory:
+                self._stop_memory()
+        with self._lock:
+            self.written.append({'tool': run.tool, 'mode': run.mode, 'seconds': round(run.duration, 3), 'files': files})
+        logging.info(f"Profile of {run.tool} written to {', '.join(files) or 'nothing (no work was profiled)'}")
+
+    @contextlib.contextmanager
+    def profile_call(self, tool: str):
+        """Profile the enclosed tool call if profiling is armed for it
+
+        The profile is written in a worker thread once the call has ended,
+        so writing it neither stalls the event loop nor fails the call.
+        """
+        if not self._armed or active_run.get() is not None:
+            yield
+            return
+        request = self._take(tool)
+        if request is None:
+            yield
+            return
+        run = ProfileRun(tool, request['mode'], request['memory'])
+        if run.memory:
+            run.own_peak = self._start_memory()
+        token = active_run.set(run)
+        run.start()
+        try:
+            yield
+        finally:
+            active_run.reset(token)
+            run.end()
+            try:
+                asyncio.get_running_loop().run_in_executor(None, self._finish, run)
+            except RuntimeError:
+                # Not called from the event loop
+                self._finish(run)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'directory': profile_dir, 'armed': [dict(r) for r in self._armed.values()],
+                    'written': list(self.written)}
+
+
+def in_profile(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """Wrap fn, about to be handed to a worker thread, so it joins the active profile run"""
+    run = active_run.get()
+    if run is None:
+        return fn
+    return lambda: run.run(fn)
+
+
+# Profiler of the server process
+profiler = Profiler()
@@ -0,0 +1,273 @@
+from typing import Any, Dict, List, Optional, Tuple
+from array import array
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+import chembl_settings  # applies CHEMBL_API_URL before the client loads its API description
+from chembl_webresource_client.new_client import new_client
+from chembl_paging import fetch_into
+from chembl_releases import current_release
+
+# Numeric fields of molecule_properties stored as columns. Integers are stored as float32 too,
+# which is exact for these ranges and lets missing values be NaN.
+COLUMNS = (
+    'full_mwt', 'mw_freebase', 'mw_monoisotopic', 'alogp', 'cx_logp', 'cx_logd', 'cx_most_apka',
+    'cx_most_bpka', 'hba', 'hbd', 'hba_lipinski', 'hbd_lipinski', 'psa', 'rtb', 'num_ro5_violations',
+    'num_lipinski_ro5_violations', 'qed_weighted', 'aromatic_rings', 'heavy_atoms', 'np_likeness_score',
+)
+
+# Columns holding counts, returned as integers
+INTEGER_COLUMNS = frozenset(('hba', 'hbd', 'hba_lipinski', 'hbd_lipinski', 'rtb', 'num_ro5_violations',
+                             'num_lipinski_ro5_violations', 'aromatic_rings', 'heavy_atoms'))
+
+OPERATORS = ('exact', 'lt', 'lte', 'gt', 'gte', 'range', 'isnull')
+
+_COMPARISONS = {'exact': np.equal, 'lt': np.less, 'lte': np.less_equal, 'gt': np.greater, 'gte': np.greater_equal}
+
+# Directory holding the table; set from the server command line
+table_dir = os.path.join(tempfile.gettempdir(), 'chembl_property_table')
+
+
+def as_number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class PropertyTable:
+    """Molecule property columns memory-mapped from .npy files, one row per molecule
+
+    Filters are evaluated as NumPy boolean masks over whole columns; missing
+    values are NaN and never satisfy a comparison.
+
+    Args:
+        path: Directory written by build_table
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.ids = np.load(os.path.join(path, 'molecule_chembl_id.npy'), mmap_mode='r')
+        self.columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                        for name in self.meta['columns']}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            raise ValueError(f"Unknown property {name!r}; properties are {', '.join(self.columns)}")
+        return self.columns[name]
+
+    def mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask of the rows matching every filter
+
+        Args:
+            filters: Mapping of property or property__operator to value, e.g. {'full_mwt__lt': 500}
+
+        Returns:
+            Boolean array with one element per molecule
+        """
+        selected = np.ones(len(self), dtype=bool)
+        matches = np.empty(len(self), dtype=bool)
+        for lookup, value in filters.items():
+            name, _, operator = lookup.partition('__')
+            operator = operator or 'exact'
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown operator {operator!r} in {lookup!r}; operators are {', '.join(OPERATORS)}")
+            column = self._column(name)
+            if operator == 'isnull':
+                np.isnan(column, out=matches)
+                if value not in (True, 'true', 1):
+                    np.logical_not(matches, out=matches)
+            elif operator == 'range':
+                if not isinstance(value, (list, tuple)) or len(value) != 2:
+                    raise ValueError(f"Filter {lookup!r} needs a [low, high] pair")
+                np.greater_equal(column, float(value[0]), out=matches)
+                selected &= matches
+                np.less_equal(column, float(value[1]), out=matches)
+            elif isinstance(value, (list, tuple, dict)):
+                raise ValueError(f"Filter {lookup!r} takes a single number")
+            else:
+                _COMPARISONS[operator](column, float(value), out=matches)
+            selected &= matches
+        return selected
+
+    def select(self, filters: Dict[str, Any], order_by: Optional[str] = None, offset: int = 0,
+               limit: int = 100) -> Tuple[int, np.ndarray]:
+        """Find the rows matching filters
+
+        Args:
+            filters: As for mask()
+            order_by: Property to order by, prefixed with '-' for descending; missing values sort last
+            offset: Number of matching rows to skip
+            limit: Maximum number of rows to return
+
+        Returns:
+            Number of matching rows and the indices of the requested ones
+        """
+        rows = np.flatnonzero(self.mask(filters))
+        total = len(rows)
+        if order_by and total:
+            descending = order_by.startswith('-')
+            values = np.asarray(self._column(order_by.lstrip('-'))[rows])
+            keys = np.where(np.isnan(values), np.inf, -values if descending else values)
+            wanted = offset + limit
+            if wanted < total:
+                # Only the rows up to offset + limit need to be in order. argpartition picks
+                # arbitrarily among rows tied at the boundary, so keep all of them and let
+                # the row index break ties, or pages could overlap or skip rows
+                boundary = np.partition(keys, wanted - 1)[wanted - 1]
+                candidates = np.flatnonzero(keys <= boundary)
+                rows, keys = rows[candidates], keys[candidates]
+            rows = rows[np.lexsort((rows, keys))]
+        return total, rows[offset:offset + limit]
+
+    def records(self, rows: np.ndarray, properties: bool = True) -> List[Dict[str, Any]]:
+        """Rows as records with molecule_chembl_id and, optionally, every property"""
+        records = []
+        for row in rows:
+            record = {'molecule_chembl_id': self.ids[row].decode()}
+            if properties:
+                for name, column in self.columns.items():
+                    value = float(column[row])
+                    if np.isnan(value):
+                        record[name] = None
+                    else:
+                        record[name] = int(value) if name in INTEGER_COLUMNS else round(value, 4)
+            records.append(record)
+        return records
+
+    @property
+    def release(self) -> Optional[str]:
+        return self.meta.get('release')
+
+    def info(self) -> Dict[str, Any]:
+        return {'release': self.release, 'generation': self.meta.get('generation', 1), 'built': self.meta.get('built'),
+                'molecules': len(self), 'properties': list(self.columns)}
+
+
+def _generation_dirs(path: str) -> List[Tuple[int, str]]:
+    parent, name = os.path.split(os.path.abspath(path))
+    found = []
+    for entry in os.listdir(parent or '.'):
+        if entry.startswith(f"{name}.gen") and entry[len(name) + 4:].isdigit():
+            found.append((int(entry[len(name) + 4:]), os.path.join(parent, entry)))
+    return sorted(found)
+
+
+def table_generation(path: str) -> int:
+    """Generation of the table at path, 0 if there is none"""
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f).get('generation', 1)
+    except FileNotFoundError:
+        return 0
+
+
+def write_table(path: str, ids: np.ndarray, columns: Dict[str, np.ndarray], release: Optional[str]) -> PropertyTable:
+    """Write a new generation of the table and switch path to it
+
+    Each generation is a directory next to path, and path is a symbolic
+    link to the current one, replaced atomically. Servers that opened the
+    previous generation keep reading it until they switch; it is kept on
+    disk as a fallback and older generations are removed.
+
+    Args:
+        path: Table location
+        ids: molecule_chembl_id of each row, as bytes
+        columns: Property name to float32 values, one per row
+        release: ChEMBL release the data belongs to
+
+    Returns:
+        The new table
+    """
+    generation = max([table_generation(path)] + [g for g, _ in _generation_dirs(path)]) + 1
+    directory = f"{os.path.abspath(path)}.gen{generation}"
+    os.makedirs(directory)
+    np.save(os.path.join(directory, 'molecule_chembl_id.npy'), ids)
+    for name, values in columns.items():
+        np.save(os.path.join(directory, f'{name}.npy'), values.astype(np.float32, copy=False))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({'release': release, 'built': time.time(), 'rows': len(ids), 'columns': list(columns),
+                   'generation': generation}, f)
+    link = f"{os.path.abspath(path)}.link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(directory), link)
+    if os.path.isdir(path) and not os.path.islink(path):
+        # A table written before generations were introduced
+        shutil.rmtree(path)
+    os.replace(link, path)
+    for _, old in _generation_dirs(path)[:-2]:
+        shutil.rmtree(old, ignore_errors=True)
+    return PropertyTable(path)
+
+
+def build_table(path: str) -> PropertyTable:
+    """Fetch the properties of every molecule from ChEMBL and write them as a new generation of the table"""
+    try:
+        release = current_release()
+    except Exception as e:
+        logging.warning(f"Could not determine the ChEMBL release: {str(e)}")
+        release = None
+    ids: List[str] = []
+    columns = {name: array('f') for name in COLUMNS}
+    seen = {name: False for name in COLUMNS}
+
+    def append(page: List[Dict[str, Any]]):
+        for record in page:
+            ids.append(record.get('molecule_chembl_id') or '')
+            properties = record.get('molecule_properties') or {}
+            for name in COLUMNS:
+                value = properties.get(name)
+                seen[name] = seen[name] or value is not None
+                columns[name].append(as_number(value))
+        if len(ids) % 100000 < len(page):
+            logging.info(f"Fetched the properties of {len(ids)} molecules")
+
+    fetch_into(new_client.molecule.only('molecule_chembl_id', 'molecule_properties'), append)
+    table = write_table(path, np.array(ids, dtype='S'),
+                        {name: np.frombuffer(columns[name], dtype=np.float32) for name in COLUMNS if seen[name]}, release)
+    logging.info(f"Wrote the properties of {len(ids)} molecules to {path}")
+    return table
+
+
+_table: Optional[PropertyTable] = None
+_table_lock = threading.Lock()
+
+
+def get_table() -> PropertyTable:
+    """Return the table at table_dir, opening it on first use"""
+    global _table
+    with _table_lock:
+        if _table is None:
+            if not os.path.exists(os.path.join(table_dir, 'meta.json')):
+                raise FileNotFoundError(f"No molecule property table at {table_dir}; "
+                                        f"build it with: python chembl_properties.py --output {table_dir}")
+            _table = PropertyTable(table_dir)
+            logging.info(f"Opened the property table of {len(_table)} molecules at {table_dir}")
+        return _table
+
+
+def install_table(table: PropertyTable):
+    """Serve table from now on; calls already holding the previous table finish with it"""
+    global _table
+    with _table_lock:
+        _table = table
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Build the molecule property table of the ChEMBL MCP server')
+    parser.add_argument('--output', type=str, default=table_dir, help='Directory to write the table to')
+    args = parser.parse_args()
+    build_table(args.output)
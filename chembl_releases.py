@@ -0,0 +1,138 @@
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import threading
+import time
+import requests
+from chembl_webresource_client.settings import Settings
+from chembl_webresource_client.utils import utils
+from chembl_paging import shared_session
+from chembl_cache import cache
+from chembl_schema import clear_schemas
+from chembl_store import store
+
+# Seconds between release checks
+CHECK_INTERVAL = 60 * 60
+
+
+def status_url() -> str:
+    """URL of the ChEMBL web services status document"""
+    base = Settings.Instance().UTILS_SPORE_URL
+    if base.endswith('/spore'):
+        base = base[:-len('/spore')]
+    return f"{base}/status"
+
+
+def current_release(timeout: Optional[float] = None) -> str:
+    """Ask the web services which ChEMBL release they are serving
+
+    Uses a plain request so the answer never comes from the HTTP cache.
+    Falls back to the newest entry of the chembl_release resource when the
+    status document has no version.
+
+    Returns:
+        Release name, e.g. 'CHEMBL_35'
+    """
+    timeout = Settings.Instance().TIMEOUT if timeout is None else timeout
+    res = requests.get(status_url(), timeout=timeout)
+    res.raise_for_status()
+    release = res.json().get('chembl_db_version')
+    if release:
+        return release
+    url = f"{Settings.Instance().NEW_CLIENT_URL}/chembl_release.json"
+    res = requests.get(url, params={'order_by': '-creation_date', 'limit': 1}, timeout=timeout)
+    res.raise_for_status()
+    releases = res.json().get('chembl_releases') or []
+    if not releases:
+        raise ValueError("ChEMBL did not report a release")
+    return releases[0]['chembl_release']
+
+
+def _clear_http_caches():
+    for session in (shared_session(), utils.session):
+        if hasattr(session, 'cache'):
+            session.cache.clear()
+
+
+class ReleaseWatcher:
+    """Polls ChEMBL for its current release and invalidates derived data when it changes
+
+    Cache entries of the old release stay readable and are refreshed in the
+    background the next time they are requested; result sets are re-fetched
+    by the next query for them. The HTTP caches and loaded schemas are
+    cleared, since they are keyed on URLs that do not change between releases.
+
+    Args:
+        interval: Seconds between checks
+        fetch_release: Callable returning the current release name
+    """
+
+    def __init__(self, interval: float = CHECK_INTERVAL, fetch_release: Callable[[], str] = current_release):
+        self.interval = interval
+        self.fetch_release = fetch_release
+        self.release: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.history: List[Dict[str, Any]] = []
+        # Called with the previous and the new release after a change has been applied
+        self.listeners: List[Callable[[Optional[str], str], Any]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def check(self) -> Optional[str]:
+        """Check the release now and apply a change
+
+        Returns:
+            The current release, or None if it could not be determined
+        """
+        try:
+            release = self.fetch_release()
+        except Exception as e:
+            logging.warning(f"Could not check the ChEMBL release: {str(e)}")
+            return None
+        with self._lock:
+            self.checked_at = time.time()
+            if release == self.release:
+                return release
+            previous, self.release = self.release, release
+            stale = cache.set_release(release)
+            store.set_release(release)
+            if previous is not None:
+                clear_schemas()
+                _clear_http_caches()
+                logging.info(f"ChEMBL release changed from {previous} to {release}; {stale} cache entries will be refreshed")
+            else:
+                logging.info(f"Serving ChEMBL release {release}")
+            self.history.append({'release': release, 'detected_at': self.checked_at, 'stale_entries': stale})
+        for listener in self.listeners:
+            try:
+                listener(previous, release)
+            except Exception as e:
+                logging.warning(f"Release listener failed: {str(e)}")
+        return release
+
+    def start(self):
+        """Check once, then keep checking in a daemon thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.check()
+        self._thread = threading.Thread(target=self._run, name='chembl_release_watcher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def info(self) -> Dict[str, Any]:
+        return {'release': self.release, 'checked_at': self.checked_at,
+                'check_interval': self.interval, 'history': list(self.history)}
+
+
+# Watcher started by the server
+watcher = ReleaseWatcher()
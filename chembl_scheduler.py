@@ -0,0 +1,196 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import itertools
+
+# Lanes and their default number of concurrently running calls. Cheap calls get their own lane
+# so they never wait behind bulk fetches.
+LANE_CAPACITY = {'fast': 32, 'bulk': 8}
+
+# Calls a single client may have running at once in each lane
+CLIENT_MAX_RUNNING = {'fast': 16, 'bulk': 4}
+
+# Calls a single client may have waiting in a lane before further calls are rejected
+CLIENT_MAX_QUEUED = 64
+
+
+class QuotaExceeded(RuntimeError):
+    """Raised when a client has too many calls waiting in a lane"""
+
+
+class _Client:
+    def __init__(self, name: str, weight: float):
+        self.name = name
+        self.weight = weight
+        self.queue: deque = deque()
+        self.running = 0
+        self.finish_tag = 0.0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+
+class Lane:
+    """Weighted fair queue of tool calls in front of a fixed number of running slots
+
+    Each client has its own FIFO queue. When a slot frees up, the waiting call
+    with the smallest virtual start tag runs next; tags advance by 1 / weight
+    per call, so over time clients get slots in proportion to their weights
+    however many calls each of them has queued (start-time fair queuing).
+
+    Args:
+        name: Lane name
+        capacity: Maximum number of calls running at once
+        client_max_running: Maximum running calls per client
+        client_max_queued: Maximum waiting calls per client
+    """
+
+    def __init__(self, name: str, capacity: int, client_max_running: int, client_max_queued: int = CLIENT_MAX_QUEUED):
+        self.name = name
+        self.capacity = capacity
+        self.client_max_running = client_max_running
+        self.client_max_queued = client_max_queued
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.virtual_time = 0.0
+        self.clients: Dict[str, _Client] = {}
+        self._sequence = itertools.count()
+
+    def _client(self, name: str, weight: float) -> _Client:
+        client = self.clients.get(name)
+        if client is None:
+            client = self.clients[name] = _Client(name, weight)
+        client.weight = weight
+        return client
+
+    async def acquire(self, client_name: str, weight: float = 1.0) -> _Client:
+        client = self._client(client_name, weight)
+        if not client.queue and client.running < self.client_max_running and self.running < self.capacity:
+            self._start(client, max(self.virtual_time, client.finish_tag))
+            return client
+        if len(client.queue) >= self.client_max_queued:
+            client.rejected += 1
+            self.rejected += 1
+            raise QuotaExceeded(f"Client {client_name} already has {len(client.queue)} calls waiting in the "
+                                f"{self.name} lane; retry later")
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        client.queue.append((next(self._sequence), loop.time(), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the call was cancelled
+                self.release(client)
+            else:
+                client.queue = deque(item for item in client.queue if item[2] is not waiter)
+            raise
+        return client
+
+    def _start(self, client: _Client, start_tag: float):
+        self.virtual_time = start_tag
+        client.finish_tag = start_tag + 1.0 / client.weight
+        client.running += 1
+        self.running += 1
+
+    def release(self, client: _Client):
+        client.running -= 1
+        client.completed += 1
+        self.running -= 1
+        self.completed += 1
+        self._dispatch()
+        if not client.running and not client.queue:
+            # Forget idle clients so sessions do not accumulate; they rejoin at the current virtual time
+            del self.clients[client.name]
+
+    def _dispatch(self):
+        loop_time = None
+        while self.running < self.capacity:
+            best: Optional[Tuple[float, int, _Client]] = None
+            for client in self.clients.values():
+                if client.queue and client.running < self.client_max_running:
+                    tag = max(self.virtual_time, client.finish_tag)
+                    candidate = (tag, client.queue[0][0], client)
+                    if best is None or candidate[:2] < best[:2]:
+                        best = candidate
+            if best is None:
+                return
+            tag, _, client = best
+            _, queued_at, waiter = client.queue.popleft()
+            if waiter.cancelled():
+                continue
+            if loop_time is None:
+                loop_time = asyncio.get_running_loop().time()
+            client.wait_seconds += loop_time - queued_at
+            self._start(client, tag)
+            waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'capacity': self.capacity,
+            'running': self.running,
+            'queued': sum(len(c.queue) for c in self.clients.values()),
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'clients': {name: {'weight': c.weight, 'running': c.running, 'queued': len(c.queue),
+                               'completed': c.completed, 'rejected': c.rejected,
+                               'wait_seconds': round(c.wait_seconds, 3)}
+                        for name, c in self.clients.items()},
+        }
+
+
+class Scheduler:
+    """Routes tool calls to lanes and queues them fairly per client
+
+    Args:
+        lane_of: Maps a tool name to its lane
+    """
+
+    def __init__(self, lane_of: Callable[[str], str]):
+        self.lane_of = lane_of
+        self.lanes = {name: Lane(name, capacity, CLIENT_MAX_RUNNING[name]) for name, capacity in LANE_CAPACITY.items()}
+        self.weights: Dict[str, float] = {}
+        self.enabled = True
+
+    def configure(self, lane_capacity: Optional[Dict[str, int]] = None,
+                  client_max_running: Optional[Dict[str, int]] = None,
+                  client_max_queued: Optional[int] = None, weights: Optional[Dict[str, float]] = None):
+        for name, capacity in (lane_capacity or {}).items():
+            self._lane(name).capacity = capacity
+        for name, limit in (client_max_running or {}).items():
+            self._lane(name).client_max_running = limit
+        if client_max_queued is not None:
+            for lane in self.lanes.values():
+                lane.client_max_queued = client_max_queued
+        self.weights.update(weights or {})
+
+    def _lane(self, name: str) -> Lane:
+        if name not in self.lanes:
+            raise ValueError(f"Unknown lane {name!r}; lanes are {', '.join(self.lanes)}")
+        return self.lanes[name]
+
+    async def run(self, tool: str, client: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run call once the client's turn comes up in the tool's lane"""
+        if not self.enabled:
+            return await call()
+        lane = self._lane(self.lane_of(tool))
+        slot = await lane.acquire(client, self.weights.get(client, 1.0))
+        try:
+            return await call()
+        finally:
+            lane.release(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'enabled': self.enabled, 'lanes': {name: lane.stats() for name, lane in self.lanes.items()}}
+
+
+def parse_assignments(values: List[str], cast: Callable[[str], Any] = int) -> Dict[str, Any]:
+    """Parse NAME=VALUE command line values into a dict"""
+    parsed = {}
+    for value in values:
+        name, separator, setting = value.partition('=')
+        if not separator or not name:
+            raise ValueError(f"Expected NAME=VALUE, got {value!r}")
+        parsed[name] = cast(setting)
+    return parsed
@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+from chembl_webresource_client.settings import Settings
+from chembl_paging import shared_session
+
+# Lookup operators understood by the ChEMBL data API (Django/Tastypie style)
+LOOKUP_OPERATORS = frozenset([
+    'exact', 'iexact', 'contains', 'icontains', 'startswith', 'istartswith',
+    'endswith', 'iendswith', 'regex', 'iregex', 'gt', 'gte', 'lt', 'lte',
+    'range', 'in', 'isnull', 'search',
+])
+
+# Operators whose value is a list, sent upstream as a comma separated string
+LIST_OPERATORS = frozenset(['in', 'range'])
+
+_schemas: Dict[str, Dict[str, Any]] = {}
+_schemas_lock = threading.Lock()
+
+
+def resource_schema(resource: str) -> Optional[Dict[str, Any]]:
+    """Return the field definitions of a ChEMBL resource
+
+    Schemas are fetched from the data API once per process. Fetch failures
+    are not cached, so a later call retries.
+
+    Args:
+        resource: Resource name, e.g. 'activity'
+
+    Returns:
+        Mapping of field name to field definition, or None if unavailable
+    """
+    with _schemas_lock:
+        if resource in _schemas:
+            return _schemas[resource]
+    url = f"{Settings.Instance().NEW_CLIENT_URL}/{resource}/schema.json"
+    try:
+        res = shared_session().get(url, timeout=Settings.Instance().TIMEOUT)
+        res.raise_for_status()
+        fields = res.json()['fields']
+    except Exception as e:
+        logging.warning(f"Could not load schema for {resource}: {str(e)}")
+        return None
+    with _schemas_lock:
+        _schemas[resource] = fields
+    return fields
+
+
+def split_lookup(lookup: str) -> Tuple[List[str], str]:
+    """Split 'a__b__gte' into (['a', 'b'], 'gte'); the operator defaults to 'exact'"""
+    parts = lookup.split('__')
+    if len(parts) > 1 and parts[-1] in LOOKUP_OPERATORS:
+        return parts[:-1], parts[-1]
+    return parts, 'exact'
+
+
+def _check_field(resource: str, schema: Optional[Dict[str, Any]], path: List[str], what: str):
+    if not path or not all(path):
+        raise ValueError(f"Invalid {what} for {resource}: {'__'.join(path)!r}")
+    if schema is None:
+        return
+    name = path[0]
+    if name not in schema:
+        known = ', '.join(sorted(schema))
+        raise ValueError(f"Unknown {what} {name!r} for {resource}; known fields: {known}")
+    if len(path) > 1 and schema[name].get('type') not in (None, 'related', 'dict', 'list'):
+        raise ValueError(f"Field {name!r} of {resource} has no sub-fields")
+
+
+def validate_query(resource: str, filters: Optional[Dict[str, Any]] = None,
+                   order_by: Optional[List[str]] = None,
+                   fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Validate a query against the resource schema and normalise filter values
+
+    Args:
+        resource: Resource name
+        filters: Mapping of lookups (field or field__operator) to values
+        order_by: Fields to order by, optionally prefixed with '-'
+        fields: Fields to return
+
+    Returns:
+        Filters ready to pass to QuerySet.filter
+
+    Raises:
+        ValueError: If a field or operator is not valid for the resource
+    """
+    schema = resource_schema(resource)
+    normalised = {}
+    for lookup, value in (filters or {}).items():
+        path, operator = split_lookup(lookup)
+        _check_field(resource, schema, path, 'filter field')
+        if operator in LIST_OPERATORS:
+            if isinstance(value, (list, tuple)):
+                value = ','.join(str(v) for v in value)
+            if operator == 'range' and len(str(value).split(',')) != 2:
+                raise ValueError(f"Filter {lookup!r} needs exactly two values")
+        elif isinstance(value, (list, tuple, dict)):
+            raise ValueError(f"Filter {lookup!r} takes a single value; use __in for lists")
+        if isinstance(value, bool):
+            value = str(value).lower()
+        normalised[lookup] = value
+    for field in order_by or []:
+        _check_field(resource, schema, field.lstrip('-').split('__'), 'order_by field')
+    for field in fields or []:
+        _check_field(resource, schema, field.split('__'), 'field')
+    return normalised
+
+
+def clear_schemas():
+    """Forget the loaded schemas so they are fetched again, e.g. after a new ChEMBL release"""
+    with _schemas_lock:
+        _schemas.clear()
@@ -1,24 +1,33 @@
+import chembl_settings  # applies CHEMBL_API_URL before the client loads its API description
 import chembl_webresource_client
 from chembl_webresource_client.new_client import new_client
 from chembl_webresource_client.utils import utils
-import signal
+import asyncio
+import contextvars
 import time
-from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from chembl_paging import fetch_all, deadline, install_deadline_adapter, DeadlineRetry
+from chembl_cache import Cache
+
+# Enforce deadlines on utils requests as well as paged entity requests
+install_deadline_adapter(utils.session, DeadlineRetry(total=3), idempotent_posts=True)
+
 
 def timeout(seconds):
+    """Bound each call of the decorated function to seconds
+
+    The deadline is checked before every upstream page and caps every HTTP
+    request, retry and backoff, raising TimeoutError once it has passed. It is
+    held in a context variable rather than a signal, so it works from any
+    thread and from asyncio, and nested timeouts keep the earliest deadline.
+    Use deadline(seconds) as a context manager to bound a block instead.
+    """
     def decorator(func):
-        def _handle_timeout(signum, frame):
-            raise TimeoutError(f"Function execution exceeded {seconds} seconds")
-
         @wraps(func)
         def wrapper(*args, **kwargs):
-            signal.signal(signal.SIGALRM, _handle_timeout)
-            signal.alarm(seconds)
-            try:
-                result = func(*args, **kwargs)
-            finally:
-                signal.alarm(0)
-            return result
+            with deadline(seconds):
+                return func(*args, **kwargs)
         return wrapper
     return decorator
 
@@ -26,175 +35,175 @@ def timeout(seconds):
 def example_activity(assay_chembl_id):
     client = new_client
     activities = client.activity.filter(assay_chembl_id=assay_chembl_id)
-    return list(activities)
+    return fetch_all(activities)
 
 
 def example_activity_supplementary_data_by_activity(activity_chembl_id):
     client = new_client
     activity_supp_data = client.activity_supplementary_data_by_activity.filter(activity_chembl_id=activity_chembl_id)
-    return list(activity_supp_data)
+    return fetch_all(activity_supp_data)
 
 
 def example_assay(assay_type):
     client = new_client
     assays = client.assay.filter(assay_type=assay_type)
-    return list(assays)
+    return fetch_all(assays)
 
 
 def example_assay_class(assay_class_type):
     client = new_client
     assay_classes = client.assay_class.filter(assay_class_type=assay_class_type)
-    return list(assay_classes)
+    return fetch_all(assay_classes)
 
 
 def example_atc_class(level1):
     client = new_client
     atc_classes = client.atc_class.filter(level1=level1)
-    return list(atc_classes)
+    return fetch_all(atc_classes)
 
 
 def example_binding_site(site_name):
     client = new_client
     binding_sites = client.binding_site.filter(site_name=site_name)
-    return list(binding_sites)
+    return fetch_all(binding_sites)
 
 
 def example_biotherapeutic(biotherapeutic_type):
     client = new_client
     biotherapeutics = client.biotherapeutic.filter(biotherapeutic_type=biotherapeutic_type)
-    return list(biotherapeutics)
+    return fetch_all(biotherapeutics)
 
 
 def example_cell_line(cell_line_name):
     client = new_client
     cell_lines = client.cell_line.filter(cell_line_name=cell_line_name)
-    return list(cell_lines)
+    return fetch_all(cell_lines)
 
 
 def example_chembl_id_lookup(available_type, q):
     client = new_client
     chembl_ids = client.chembl_id_lookup.filter(available_type=available_type, q=q)
-    return list(chembl_ids)
+    return fetch_all(chembl_ids)
 
 
 def example_chembl_release():
     client = new_client
     chembl_releases = client.chembl_release.all()
-    return list(chembl_releases)
+    return fetch_all(chembl_releases)
 
 
 def example_compound_record(compound_name):
     client = new_client
     compound_records = client.compound_record.filter(compound_name=compound_name)
-    return list(compound_records)
+    return fetch_all(compound_records)
 
 
 def example_compound_structural_alert(alert_name):
     client = new_client
     structural_alerts = client.compound_structural_alert.filter(alert_name=alert_name)
-    return list(structural_alerts)
+    return fetch_all(structural_alerts)
 
 
 def example_description(description_type):
     client = new_client
     descriptions = client.description.filter(description_type=description_type)
-    return list(descriptions)
+    return fetch_all(descriptions)
 
 
 def example_document(journal):
     client = new_client
     documents = client.document.filter(journal=journal)
-    return list(documents)
+    return fetch_all(documents)
 
 
 def example_drug(drug_type):
     client = new_client
     drugs = client.drug.filter(drug_type=drug_type)
-    return list(drugs)
+    return fetch_all(drugs)
 
 
 def example_drug_indication(mesh_heading):
     client = new_client
     drug_indications = client.drug_indication.filter(mesh_heading=mesh_heading)
-    return list(drug_indications)
+    return fetch_all(drug_indications)
 
 
 def example_drug_warning(meddra_term):
     client = new_client
     drug_warnings = client.drug_warning.filter(meddra_term=meddra_term)
-    return list(drug_warnings)
+    return fetch_all(drug_warnings)
 
 
 def example_go_slim(go_slim_term):
     client = new_client
     go_slims = client.go_slim.filter(go_slim_term=go_slim_term)
-    return list(go_slims)
+    return fetch_all(go_slims)
 
 
 def example_mechanism(mechanism_of_action):
     client = new_client
     mechanisms = client.mechanism.filter(mechanism_of_action=mechanism_of_action)
-    return list(mechanisms)
+    return fetch_all(mechanisms)
 
 
 def example_molecule(molecule_type):
     client = new_client
     molecules = client.molecule.filter(molecule_type=molecule_type)
-    return list(molecules)
+    return fetch_all(molecules)
 
 
 def example_molecule_form(form_description):
     client = new_client
     molecule_forms = client.molecule_form.filter(form_description=form_description)
-    return list(molecule_forms)
+    return fetch_all(molecule_forms)
 
 
 def example_organism(tax_id):
     client = new_client
     organisms = client.organism.filter(tax_id=tax_id)
-    return list(organisms)
+    return fetch_all(organisms)
 
 
 def example_protein_classification(protein_class_name):
     client = new_client
     protein_classifications = client.protein_classification.filter(protein_class_name=protein_class_name)
-    return list(protein_classifications)
+    return fetch_all(protein_classifications)
 
 
 def example_source(source_description):
     client = new_client
     sources = client.source.filter(source_description=source_description)
-    return list(sources)
+    return fetch_all(sources)
 
 
 def example_target(target_type):
     client = new_client
     targets = client.target.filter(target_type=target_type)
-    return list(targets)
+    return fetch_all(targets)
 
 
 def example_target_component(component_type):
     client = new_client
     target_components = client.target_component.filter(component_type=component_type)
-    return list(target_components)
+    return fetch_all(target_components)
 
 
 def example_target_relation(relationship_type):
     client = new_client
     target_relations = client.target_relation.filter(relationship_type=relationship_type)
-    return list(target_relations)
+    return fetch_all(target_relations)
 
 
 def example_tissue(tissue_name):
     client = new_client
     tissues = client.tissue.filter(tissue_name=tissue_name)
-    return list(tissues)
+    return fetch_all(tissues)
 
 
 def example_xref_source(xref_name):
     client = new_client
     xref_sources = client.xref_source.filter(xref_name=xref_name)
-    return list(xref_sources)
+    return fetch_all(xref_sources)
 
 
 def example_canonicalizeSmiles(smiles):
@@ -284,13 +293,99 @@ def example_structuralAlerts(smiles):
     return alerts
 
 
+# Async API. Every example_* function has an example_*_async counterpart that runs it on a
+# shared, bounded thread pool; HTTP connections are pooled by the shared sessions.
+ASYNC_CONCURRENCY = 16
+
+_executor = ThreadPoolExecutor(max_workers=ASYNC_CONCURRENCY, thread_name_prefix='chembl_search')
+_cache = Cache(maxsize=1024, ttl=60 * 60)
+_MISSING = object()
+
+
+def _call(func, args, kwargs, seconds):
+    if seconds is None:
+        return func(*args, **kwargs)
+    with deadline(seconds):
+        return func(*args, **kwargs)
+
+
+async def _run(func, args=(), kwargs=None, seconds=None):
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, partial(context.run, _call, func, args, kwargs or {}, seconds))
+
+
+def _asyncify(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await _run(func, args, kwargs)
+    wrapper.__name__ = wrapper.__qualname__ = func.__name__ + '_async'
+    return wrapper
+
+
+for _name, _func in list(globals().items()):
+    if _name.startswith('example_') and callable(_func):
+        globals()[_name + '_async'] = _asyncify(_func)
+
+
+async def gather(*calls, concurrency=ASYNC_CONCURRENCY, timeout=None, use_cache=True, return_exceptions=False):
+    """Run a heterogeneous set of calls concurrently and return their results in order
+
+    Each call is a tuple of an example_* function (sync or async variant) and
+    its arguments, e.g. (example_activity, 'CHEMBL829585'). At most concurrency
+    calls run at once. Identical calls run once, and with use_cache results
+    are also kept in a cache shared between gather invocations; cached results
+    are shared objects and should not be mutated.
+
+    Args:
+        calls: (function, *args) tuples
+        concurrency: Maximum number of calls running at the same time
+        timeout: Seconds each call may take before raising TimeoutError
+        use_cache: Serve and store results in the shared cache
+        return_exceptions: Return exceptions in the result list instead of raising the first one
+
+    Returns:
+        List of results, one per call
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = {}
+
+    async def run(func, args, cacheable=True):
+        func = getattr(func, '__wrapped__', func)
+        key = (func.__name__, args)
+        cacheable = cacheable and use_cache
+        if cacheable:
+            result = _cache.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+        async with semaphore:
+            result = await _run(func, args, seconds=timeout)
+        if cacheable:
+            _cache.set(key, result)
+        return result
+
+    def task(call):
+        func, *args = call
+        key = (getattr(func, '__wrapped__', func).__name__, tuple(args))
+        try:
+            if key not in tasks:
+                tasks[key] = asyncio.ensure_future(run(func, tuple(args)))
+            return tasks[key]
+        except TypeError:
+            # Unhashable arguments cannot be deduplicated or cached
+            return asyncio.ensure_future(run(func, tuple(args), cacheable=False))
+
+    return list(await asyncio.gather(*[task(call) for call in calls], return_exceptions=return_exceptions))
+
+
 if __name__ == "__main__":
 
     # Data entities examples
     def run_with_timeout(func, *args, timeout_seconds=2):
         try:
             start_time = time.time()
-            result = func(*args)
+            with deadline(timeout_seconds):
+                result = func(*args)
             end_time = time.time()
             print(f"Execution time: {end_time - start_time:.2f} seconds")
             return result
@@ -1,12 +1,47 @@
-from typing import Any, List, Dict, Callable, TypeVar, Optional
+from typing import Any, List, Dict, Callable, TypeVar, Optional, Union
 import asyncio
+import contextvars
 import logging
 import functools
+import inspect
+import json
+import os
 import time
 from mcp.server.fastmcp import FastMCP
+from mcp.server.lowlevel.server import request_ctx
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+import chembl_settings  # applies CHEMBL_API_URL before the client loads its API description
 import chembl_webresource_client
 from chembl_webresource_client.new_client import new_client
 from chembl_webresource_client.utils import utils
+from chembl_webresource_client.query_set import QuerySet
+from chembl_webresource_client.http_errors import HttpBadRequest, HttpNotFound
+from chembl_paging import iter_pages, install_deadline_adapter, Deadline, DeadlineExceeded, DeadlineRetry, current_deadline
+from chembl_aggregate import ActivityAggregator, ACTIVITY_FIELDS
+from chembl_schema import validate_query
+import chembl_profiles
+import chembl_export
+import chembl_fuzzy
+import chembl_properties
+import chembl_alerts
+import chembl_sync
+from chembl_sync import syncer
+from chembl_store import store, query_key
+from chembl_cache import cache, MISSING
+from chembl_shared_cache import SharedCache, RECORD_SIZE
+from chembl_metrics import Counters
+from chembl_tracing import tracer, span, queued, JsonLinesExporter, OtlpExporter
+import chembl_profiling
+from chembl_profiling import profiler
+from chembl_scheduler import Scheduler, parse_assignments
+from chembl_releases import watcher
+from chembl_hedging import hedger
+from chembl_prefetch import prefetcher
+import chembl_warming
+from chembl_warming import query_log, warmer, load_calls, warming_call
+import chembl_health
+from chembl_health import prober, loop_monitor, executor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -14,19 +49,57 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Initialize FastMCP server
 mcp = FastMCP("chembl")
 
+# Apply per-call deadlines to utils requests as well as paged entity requests
+install_deadline_adapter(utils.session, DeadlineRetry(total=3), idempotent_posts=True)
+
 # Define return type variable
 T = TypeVar('T')
 
-# Async timeout decorator
+# Cursors of the result sets filled during the current tool call
+fetch_cursors: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar('fetch_cursors', default=None)
+
+# Time allowed after the deadline for a tool to return the partial results it gathered
+DEADLINE_GRACE = 1.0
+
+# Reject a budget_seconds argument that cannot be met, before anything is looked up or fetched
+def check_budget(budget_seconds: Optional[float]):
+    if budget_seconds is not None and budget_seconds <= 0:
+        raise ValueError("budget_seconds must be positive")
+
+# Async timeout decorator. The timeout is the default budget of the tool; callers can pass
+# budget_seconds to override it. The deadline applies to every upstream request, retry and page.
 def async_timeout(seconds: int):
     def decorator(func):
         @functools.wraps(func)
-        async def wrapper(*args, **kwargs):
+        async def wrapper(*args, budget_seconds: Optional[float] = None, **kwargs):
+            check_budget(budget_seconds)
+            budget = seconds if budget_seconds is None else budget_seconds
+            cursors: List[str] = []
+            token = fetch_cursors.set(cursors)
+            deadline_token = current_deadline.set(Deadline(budget))
             try:
-                return await asyncio.wait_for(func(*args, **kwargs), timeout=seconds)
+                # Time spent waiting for a scheduler slot counts against the budget
+                return await asyncio.wait_for(scheduler.run(func.__name__, current_client(), lambda: func(*args, **kwargs)),
+                                              timeout=budget + DEADLINE_GRACE)
             except asyncio.TimeoutError:
-                logging.error(f"Function {func.__name__} execution timed out (exceeded {seconds} seconds)")
-                raise TimeoutError(f"Function execution exceeded {seconds} seconds")
+                logging.error(f"Function {func.__name__} execution timed out (exceeded {budget} seconds)")
+                message = f"Function execution exceeded {budget} seconds"
+                if cursors:
+                    message += (f"; records fetched so far are kept under cursor {cursors[-1]}, "
+                                "retry the call to resume or page through them with read_cursor")
+                raise TimeoutError(message)
+            finally:
+                current_deadline.reset(deadline_token)
+                fetch_cursors.reset(token)
+
+        signature = inspect.signature(func)
+        budget_parameter = inspect.Parameter('budget_seconds', inspect.Parameter.KEYWORD_ONLY,
+                                             default=None, annotation=Optional[float])
+        wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), budget_parameter])
+        wrapper.__doc__ = (func.__doc__ or '').rstrip() + (
+            f"\n\n    budget_seconds: Optional time budget for this call (default {seconds} seconds). "
+            "Entity queries that run out of budget return the records gathered so far as "
+            "{records, partial: true, cursor, ...}; pass the cursor to read_cursor to continue.\n")
         return wrapper
     return decorator
 
@@ -34,25 +107,236 @@ def async_timeout(seconds: int):
 def error_handler(func):
     @functools.wraps(func)
     async def wrapper(*args, **kwargs):
+        with span('tool', tool=func.__name__) as tool_span, profiler.profile_call(func.__name__):
+            try:
+                start_time = time.time()
+                result = await func(*args, **kwargs)
+                end_time = time.time()
+                logging.info(f"{func.__name__} execution time: {end_time - start_time:.2f} seconds")
+            except TimeoutError as e:
+                logging.error(f"{func.__name__} timeout error: {str(e)}")
+                raise
+            except Exception as e:
+                logging.error(f"{func.__name__} execution error: {str(e)}")
+                raise
+            if tool_span.sampled:
+                # The response is serialised by FastMCP after we return; time an equivalent encoding
+                with span('serialise') as serialise_span:
+                    serialise_span.set(bytes=len(json.dumps(result, default=str)))
+            return result
+    return wrapper
+
+# How the results of a tool are cached
+class CachePolicy:
+    """Caching of one tool's results
+
+    Args:
+        ttl: Seconds a result is served without asking upstream again
+        stale_ttl: Seconds after expiry during which the old result is still served
+            while it is refreshed in the background
+        negative_ttl: Seconds empty results and invalid-ID errors are cached; 0 disables this
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0, negative_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+
+    def as_dict(self) -> Dict[str, float]:
+        return {'ttl': self.ttl, 'stale_ttl': self.stale_ttl, 'negative_ttl': self.negative_ttl}
+
+# Per-tool cache policies; tools decorated with cached_tool but not listed here are not cached.
+# Drug, mechanism, warning, ATC, organism and release data only change with a ChEMBL release,
+# and canonical SMILES never do.
+TOOL_CACHE_POLICIES: Dict[str, CachePolicy] = {
+    name: CachePolicy(ttl=24 * 60 * 60, stale_ttl=7 * 24 * 60 * 60, negative_ttl=5 * 60)
+    for name in ('example_drug', 'example_mechanism', 'example_drug_warning', 'example_atc_class',
+                 'example_organism', 'example_chembl_release', 'example_canonicalizeSmiles')
+}
+
+# Scheduling lane of each tool; tools not listed run in the bulk lane. Chemical utilities and
+# admin tools are cheap, so they get a lane of their own and never queue behind bulk fetches.
+TOOL_LANES: Dict[str, str] = {name: 'fast' for name in (
+    'example_canonicalizeSmiles', 'example_chemblDescriptors', 'example_description_utils', 'example_descriptors',
+    'example_getParent', 'example_highlightSmilesFragmentSvg', 'example_inchi2inchiKey', 'example_inchi2svg',
+    'example_is3D', 'example_official_utils', 'example_removeHs', 'example_smiles2inchi', 'example_smiles2inchiKey',
+    'example_smiles2svg', 'example_standardize', 'example_status', 'example_structuralAlerts',
+    'cache_stats', 'start_profiling', 'stop_profiling', 'profiling_status', 'scheduler_stats',
+    'hedging_stats', 'fuzzy_search', 'sync_status', 'apply_changes', 'prefetch_stats',
+    'cache_entries', 'purge_cache', 'warm_cache', 'stop_warming', 'health_status',
+)}
+
+# Fair scheduler every tool call goes through
+scheduler = Scheduler(lambda tool: TOOL_LANES.get(tool, 'bulk'))
+
+# Identify the client of the current tool call: its client_id if it sent one, else its MCP session
+def current_client() -> str:
+    if warming_call.get():
+        return 'warming'
+    request_context = request_ctx.get(None)
+    if request_context is None:
+        return 'local'
+    client_id = getattr(request_context.meta, 'client_id', None) if request_context.meta else None
+    return client_id or f"session-{id(request_context.session):x}"
+
+# Errors that mean the request itself was wrong, e.g. a non-existent ID, and are cached like empty results
+NEGATIVE_ERRORS = (HttpBadRequest, HttpNotFound)
+
+# How often each cache path was taken, per tool
+tool_cache_counters = Counters()
+
+# Set while a tool is refreshing a stale cache entry, so the result store fetches afresh too
+refreshing: contextvars.ContextVar[bool] = contextvars.ContextVar('refreshing', default=False)
+
+# Background refreshes of stale tool results, keyed by cache key
+_refresh_tasks: Dict[Any, asyncio.Task] = {}
+
+# Tools decorated with cached_tool, by name, for warm-up calls
+CACHED_TOOLS: Dict[str, Callable] = {}
+
+class _NegativeResult:
+    def __init__(self, value: Any = None, error: Optional[Exception] = None):
+        self.value = value
+        self.error = error
+
+# Cache decorator. Serves cached results within the tool's TTL, serves expired results within
+# stale_ttl while refreshing them in the background, and caches empty results and invalid-ID
+# errors for negative_ttl. Partial results are never cached.
+def cached_tool(func):
+    signature = inspect.signature(func)
+
+    def counted(name: str, event: str):
+        tool_cache_counters.increment(name, event)
+
+    def store_result(key, policy: CachePolicy, result) -> bool:
+        if isinstance(result, dict) and result.get('partial'):
+            return False
+        if isinstance(result, list) and not result:
+            if policy.negative_ttl > 0:
+                cache.set(key, _NegativeResult(value=result), policy.negative_ttl)
+                return True
+            return False
+        cache.set(key, result, policy.ttl)
+        return True
+
+    async def refresh(key, policy: CachePolicy, args, kwargs):
+        name = func.__name__
+        refreshing.set(True)
         try:
-            start_time = time.time()
             result = await func(*args, **kwargs)
-            end_time = time.time()
-            logging.info(f"{func.__name__} execution time: {end_time - start_time:.2f} seconds")
-            return result
-        except TimeoutError as e:
-            logging.error(f"{func.__name__} timeout error: {str(e)}")
-            raise
+            store_result(key, policy, result)
+            counted(name, 'refresh')
         except Exception as e:
-            logging.error(f"{func.__name__} execution error: {str(e)}")
+            counted(name, 'refresh_error')
+            logging.warning(f"Background refresh of {name} failed: {str(e)}")
+        finally:
+            _refresh_tasks.pop(key, None)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        name = func.__name__
+        policy = TOOL_CACHE_POLICIES.get(name)
+        if policy is None:
+            return await func(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        # budget_seconds is not part of the key, so a bad one must not reach the negative cache
+        check_budget(bound.arguments.get('budget_seconds'))
+        arguments = {k: v for k, v in bound.arguments.items() if k != 'budget_seconds'}
+        query_log.record(name, arguments)
+        key = ('tool', name, repr(sorted(arguments.items())))
+        with span('cache.lookup', tool=name) as lookup_span:
+            value, current = cache.lookup(key, max_stale=policy.stale_ttl)
+            lookup_span.set(found=value is not MISSING, current=current)
+        if isinstance(value, _NegativeResult):
+            if current:
+                counted(name, 'negative_hit')
+                if value.error is not None:
+                    raise value.error.with_traceback(None)
+                return value.value
+            value = MISSING
+        if value is not MISSING:
+            if current:
+                counted(name, 'hit')
+            else:
+                counted(name, 'stale_hit')
+                if key not in _refresh_tasks:
+                    _refresh_tasks[key] = asyncio.create_task(refresh(key, policy, args, kwargs))
+            return value
+        counted(name, 'miss')
+        try:
+            result = await func(*args, **kwargs)
+        except NEGATIVE_ERRORS as e:
+            if policy.negative_ttl > 0:
+                cache.set(key, _NegativeResult(error=e), policy.negative_ttl)
+                counted(name, 'negative_store')
             raise
+        if store_result(key, policy, result) and isinstance(result, list) and not result:
+            counted(name, 'negative_store')
+        return result
+    CACHED_TOOLS[func.__name__] = wrapper
     return wrapper
 
+# Run one warm-up call of a cached tool, with a budget large enough to fetch its result whole
+async def warm_call(tool: str, arguments: Dict[str, Any]) -> str:
+    func = CACHED_TOOLS.get(tool)
+    if func is None:
+        raise ValueError(f"{tool} is not a cached tool")
+    if tool not in TOOL_CACHE_POLICIES:
+        return 'skipped'
+    arguments = {k: v for k, v in arguments.items() if k != 'budget_seconds'}
+    result = await func(**arguments, budget_seconds=chembl_warming.CALL_BUDGET)
+    return 'partial' if isinstance(result, dict) and result.get('partial') else 'warmed'
+
+# Fetch the records of a queryset into the result store off the event loop, with concurrent
+# pagination. When the call's deadline passes, the records gathered so far are returned flagged
+# as partial, with the cursor that read_cursor or a retry of the call continues from.
+async def fetch_records(queryset, max_records: Optional[int] = None) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    result_set = store.open(query_key(queryset), queryset, refresh=refreshing.get())
+    cursors = fetch_cursors.get()
+    if cursors is not None:
+        cursors.append(result_set.cursor)
+    try:
+        with span('fetch_records', resource=queryset.query.model.name, cursor=result_set.cursor) as fetch_span:
+            await asyncio.to_thread(queued(result_set.fill, max_records))
+            fetch_span.set(records=len(result_set), total=result_set.total)
+    except DeadlineExceeded:
+        logging.warning(f"Deadline exceeded after {len(result_set)} records; returning partial results "
+                        f"under cursor {result_set.cursor}")
+        result = result_set.info()
+        result.update(partial=True, records=result_set.read(0, max_records))
+        # Callers continue with read_cursor from the end of the partial results
+        prefetcher.end(current_client(), result_set, 0, len(result['records']), result['records'])
+        return result
+    return result_set.read(0, max_records)
+
+# Resolve an entity name to its new_client queryset
+def entity_queryset(entity: str) -> QuerySet:
+    queryset = getattr(new_client, entity, None)
+    if entity.startswith('_') or not isinstance(queryset, QuerySet):
+        known = ', '.join(sorted(k for k, v in vars(new_client).items() if isinstance(v, QuerySet)))
+        raise ValueError(f"Unknown entity {entity!r}; known entities: {known}")
+    return queryset
+
+# Build a validated entity queryset with all filters, ordering and fields pushed upstream
+async def build_queryset(entity: str, filters: Optional[Dict[str, Any]] = None,
+                         order_by: Optional[List[str]] = None, fields: Optional[List[str]] = None) -> QuerySet:
+    queryset = entity_queryset(entity)
+    filters = await asyncio.to_thread(validate_query, entity, filters, order_by, fields)
+    if filters:
+        queryset = queryset.filter(**filters)
+    if order_by:
+        queryset = queryset.order_by(*order_by)
+    if fields:
+        queryset = queryset.only(*fields)
+    return queryset
+
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_activity(assay_chembl_id: str) -> List[Dict[str, Any]]:
+async def example_activity(assay_chembl_id: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get activity data for the specified assay_chembl_id
     
     Args:
@@ -63,12 +347,13 @@ async def example_activity(assay_chembl_id: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     activities = client.activity.filter(assay_chembl_id=assay_chembl_id)
-    return list(activities)
+    return await fetch_records(activities)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_activity_supplementary_data_by_activity(activity_chembl_id: str) -> List[Dict[str, Any]]:
+async def example_activity_supplementary_data_by_activity(activity_chembl_id: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get supplementary activity data for the specified activity_chembl_id
     
     Args:
@@ -79,12 +364,13 @@ async def example_activity_supplementary_data_by_activity(activity_chembl_id: st
     """
     client = new_client
     activity_supp_data = client.activity_supplementary_data_by_activity.filter(activity_chembl_id=activity_chembl_id)
-    return list(activity_supp_data)
+    return await fetch_records(activity_supp_data)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_assay(assay_type: str) -> List[Dict[str, Any]]:
+async def example_assay(assay_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get assay data for the specified type
     
     Args:
@@ -95,12 +381,13 @@ async def example_assay(assay_type: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     assays = client.assay.filter(assay_type=assay_type)
-    return list(assays)
+    return await fetch_records(assays)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_assay_class(assay_class_type: str) -> List[Dict[str, Any]]:
+async def example_assay_class(assay_class_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get assay classification data for the specified type
     
     Args:
@@ -111,12 +398,13 @@ async def example_assay_class(assay_class_type: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     assay_classes = client.assay_class.filter(assay_class_type=assay_class_type)
-    return list(assay_classes)
+    return await fetch_records(assay_classes)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_atc_class(level1: str) -> List[Dict[str, Any]]:
+async def example_atc_class(level1: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get ATC classification data for the specified level1
     
     Args:
@@ -127,12 +415,13 @@ async def example_atc_class(level1: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     atc_classes = client.atc_class.filter(level1=level1)
-    return list(atc_classes)
+    return await fetch_records(atc_classes)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_binding_site(site_name: str) -> List[Dict[str, Any]]:
+async def example_binding_site(site_name: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get binding site data for the specified name
     
     Args:
@@ -143,12 +432,13 @@ async def example_binding_site(site_name: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     binding_sites = client.binding_site.filter(site_name=site_name)
-    return list(binding_sites)
+    return await fetch_records(binding_sites)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_biotherapeutic(biotherapeutic_type: str) -> List[Dict[str, Any]]:
+async def example_biotherapeutic(biotherapeutic_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get biotherapeutic data for the specified type
     
     Args:
@@ -159,12 +449,13 @@ async def example_biotherapeutic(biotherapeutic_type: str) -> List[Dict[str, Any
     """
     client = new_client
     biotherapeutics = client.biotherapeutic.filter(biotherapeutic_type=biotherapeutic_type)
-    return list(biotherapeutics)
+    return await fetch_records(biotherapeutics)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_cell_line(cell_line_name: str) -> List[Dict[str, Any]]:
+async def example_cell_line(cell_line_name: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get cell line data for the specified name
     
     Args:
@@ -175,12 +466,13 @@ async def example_cell_line(cell_line_name: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     cell_lines = client.cell_line.filter(cell_line_name=cell_line_name)
-    return list(cell_lines)
+    return await fetch_records(cell_lines)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_chembl_id_lookup(available_type: str, q: str) -> List[Dict[str, Any]]:
+async def example_chembl_id_lookup(available_type: str, q: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Look up ChEMBL IDs for the specified type and query
     
     Args:
@@ -192,12 +484,13 @@ async def example_chembl_id_lookup(available_type: str, q: str) -> List[Dict[str
     """
     client = new_client
     chembl_ids = client.chembl_id_lookup.filter(available_type=available_type, q=q)
-    return list(chembl_ids)
+    return await fetch_records(chembl_ids)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_chembl_release() -> List[Dict[str, Any]]:
+async def example_chembl_release() -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get all ChEMBL release information
     
     Returns:
@@ -205,12 +498,13 @@ async def example_chembl_release() -> List[Dict[str, Any]]:
     """
     client = new_client
     chembl_releases = client.chembl_release.all()
-    return list(chembl_releases)
+    return await fetch_records(chembl_releases)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_compound_record(compound_name: str) -> List[Dict[str, Any]]:
+async def example_compound_record(compound_name: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get compound records for the specified name
     
     Args:
@@ -221,12 +515,13 @@ async def example_compound_record(compound_name: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     compound_records = client.compound_record.filter(compound_name=compound_name)
-    return list(compound_records)
+    return await fetch_records(compound_records)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_compound_structural_alert(alert_name: str) -> List[Dict[str, Any]]:
+async def example_compound_structural_alert(alert_name: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get compound structural alerts for the specified name
     
     Args:
@@ -237,12 +532,13 @@ async def example_compound_structural_alert(alert_name: str) -> List[Dict[str, A
     """
     client = new_client
     structural_alerts = client.compound_structural_alert.filter(alert_name=alert_name)
-    return list(structural_alerts)
+    return await fetch_records(structural_alerts)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_description(description_type: str) -> List[Dict[str, Any]]:
+async def example_description(description_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get description data for the specified type
     
     Args:
@@ -253,12 +549,13 @@ async def example_description(description_type: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     descriptions = client.description.filter(description_type=description_type)
-    return list(descriptions)
+    return await fetch_records(descriptions)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_document(journal: str) -> List[Dict[str, Any]]:
+async def example_document(journal: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get document data for the specified journal
     
     Args:
@@ -269,12 +566,13 @@ async def example_document(journal: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     documents = client.document.filter(journal=journal)
-    return list(documents)
+    return await fetch_records(documents)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_drug(drug_type: str) -> List[Dict[str, Any]]:
+async def example_drug(drug_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get drug data for the specified type
     
     Args:
@@ -285,12 +583,13 @@ async def example_drug(drug_type: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     drugs = client.drug.filter(drug_type=drug_type)
-    return list(drugs)
+    return await fetch_records(drugs)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_drug_indication(mesh_heading: str) -> List[Dict[str, Any]]:
+async def example_drug_indication(mesh_heading: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get drug indication data for the specified MeSH heading
     
     Args:
@@ -301,12 +600,13 @@ async def example_drug_indication(mesh_heading: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     drug_indications = client.drug_indication.filter(mesh_heading=mesh_heading)
-    return list(drug_indications)
+    return await fetch_records(drug_indications)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_drug_warning(meddra_term: str) -> List[Dict[str, Any]]:
+async def example_drug_warning(meddra_term: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get drug warning data for the specified MedDRA term
     
     Args:
@@ -317,12 +617,13 @@ async def example_drug_warning(meddra_term: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     drug_warnings = client.drug_warning.filter(meddra_term=meddra_term)
-    return list(drug_warnings)
+    return await fetch_records(drug_warnings)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_go_slim(go_slim_term: str) -> List[Dict[str, Any]]:
+async def example_go_slim(go_slim_term: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get data for the specified GO Slim term
     
     Args:
@@ -333,12 +634,13 @@ async def example_go_slim(go_slim_term: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     go_slims = client.go_slim.filter(go_slim_term=go_slim_term)
-    return list(go_slims)
+    return await fetch_records(go_slims)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_mechanism(mechanism_of_action: str) -> List[Dict[str, Any]]:
+async def example_mechanism(mechanism_of_action: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get data for the specified mechanism of action
     
     Args:
@@ -349,12 +651,13 @@ async def example_mechanism(mechanism_of_action: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     mechanisms = client.mechanism.filter(mechanism_of_action=mechanism_of_action)
-    return list(mechanisms)
+    return await fetch_records(mechanisms)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_molecule(molecule_type: str) -> List[Dict[str, Any]]:
+async def example_molecule(molecule_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get molecule data for the specified type
     
     Args:
@@ -365,12 +668,13 @@ async def example_molecule(molecule_type: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     molecules = client.molecule.filter(molecule_type=molecule_type)
-    return list(molecules)
+    return await fetch_records(molecules)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_molecule_form(form_description: str) -> List[Dict[str, Any]]:
+async def example_molecule_form(form_description: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get molecule form data for the specified description
     
     Args:
@@ -381,12 +685,13 @@ async def example_molecule_form(form_description: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     molecule_forms = client.molecule_form.filter(form_description=form_description)
-    return list(molecule_forms)
+    return await fetch_records(molecule_forms)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_organism(tax_id: int) -> List[Dict[str, Any]]:
+async def example_organism(tax_id: int) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get organism data for the specified taxonomy ID
     
     Args:
@@ -397,12 +702,13 @@ async def example_organism(tax_id: int) -> List[Dict[str, Any]]:
     """
     client = new_client
     organisms = client.organism.filter(tax_id=tax_id)
-    return list(organisms)
+    return await fetch_records(organisms)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_protein_classification(protein_class_name: str) -> List[Dict[str, Any]]:
+async def example_protein_classification(protein_class_name: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get protein classification data for the specified class name
     
     Args:
@@ -413,12 +719,13 @@ async def example_protein_classification(protein_class_name: str) -> List[Dict[s
     """
     client = new_client
     protein_classifications = client.protein_classification.filter(protein_class_name=protein_class_name)
-    return list(protein_classifications)
+    return await fetch_records(protein_classifications)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_source(source_description: str) -> List[Dict[str, Any]]:
+async def example_source(source_description: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get source information for the specified description
     
     Args:
@@ -429,12 +736,13 @@ async def example_source(source_description: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     sources = client.source.filter(source_description=source_description)
-    return list(sources)
+    return await fetch_records(sources)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_target(target_type: str) -> List[Dict[str, Any]]:
+async def example_target(target_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get target data for the specified type
     
     Args:
@@ -445,12 +753,13 @@ async def example_target(target_type: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     targets = client.target.filter(target_type=target_type)
-    return list(targets)
+    return await fetch_records(targets)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_target_component(component_type: str) -> List[Dict[str, Any]]:
+async def example_target_component(component_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get target component data for the specified type
     
     Args:
@@ -461,12 +770,13 @@ async def example_target_component(component_type: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     target_components = client.target_component.filter(component_type=component_type)
-    return list(target_components)
+    return await fetch_records(target_components)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_target_relation(relationship_type: str) -> List[Dict[str, Any]]:
+async def example_target_relation(relationship_type: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get target relationship data for the specified relationship type
     
     Args:
@@ -477,12 +787,13 @@ async def example_target_relation(relationship_type: str) -> List[Dict[str, Any]
     """
     client = new_client
     target_relations = client.target_relation.filter(relationship_type=relationship_type)
-    return list(target_relations)
+    return await fetch_records(target_relations)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_tissue(tissue_name: str) -> List[Dict[str, Any]]:
+async def example_tissue(tissue_name: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get tissue data for the specified name
     
     Args:
@@ -493,12 +804,13 @@ async def example_tissue(tissue_name: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     tissues = client.tissue.filter(tissue_name=tissue_name)
-    return list(tissues)
+    return await fetch_records(tissues)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(10)
-async def example_xref_source(xref_name: str) -> List[Dict[str, Any]]:
+async def example_xref_source(xref_name: str) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get cross-reference source data for the specified name
     
     Args:
@@ -509,10 +821,11 @@ async def example_xref_source(xref_name: str) -> List[Dict[str, Any]]:
     """
     client = new_client
     xref_sources = client.xref_source.filter(xref_name=xref_name)
-    return list(xref_sources)
+    return await fetch_records(xref_sources)
 
 @mcp.tool()
 @error_handler
+@cached_tool
 @async_timeout(5)
 async def example_canonicalizeSmiles(smiles: str) -> str:
     """Convert SMILES string to canonical form
@@ -523,7 +836,7 @@ async def example_canonicalizeSmiles(smiles: str) -> str:
     Returns:
         Canonicalized SMILES string
     """
-    canonical_smiles = utils.canonicalizeSmiles(smiles)
+    canonical_smiles = await asyncio.to_thread(queued(utils.canonicalizeSmiles, smiles))
     return canonical_smiles
 
 @mcp.tool()
@@ -538,7 +851,7 @@ async def example_chemblDescriptors(smiles: str) -> Dict[str, Any]:
     Returns:
         Dictionary of ChEMBL descriptors
     """
-    descriptors = utils.chemblDescriptors(smiles)
+    descriptors = await asyncio.to_thread(queued(utils.chemblDescriptors, smiles))
     return descriptors
 
 @mcp.tool()
@@ -554,7 +867,7 @@ async def example_description_utils(chembl_id: str) -> str:
     Returns:
         Description information
     """
-    description = utils.description(chembl_id)
+    description = await asyncio.to_thread(queued(utils.description, chembl_id))
     return description
 
 @mcp.tool()
@@ -570,7 +883,7 @@ async def example_descriptors(smiles: str) -> Dict[str, Any]:
     Returns:
         Dictionary of descriptors
     """
-    descriptors = utils.descriptors(smiles)
+    descriptors = await asyncio.to_thread(queued(utils.descriptors, smiles))
     return descriptors
 
 @mcp.tool()
@@ -586,7 +899,7 @@ async def example_getParent(chembl_id: str) -> str:
     Returns:
         Parent ChEMBL ID
     """
-    parent = utils.getParent(chembl_id)
+    parent = await asyncio.to_thread(queued(utils.getParent, chembl_id))
     return parent
 
 @mcp.tool()
@@ -603,7 +916,7 @@ async def example_highlightSmilesFragmentSvg(smiles: str, fragment: str) -> str:
     Returns:
         SVG image string
     """
-    highlighted_svg = utils.highlightSmilesFragmentSvg(smiles, fragment)
+    highlighted_svg = await asyncio.to_thread(queued(utils.highlightSmilesFragmentSvg, smiles, fragment))
     return highlighted_svg
 
 @mcp.tool()
@@ -619,7 +932,7 @@ async def example_inchi2inchiKey(inchi: str) -> str:
     Returns:
         InChI Key
     """
-    inchi_key = utils.inchi2inchiKey(inchi)
+    inchi_key = await asyncio.to_thread(queued(utils.inchi2inchiKey, inchi))
     return inchi_key
 
 @mcp.tool()
@@ -635,7 +948,7 @@ async def example_inchi2svg(inchi: str) -> str:
     Returns:
         SVG image string
     """
-    inchi_svg = utils.inchi2svg(inchi)
+    inchi_svg = await asyncio.to_thread(queued(utils.inchi2svg, inchi))
     return inchi_svg
     # print("InChI SVG:", inchi_svg)  # Skipping printing SVG
 
@@ -652,7 +965,7 @@ async def example_is3D(smiles: str) -> bool:
     Returns:
         True if 3D structure, False otherwise
     """
-    is_3d = utils.is3D(smiles)
+    is_3d = await asyncio.to_thread(queued(utils.is3D, smiles))
     return is_3d
 
 @mcp.tool()
@@ -668,7 +981,7 @@ async def example_official_utils(chembl_id: str) -> str:
     Returns:
         Official name
     """
-    official = utils.official(chembl_id)
+    official = await asyncio.to_thread(queued(utils.official, chembl_id))
     return official
 
 @mcp.tool()
@@ -684,7 +997,7 @@ async def example_removeHs(smiles: str) -> str:
     Returns:
         SMILES string without hydrogen atoms
     """
-    smiles_no_h = utils.removeHs(smiles)
+    smiles_no_h = await asyncio.to_thread(queued(utils.removeHs, smiles))
     return smiles_no_h
 
 @mcp.tool()
@@ -700,7 +1013,7 @@ async def example_smiles2inchi(smiles: str) -> str:
     Returns:
         InChI string
     """
-    smiles_inchi = utils.smiles2inchi(smiles)
+    smiles_inchi = await asyncio.to_thread(queued(utils.smiles2inchi, smiles))
     return smiles_inchi
 
 @mcp.tool()
@@ -716,7 +1029,7 @@ async def example_smiles2inchiKey(smiles: str) -> str:
     Returns:
         InChI Key
     """
-    smiles_inchi_key = utils.smiles2inchiKey(smiles)
+    smiles_inchi_key = await asyncio.to_thread(queued(utils.smiles2inchiKey, smiles))
     return smiles_inchi_key
 
 @mcp.tool()
@@ -732,7 +1045,7 @@ async def example_smiles2svg(smiles: str) -> str:
     Returns:
         SVG image string
     """
-    smiles_svg = utils.smiles2svg(smiles)
+    smiles_svg = await asyncio.to_thread(queued(utils.smiles2svg, smiles))
     return smiles_svg
     # print("SMILES SVG:", smiles_svg)  # Skipping printing SVG
 
@@ -749,7 +1062,7 @@ async def example_standardize(smiles: str) -> str:
     Returns:
         Standardized SMILES string
     """
-    standardized_smiles = utils.standardize(smiles)
+    standardized_smiles = await asyncio.to_thread(queued(utils.standardize, smiles))
     return standardized_smiles
 
 @mcp.tool()
@@ -762,7 +1075,10 @@ async def example_status() -> Dict[str, Any]:
     Returns:
         Dictionary of status information
     """
-    status = utils.status()
+    # The background probe fetches the same document; use it while it is recent
+    status = prober.document('utils', max_age=prober.interval)
+    if status is None:
+        status = await asyncio.to_thread(queued(utils.status))
     return status
 
 @mcp.tool()
@@ -778,9 +1094,613 @@ async def example_structuralAlerts(smiles: str) -> List[Dict[str, Any]]:
     Returns:
         List of structural alerts
     """
-    alerts = utils.structuralAlerts(smiles)
+    if chembl_alerts.local_alerts_available():
+        engine = await asyncio.to_thread(chembl_alerts.get_engine)
+        return await asyncio.to_thread(queued(engine.screen, smiles))
+    alerts = await asyncio.to_thread(queued(utils.structuralAlerts, smiles))
     return alerts
 
+@mcp.tool()
+@error_handler
+@async_timeout(60)
+async def aggregate_activities(assay_chembl_id: Optional[str] = None, target_chembl_id: Optional[str] = None,
+                               active_threshold: float = 6.0, top_n: int = 20) -> Dict[str, Any]:
+    """Summarise activity data for an assay and/or target without returning the rows
+
+    Activity pages are streamed from upstream and folded into aggregates, so
+    only the summary is held in memory and returned.
+
+    Args:
+        assay_chembl_id: ChEMBL assay ID
+        target_chembl_id: ChEMBL target ID
+        active_threshold: pChEMBL value at or above which an activity counts as active
+        top_n: Number of best molecules to include in the summary
+
+    Returns:
+        Dictionary with count, min/median/max pChEMBL, active count,
+        per-standard_type breakdown and best value per molecule; partial is
+        true if the time budget ran out before all pages were folded
+    """
+    filters = {k: v for k, v in (('assay_chembl_id', assay_chembl_id), ('target_chembl_id', target_chembl_id)) if v}
+    if not filters:
+        raise ValueError("At least one of assay_chembl_id or target_chembl_id is required")
+    client = new_client
+    activities = client.activity.filter(**filters).only(*ACTIVITY_FIELDS)
+    aggregator = ActivityAggregator(active_threshold)
+    partial = False
+    try:
+        await asyncio.to_thread(queued(aggregator.add_pages, iter_pages(activities)))
+    except DeadlineExceeded:
+        logging.warning(f"Deadline exceeded after {aggregator.pages} activity pages; returning partial aggregates")
+        partial = True
+    result = aggregator.result(top_n)
+    result['filters'] = filters
+    result['partial'] = partial
+    return result
+
+@mcp.tool()
+@error_handler
+@async_timeout(10)
+async def query(entity: str, filters: Optional[Dict[str, Any]] = None, order_by: Optional[List[str]] = None,
+                fields: Optional[List[str]] = None, limit: int = 100) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """Query any ChEMBL entity with several filters in a single upstream request
+
+    Filters use ChEMBL lookup syntax and are all applied upstream, e.g.
+    {"standard_type": "IC50", "pchembl_value__gte": 6, "target_chembl_id__in": ["CHEMBL203", "CHEMBL240"]}.
+    Supported operators: exact, iexact, contains, icontains, startswith, istartswith,
+    endswith, iendswith, regex, iregex, gt, gte, lt, lte, range, in, isnull, search.
+
+    Args:
+        entity: Entity name, e.g. activity, assay, molecule, target
+        filters: Mapping of field or field__operator to value; list values for __in and __range
+        order_by: Fields to order by, prefix with '-' for descending order
+        fields: Fields to return (all fields if omitted)
+        limit: Maximum number of records to return
+
+    Returns:
+        List of matching records
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    queryset = await build_queryset(entity, filters, order_by, fields)
+    return await fetch_records(queryset, max_records=limit)
+
+@mcp.tool()
+@error_handler
+@async_timeout(600)
+async def export_query(entity: str, filters: Optional[Dict[str, Any]] = None, order_by: Optional[List[str]] = None,
+                       fields: Optional[List[str]] = None, format: str = 'parquet') -> Dict[str, Any]:
+    """Export every record of an entity query to a Parquet or Arrow IPC file instead of returning it inline
+
+    Use this for large result sets. Filters, ordering and fields work as in
+    the query tool. Records are streamed page by page into the file, with
+    column types taken from the ChEMBL schema.
+
+    Args:
+        entity: Entity name, e.g. activity, assay, molecule, target
+        filters: Mapping of field or field__operator to value; list values for __in and __range
+        order_by: Fields to order by, prefix with '-' for descending order
+        fields: Columns to export (all fields if omitted)
+        format: 'parquet' or 'arrow'
+
+    Returns:
+        Resource URI and local path of the file, row count, size and column schema
+    """
+    queryset = await build_queryset(entity, filters, order_by, fields)
+    return await asyncio.to_thread(queued(chembl_export.export_queryset, entity, queryset, fields, format))
+
+@mcp.resource(chembl_export.EXPORT_URI_PREFIX + "{name}", mime_type="application/octet-stream")
+async def export_file(name: str) -> bytes:
+    """Contents of a file written by export_query, if it is small enough to send in one message"""
+    return await asyncio.to_thread(chembl_export.read_export, name)
+
+@mcp.tool()
+@error_handler
+@async_timeout(30)
+async def target_bioactivity_profile(target_chembl_id: str, min_pchembl: Optional[float] = None,
+                                     max_molecules: int = 50) -> Dict[str, Any]:
+    """Get a target with its most potent molecules, their mechanisms and drug indications in one call
+
+    Replaces chains of example_target, example_activity, example_molecule and
+    example_drug_indication calls; the join runs server-side with batched fetches.
+
+    Args:
+        target_chembl_id: ChEMBL target ID
+        min_pchembl: Only consider activities with at least this pChEMBL value
+        max_molecules: Number of molecules to include, best pChEMBL first
+
+    Returns:
+        Target record and a list of molecule profiles
+    """
+    return await asyncio.to_thread(queued(chembl_profiles.target_bioactivity_profile, target_chembl_id,
+                                          min_pchembl, max_molecules))
+
+@mcp.tool()
+@error_handler
+@async_timeout(30)
+async def molecule_full_profile(molecule_chembl_id: str) -> Dict[str, Any]:
+    """Get a molecule with its activity summary, mechanisms and their targets, drug indications and drug warnings in one call
+
+    Args:
+        molecule_chembl_id: ChEMBL molecule ID
+
+    Returns:
+        Denormalised molecule profile
+    """
+    return await asyncio.to_thread(queued(chembl_profiles.molecule_full_profile, molecule_chembl_id))
+
+@mcp.tool()
+@error_handler
+@async_timeout(10)
+async def read_cursor(cursor: str, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+    """Page through the records of an earlier entity query by its cursor
+
+    Cursors are reported when an entity query times out. Records already
+    fetched are served from the server's result store; missing ones are
+    fetched from upstream, continuing where the earlier call stopped.
+
+    Args:
+        cursor: Cursor returned by an earlier call
+        offset: Index of the first record to return
+        limit: Maximum number of records to return
+
+    Returns:
+        Dictionary with the cursor state (fetched, total, complete) and the requested records
+    """
+    result_set = store.get(cursor)
+    client = current_client()
+    prefetcher.begin(client, result_set, offset, limit)
+    try:
+        await asyncio.to_thread(queued(result_set.fill, offset + limit))
+    except DeadlineExceeded:
+        logging.warning(f"Deadline exceeded while reading cursor {cursor}; returning the records fetched so far")
+    result = result_set.info()
+    result['offset'] = offset
+    result['records'] = result_set.read(offset, offset + limit)
+    prefetcher.end(client, result_set, offset, limit, result['records'])
+    return result
+
+@mcp.tool()
+@error_handler
+@async_timeout(30)
+async def fuzzy_search(text: str, entity: Optional[str] = None, top_k: int = 10) -> Dict[str, Any]:
+    """Find compounds, drugs, targets or indications by approximate name, without a round trip to ChEMBL
+
+    Searches a local trigram index of compound and drug names and synonyms, target names and
+    component synonyms, and drug indication MeSH headings. Misspelled, partial or differently
+    punctuated names are matched; use the returned ChEMBL IDs with the other tools.
+
+    Args:
+        text: Name to look up, e.g. 'acetylsalicylic', 'imatinb' or 'EGFR'
+        entity: Restrict matches to 'compound', 'drug', 'target' or 'indication' (MeSH heading)
+        top_k: Number of matches to return
+
+    Returns:
+        Dictionary with the index release and matches, best first, each with name, entity,
+        chembl_ids (molecule IDs of the drugs indicated, for indications) and a score between 0 and 1
+    """
+    if entity is not None and entity not in chembl_fuzzy.ENTITIES:
+        raise ValueError(f"Unknown entity {entity!r}; choose from {', '.join(chembl_fuzzy.ENTITIES)}")
+    if top_k < 1:
+        raise ValueError("top_k must be at least 1")
+    index = await asyncio.to_thread(chembl_fuzzy.get_index)
+    matches = await asyncio.to_thread(queued(index.search, text, entity, top_k))
+    return {'release': index.release, 'matches': matches}
+
+# Molecules matching property filters, read from the local property table
+def _filter_molecules(filters: Dict[str, Any], order_by: Optional[str], offset: int, limit: int,
+                      include_properties: bool, include_structures: bool) -> Dict[str, Any]:
+    table = chembl_properties.get_table()
+    with span('property_table.filter', filters=len(filters)) as filter_span:
+        total, rows = table.select(filters, order_by, offset, limit)
+        filter_span.set(molecules=len(table), matches=total)
+    records = table.records(rows, include_properties)
+    if include_structures and records:
+        structures = chembl_profiles.fetch_related('molecule', 'molecule_chembl_id',
+                                                   [r['molecule_chembl_id'] for r in records], ('molecule_structures',))
+        for record in records:
+            found = structures.get(record['molecule_chembl_id'])
+            record['molecule_structures'] = found[0].get('molecule_structures') if found else None
+    return {'release': table.meta.get('release'), 'total': total, 'offset': offset, 'molecules': records}
+
+@mcp.tool()
+@error_handler
+@async_timeout(30)
+async def filter_molecules(filters: Dict[str, Any], order_by: Optional[str] = None, limit: int = 100, offset: int = 0,
+                           include_properties: bool = False, include_structures: bool = False) -> Dict[str, Any]:
+    """Find molecules by ranges of their calculated properties, evaluated locally over every ChEMBL molecule
+
+    Properties: full_mwt, mw_freebase, mw_monoisotopic, alogp, cx_logp, cx_logd, cx_most_apka, cx_most_bpka,
+    hba, hbd, hba_lipinski, hbd_lipinski, psa, rtb, num_ro5_violations, num_lipinski_ro5_violations,
+    qed_weighted, aromatic_rings, heavy_atoms, np_likeness_score. Operators: exact (default), lt, lte, gt, gte,
+    range ([low, high], inclusive) and isnull. Molecules without a value never match a comparison.
+
+    Args:
+        filters: Mapping of property__operator to value, e.g. {"full_mwt__lt": 500, "alogp__lt": 5, "hbd__lte": 5}
+        order_by: Property to order by, prefix with '-' for descending, e.g. '-qed_weighted'
+        limit: Maximum number of molecules to return
+        offset: Number of matching molecules to skip
+        include_properties: Return every property of each molecule
+        include_structures: Fetch the SMILES, InChI and InChI key of the returned molecules from ChEMBL
+
+    Returns:
+        Dictionary with the table release, total number of matches and the requested molecules
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    return await asyncio.to_thread(queued(_filter_molecules, filters, order_by, offset, limit,
+                                          include_properties, include_structures))
+
+@mcp.tool()
+@error_handler
+@async_timeout(600)
+async def screen_structural_alerts(smiles: List[str], sets: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Screen a batch of molecules against the ChEMBL structural alert sets locally
+
+    Every alert SMARTS is compiled once and matched against the whole batch on all cores,
+    so a 100k-compound library is screened in minutes without calls to the ChEMBL utils service.
+
+    Args:
+        smiles: SMILES strings to screen
+        sets: Alert sets to screen against, e.g. ['PAINS', 'Glaxo'] (all sets if omitted)
+
+    Returns:
+        Dictionary with the alerts release, number of molecules flagged and one result per SMILES,
+        in input order, with its alerts (as returned by example_structuralAlerts) or an error
+    """
+    if not smiles:
+        raise ValueError("smiles must contain at least one SMILES string")
+    engine = await asyncio.to_thread(chembl_alerts.get_engine)
+    with span('structural_alerts.screen', molecules=len(smiles)) as screen_span:
+        results = await asyncio.to_thread(queued(engine.screen_many, smiles, sets))
+        flagged = sum(1 for result in results if result.get('alerts'))
+        screen_span.set(alerts=len(engine.alerts), flagged=flagged)
+    return {'release': engine.release, 'molecules': len(results), 'flagged': flagged, 'results': results}
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def cache_stats() -> Dict[str, Any]:
+    """Get the cache policies of the cached tools and how often each cache path was taken
+
+    Counted paths are hit, stale_hit (expired result served while refreshing), miss,
+    negative_hit / negative_store (empty results and invalid IDs), refresh and refresh_error.
+    With a shared cache, shared reports its entries, bytes used and this process's hits,
+    misses and stores. groups breaks the cache down by tool and entity: entries, entries
+    current for the release, bytes, oldest and newest entry ages in seconds, lookups and hit ratio.
+
+    Returns:
+        Dictionary with the current ChEMBL release, cache size, per-tool policies, counters,
+        per-group contents, shared cache statistics and the progress of any cache warm-up
+    """
+    groups = await asyncio.to_thread(cache.summary)
+    return {
+        'release': watcher.release,
+        'entries': len(cache),
+        'refreshing': len(_refresh_tasks),
+        'policies': {name: policy.as_dict() for name, policy in TOOL_CACHE_POLICIES.items()},
+        'counters': tool_cache_counters.snapshot(),
+        'groups': groups,
+        'shared': cache.shared.stats() if cache.shared is not None else None,
+        'warming': warmer.status(),
+    }
+
+@mcp.tool()
+@error_handler
+@async_timeout(10)
+async def cache_entries(pattern: Optional[str] = None, release: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+    """List cached entries, most recently used first
+
+    Args:
+        pattern: Glob matched against the entry key, e.g. 'example_drug *', 'molecule *' or '*CHEMBL25*'
+        release: Only entries stored under this ChEMBL release, e.g. 'ChEMBL_34'
+        limit: Maximum number of entries to return
+
+    Returns:
+        Dictionary with the number of matching entries and the first limit of them, each with
+        group (tool or entity), key, release, current, age and expires_in in seconds and bytes
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    entries = await asyncio.to_thread(cache.entries, pattern, release)
+    return {'release': watcher.release, 'total': len(entries), 'entries': entries[:limit]}
+
+@mcp.tool()
+@error_handler
+@async_timeout(10)
+async def purge_cache(pattern: Optional[str] = None, release: Optional[str] = None) -> Dict[str, Any]:
+    """Drop cached entries by key pattern and/or release; without either the whole cache is dropped
+
+    Args:
+        pattern: Glob matched against the entry key, as listed by cache_entries, e.g. 'example_activity *'
+        release: Only entries stored under this ChEMBL release, e.g. 'ChEMBL_34'
+
+    Returns:
+        Dictionary with the number of entries purged and the number left
+    """
+    purged = await asyncio.to_thread(cache.purge, pattern, release)
+    logging.info(f"Purged {purged} cache entries (pattern {pattern!r}, release {release!r})")
+    return {'purged': purged, 'entries': len(cache)}
+
+@mcp.tool()
+@error_handler
+@async_timeout(10)
+async def warm_cache(calls: Optional[List[Dict[str, Any]]] = None, path: Optional[str] = None,
+                     top: int = chembl_warming.TOP_CALLS, concurrency: int = chembl_warming.CONCURRENCY) -> Dict[str, Any]:
+    """Start filling the cache in the background by replaying tool calls
+
+    Give the calls inline or the path of a query log (written with --query-log) or load test
+    scenario file on the server. Only tools with a cache policy are warmed; entity tools such
+    as example_activity need one set with --tool-cache. Progress is reported by cache_stats.
+
+    Args:
+        calls: Calls to replay, each {"tool": ..., "arguments": {...}}, most important first
+        path: Query log or scenario file to read the calls from; query logs are ranked by frequency
+        top: Most calls replayed
+        concurrency: Calls running at once
+
+    Returns:
+        Dictionary with the warm-up's progress
+    """
+    if (calls is None) == (path is None):
+        raise ValueError("Give either calls or path")
+    if calls is not None:
+        replay = [(call['tool'], call.get('arguments', {})) for call in calls][:top]
+    else:
+        replay = await asyncio.to_thread(load_calls, path, top)
+    warmer.start(replay, warm_call, concurrency, path or 'calls')
+    return warmer.status()
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def stop_warming() -> Dict[str, Any]:
+    """Cancel a running cache warm-up
+
+    Returns:
+        Dictionary telling whether a warm-up was running, with its progress
+    """
+    stopped = warmer.cancel()
+    return {'stopped': stopped, 'warming': warmer.status()}
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def health_status() -> Dict[str, Any]:
+    """Get the health of this server, as reported by its /health/ready endpoint
+
+    Checks event loop lag, tool calls queued for a lane slot or worker thread, the shared
+    cache, the latest background probes of the ChEMBL data and utils services, and the
+    startup cache warm-up. Nothing is fetched from ChEMBL to answer.
+
+    Returns:
+        Dictionary with ready, the current ChEMBL release, uptime and each check with its
+        measurements and whether it passed
+    """
+    return health_report()
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def start_profiling(tool: str, mode: str = 'deterministic', calls: int = 1, memory: bool = False) -> Dict[str, Any]:
+    """Profile the next calls of a tool and write the profiles to the profile directory
+
+    Deterministic mode writes a cProfile .pstats file of the work the call does in worker
+    threads; sampling mode writes a .collapsed stack file for flame graph tools. With memory
+    set, tracemalloc snapshots are taken around each call and a .tracemalloc snapshot plus a
+    report of the largest allocation sites are written.
+
+    Args:
+        tool: Tool name, or '*' for any tool
+        mode: 'deterministic' or 'sampling'
+        calls: Number of calls to profile
+        memory: Also capture allocation snapshots
+
+    Returns:
+        The armed profiling request
+    """
+    if tool != '*' and tool not in {t.name for t in await mcp.list_tools()}:
+        raise ValueError(f"Unknown tool {tool!r}")
+    return profiler.arm(tool, mode, calls, memory)
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def stop_profiling(tool: str) -> Dict[str, Any]:
+    """Cancel profiling that was started for a tool and has calls left
+
+    Args:
+        tool: Tool name, or '*'
+
+    Returns:
+        Dictionary telling whether profiling was armed for the tool
+    """
+    return {'tool': tool, 'stopped': profiler.disarm(tool)}
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def profiling_status() -> Dict[str, Any]:
+    """Get the profiling requests still armed and the profile files written so far
+
+    Returns:
+        Dictionary with the profile directory, armed requests and written profiles
+    """
+    return profiler.status()
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def scheduler_stats() -> Dict[str, Any]:
+    """Get the state of the tool call scheduler
+
+    Calls run in lanes ('fast' for chemical utilities and admin tools, 'bulk' for data fetches),
+    each with a fixed number of slots shared fairly between clients (MCP sessions).
+
+    Returns:
+        Per lane: capacity, running and queued calls, totals and per-client counters
+    """
+    return scheduler.stats()
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def prefetch_stats() -> Dict[str, Any]:
+    """Get next-page prefetch counters
+
+    While a client pages through a cursor with read_cursor, the following pages are fetched in
+    the background. A read is a hit when a prefetch had already stored its records, late when a
+    prefetch was still fetching them and a miss when it fell outside the prefetched range.
+
+    Returns:
+        Whether prefetching is on, its limits, readers tracked, prefetches running, bytes of
+        prefetched records not yet read, the hit rate, and per resource the counts of hits, late
+        hits, misses, prefetches started, cancelled (idle client) or skipped over budget, and
+        records requested and fetched
+    """
+    return prefetcher.stats()
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def hedging_stats() -> Dict[str, Any]:
+    """Get request hedging counters
+
+    When hedging is on, an idempotent upstream request that is slower than the configured percentile
+    of recent requests to the same endpoint is sent a second time and the first response wins.
+
+    Returns:
+        Whether hedging is on, totals of hedges sent and won, and per endpoint the latency samples,
+        current hedge delay, and counts of hedgeable requests, hedges, hedge wins and hedges skipped over budget
+    """
+    return hedger.stats()
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def apply_changes(feed: Optional[str] = None) -> Dict[str, Any]:
+    """Apply ChEMBL change feeds to the local property table, fuzzy search index and cache in the background
+
+    Each store moves to the feed's release by writing a new generation with only the changed
+    records applied, then switches to it; queries keep using the old generation until then.
+
+    Args:
+        feed: File name of a feed in the sync directory; by default every feed that applies is
+            applied in release order
+
+    Returns:
+        Whether a sync was started and the sync status
+    """
+    if chembl_sync.feed_dir is None:
+        raise ValueError("No sync directory configured; start the server with --sync-dir")
+    path = None
+    if feed is not None:
+        if os.path.basename(feed) != feed:
+            raise ValueError("feed must be a file name in the sync directory")
+        path = os.path.join(chembl_sync.feed_dir, feed)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No change feed {feed} in {chembl_sync.feed_dir}")
+    started = syncer.start(path)
+    return {'started': started, **await asyncio.to_thread(syncer.status)}
+
+@mcp.tool()
+@error_handler
+@async_timeout(5)
+async def sync_status() -> Dict[str, Any]:
+    """Get the releases held by the local stores, the change feeds available and the sync history
+
+    Returns:
+        Dictionary with the sync directory, the running sync if any, the release of each store,
+        available feeds by the release they start from, and the results of earlier syncs
+    """
+    return await asyncio.to_thread(syncer.status)
+
+# Liveness and readiness of this server, from state kept in memory; never waits for upstream
+def health_report() -> Dict[str, Any]:
+    lanes = scheduler.stats()['lanes']
+    pool = executor.stats()
+    queued_calls = pool['queued'] + sum(lane['queued'] for lane in lanes.values())
+    upstream = prober.results()
+    shared = cache.shared.available() if cache.shared is not None else None
+    checks = {
+        'loop_lag': {
+            'ok': loop_monitor.running and loop_monitor.recent_max <= chembl_health.MAX_LOOP_LAG,
+            'lag_ms': round(loop_monitor.lag * 1000, 1),
+            'recent_max_ms': round(loop_monitor.recent_max * 1000, 1),
+            'limit_ms': chembl_health.MAX_LOOP_LAG * 1000,
+        },
+        'queue': {
+            'ok': queued_calls <= chembl_health.MAX_QUEUED,
+            'queued': queued_calls,
+            'limit': chembl_health.MAX_QUEUED,
+            'executor': pool,
+            'lanes': {name: {key: lane[key] for key in ('capacity', 'running', 'queued')} for name, lane in lanes.items()},
+        },
+        'cache': {'ok': shared is not False, 'entries': len(cache), 'shared': shared},
+        'upstream': {
+            'ok': prober.interval <= 0 or all(result['up'] for result in upstream.values()),
+            'probe_interval': prober.interval,
+            'families': upstream,
+        },
+        'warm_up': {'ok': not (warmer.running and warmer.startup), 'running': warmer.running,
+                    'done': warmer.done, 'calls': warmer.total},
+    }
+    return {
+        'ready': all(check['ok'] for check in checks.values()),
+        'release': watcher.release,
+        'uptime_seconds': round(time.time() - loop_monitor.started_at, 1),
+        'checks': checks,
+    }
+
+@mcp.custom_route('/health/live', methods=['GET'])
+async def liveness(request: Request) -> JSONResponse:
+    # Answering at all shows the event loop is running
+    return JSONResponse({'alive': True, 'uptime_seconds': round(time.time() - loop_monitor.started_at, 1),
+                         'loop_lag_ms': round(loop_monitor.lag * 1000, 1)})
+
+@mcp.custom_route('/health/ready', methods=['GET'])
+async def readiness(request: Request) -> JSONResponse:
+    report = health_report()
+    return JSONResponse(report, status_code=200 if report['ready'] else 503)
+
+# Run the server alongside the health monitors and the --warm cache warm-up. Clients can connect
+# while the warm-up runs; /health/ready reports the server not ready until it has finished
+async def serve(transport: str):
+    asyncio.get_running_loop().set_default_executor(executor)
+    loop_monitor.start()
+    prober.start()
+    # Process-wide services start and stop here rather than in a FastMCP lifespan, which
+    # streamable HTTP enters once per session. Watching the release keeps cached data from
+    # outliving it, and knowing it before warming keeps warmed entries from going stale at once.
+    await asyncio.to_thread(watcher.start)
+    try:
+        if chembl_warming.warm_path:
+            calls = await asyncio.to_thread(load_calls, chembl_warming.warm_path, chembl_warming.TOP_CALLS)
+            logging.info(f"Warming the cache with {len(calls)} calls from {chembl_warming.warm_path}")
+            warmer.start(calls, warm_call, chembl_warming.CONCURRENCY, chembl_warming.warm_path, startup=True)
+        if transport == 'streamable-http':
+            await mcp.run_streamable_http_async()
+        else:
+            await mcp.run_stdio_async()
+    finally:
+        await asyncio.to_thread(prober.stop)
+        await asyncio.to_thread(watcher.stop)
+        tracer.shutdown()
+
+# Parse a --tool-cache value of the form TOOL=TTL[,STALE_TTL[,NEGATIVE_TTL]] (seconds)
+def parse_cache_policy(value: str):
+    import argparse
+    try:
+        name, settings = value.split('=', 1)
+        numbers = [float(x) for x in settings.split(',')]
+        if not 1 <= len(numbers) <= 3:
+            raise ValueError(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected TOOL=TTL[,STALE_TTL[,NEGATIVE_TTL]], got {value!r}")
+    return name, CachePolicy(*numbers)
+
 if __name__ == "__main__":
     import argparse
     
@@ -788,22 +1708,128 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='ChEMBL FastMCP Server')
     parser.add_argument('--host', type=str, default='127.0.0.1', help='Server host address')
     parser.add_argument('--port', type=int, default=8000, help='Server port')
-    parser.add_argument('--transport', type=str, default='http', choices=['http', 'stdio'], help='Transport method')
+    parser.add_argument('--transport', type=str, default='http', choices=['http', 'stdio', 'streamable-http'], help="Transport method; 'streamable-http' serves MCP over HTTP at /mcp")
     parser.add_argument('--log-level', type=str, default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='Log level')
+    parser.add_argument('--fuzzy-index', type=str, default=chembl_fuzzy.index_path, help='Index file searched by fuzzy_search, built with chembl_fuzzy.py')
+    parser.add_argument('--property-table', type=str, default=chembl_properties.table_dir, help='Directory of the molecule property table searched by filter_molecules, built with chembl_properties.py')
+    parser.add_argument('--alerts', type=str, default=chembl_alerts.alerts_path, help='Structural alerts file screened locally by screen_structural_alerts, and by example_structuralAlerts with --local-structural-alerts, built with chembl_alerts.py')
+    parser.add_argument('--local-structural-alerts', action='store_true', help='Answer example_structuralAlerts from the --alerts file instead of the ChEMBL utils service')
+    parser.add_argument('--sync-dir', type=str, default=None, help='Directory of change feeds applied to the local stores when ChEMBL moves to a new release')
+    parser.add_argument('--export-dir', type=str, default=chembl_export.export_dir, help='Directory for files written by export_query')
+    parser.add_argument('--result-store-memory', type=int, default=store.memory_limit // (1024 * 1024), help='Megabytes of fetched results kept in memory before spilling to disk')
+    parser.add_argument('--cache-ttl', type=float, default=cache.ttl / 3600, help='Hours cached results are kept; entries are refreshed when ChEMBL publishes a new release')
+    parser.add_argument('--shared-cache', type=str, default=None, help='Cache file shared by the server processes of this host, e.g. /dev/shm/chembl_cache')
+    parser.add_argument('--shared-cache-size', type=int, default=256, help='Megabytes of a new shared cache file')
+    parser.add_argument('--shared-cache-record-size', type=int, default=RECORD_SIZE, help='Expected average bytes per shared cache entry, which the index of a new file is sized for')
+    parser.add_argument('--query-log', type=str, default=None, help='JSON-lines file every cached tool call is appended to, for warming other servers with --warm')
+    parser.add_argument('--warm', type=str, default=None, help='Query log or load test scenario replayed in the background at startup to fill the cache')
+    parser.add_argument('--warm-top', type=int, default=chembl_warming.TOP_CALLS, help=f'Most frequent distinct calls replayed by --warm, defaults to {chembl_warming.TOP_CALLS}')
+    parser.add_argument('--probe-interval', type=float, default=chembl_health.PROBE_INTERVAL, help=f'Seconds between background probes of the ChEMBL data and utils services; 0 disables them (default {chembl_health.PROBE_INTERVAL:g})')
+    parser.add_argument('--max-loop-lag', type=float, default=chembl_health.MAX_LOOP_LAG * 1000, help='Event loop lag in milliseconds above which /health/ready reports the server not ready')
+    parser.add_argument('--max-queued', type=int, default=chembl_health.MAX_QUEUED, help='Tool calls waiting for a lane slot or worker thread above which /health/ready reports the server not ready')
+    parser.add_argument('--warm-concurrency', type=int, default=chembl_warming.CONCURRENCY, help=f'Warm-up calls running at once, defaults to {chembl_warming.CONCURRENCY}')
+    parser.add_argument('--tool-cache', type=parse_cache_policy, action='append', default=[], metavar='TOOL=TTL[,STALE_TTL[,NEGATIVE_TTL]]', help='Cache policy of an entity tool in seconds; a TTL of 0 disables caching. Can be repeated')
+    parser.add_argument('--trace-file', type=str, default=None, help='Append tracing spans to this JSON-lines file')
+    parser.add_argument('--trace-otlp-endpoint', type=str, default=None, help='Send tracing spans to this OTLP/HTTP collector, e.g. http://localhost:4318')
+    parser.add_argument('--trace-sample-rate', type=float, default=1.0, help='Fraction of tool calls traced when a trace exporter is configured')
+    parser.add_argument('--profile', type=str, action='append', default=[], metavar='TOOL[:MODE[:CALLS]]', help="Profile the first calls of a tool ('*' for any tool); MODE is deterministic or sampling. Can be repeated")
+    parser.add_argument('--profile-memory', action='store_true', help='Also capture allocation snapshots of profiled calls')
+    parser.add_argument('--profile-dir', type=str, default=chembl_profiling.profile_dir, help='Directory profiles are written to')
+    parser.add_argument('--lane-capacity', type=str, action='append', default=[], metavar='LANE=N', help='Calls running at once in a lane (fast or bulk). Can be repeated')
+    parser.add_argument('--client-max-running', type=str, action='append', default=[], metavar='LANE=N', help='Calls one client may run at once in a lane. Can be repeated')
+    parser.add_argument('--client-max-queued', type=int, default=None, help='Calls one client may have waiting in a lane before more are rejected')
+    parser.add_argument('--client-weight', type=str, action='append', default=[], metavar='CLIENT_ID=WEIGHT', help='Share of the lanes given to a client relative to others (default 1). Can be repeated')
+    parser.add_argument('--tool-lane', type=str, action='append', default=[], metavar='TOOL=LANE', help='Run a tool in another lane. Can be repeated')
+    parser.add_argument('--no-scheduler', action='store_true', help='Run tool calls as they arrive, without lanes or fair queuing')
+    parser.add_argument('--hedge', action='store_true', help='Send a duplicate of slow idempotent upstream requests and use the first response')
+    parser.add_argument('--hedge-percentile', type=float, default=hedger.percentile, help='Percentile of recent latencies of an endpoint after which a request is hedged')
+    parser.add_argument('--hedge-budget', type=float, default=hedger.budget, help='Hedged requests allowed as a fraction of all hedgeable requests')
+    parser.add_argument('--hedge-min-delay', type=float, default=hedger.min_delay * 1000, help='Milliseconds a request is always given before it is hedged')
+    parser.add_argument('--no-prefetch', action='store_true', help='Do not fetch the next pages of a cursor while a client pages through it')
+    parser.add_argument('--prefetch-pages', type=int, default=prefetcher.max_pages, help='Most pages fetched ahead of a client paging through a cursor')
+    parser.add_argument('--prefetch-memory', type=int, default=prefetcher.max_bytes // (1024 * 1024), help='Megabytes of prefetched records not yet read, across all clients')
+    parser.add_argument('--release-check-interval', type=float, default=watcher.interval / 60, help='Minutes between checks for a new ChEMBL release')
     
     args = parser.parse_args()
     
     # Set log level
     logging.getLogger().setLevel(getattr(logging, args.log_level))
+    chembl_export.export_dir = args.export_dir
+    chembl_fuzzy.index_path = args.fuzzy_index
+    chembl_properties.table_dir = args.property_table
+    chembl_alerts.alerts_path = args.alerts
+    chembl_alerts.local_single = args.local_structural_alerts
+    if args.local_structural_alerts and not chembl_alerts.local_alerts_available():
+        logging.warning(f"--local-structural-alerts needs RDKit and the alerts file {args.alerts}; "
+                        f"example_structuralAlerts will call the utils service")
+    chembl_sync.feed_dir = args.sync_dir
+    if args.sync_dir:
+        watcher.listeners.append(syncer.on_release)
+    store.memory_limit = args.result_store_memory * 1024 * 1024
+    cache.ttl = args.cache_ttl * 3600
+    if args.shared_cache:
+        try:
+            cache.shared = SharedCache(args.shared_cache, args.shared_cache_size * 1024 * 1024,
+                                       args.shared_cache_record_size)
+        except (OSError, RuntimeError, ValueError) as e:
+            parser.error(f"Cannot open the shared cache {args.shared_cache}: {str(e)}")
+    watcher.interval = args.release_check_interval * 60
+    exporters = []
+    if args.trace_file:
+        exporters.append(JsonLinesExporter(args.trace_file))
+    if args.trace_otlp_endpoint:
+        exporters.append(OtlpExporter(args.trace_otlp_endpoint))
+    tracer.configure(exporters, args.trace_sample_rate)
+    scheduler.configure(parse_assignments(args.lane_capacity), parse_assignments(args.client_max_running),
+                        args.client_max_queued, parse_assignments(args.client_weight, float))
+    TOOL_LANES.update(parse_assignments(args.tool_lane, str))
+    for tool, lane in TOOL_LANES.items():
+        if lane not in scheduler.lanes:
+            parser.error(f"Unknown lane {lane!r} for {tool}; lanes are {', '.join(scheduler.lanes)}")
+    scheduler.enabled = not args.no_scheduler
+    if args.hedge:
+        try:
+            hedger.enable(args.hedge_percentile, args.hedge_budget, args.hedge_min_delay / 1000)
+        except ValueError as e:
+            parser.error(str(e))
+    prefetcher.enabled = not args.no_prefetch
+    prefetcher.max_pages = args.prefetch_pages
+    prefetcher.max_bytes = args.prefetch_memory * 1024 * 1024
+    if args.query_log:
+        try:
+            query_log.open(args.query_log)
+        except OSError as e:
+            parser.error(f"Cannot open the query log {args.query_log}: {str(e)}")
+    chembl_warming.warm_path = args.warm
+    chembl_warming.TOP_CALLS = args.warm_top
+    chembl_warming.CONCURRENCY = args.warm_concurrency
+    prober.interval = args.probe_interval
+    chembl_health.MAX_LOOP_LAG = args.max_loop_lag / 1000
+    chembl_health.MAX_QUEUED = args.max_queued
+    chembl_profiling.profile_dir = args.profile_dir
+    for spec in args.profile:
+        tool, _, options = spec.partition(':')
+        mode, _, calls = options.partition(':')
+        profiler.arm(tool, mode or 'deterministic', int(calls or 1), args.profile_memory)
+    for name, policy in args.tool_cache:
+        if policy.ttl > 0:
+            TOOL_CACHE_POLICIES[name] = policy
+        else:
+            TOOL_CACHE_POLICIES.pop(name, None)
     
     logging.info(f"Starting ChEMBL MCP Server (transport: {args.transport})")
     
     # FastMCP only supports 'stdio' as transport parameter
-    if args.transport == 'http':
+    if args.transport == 'streamable-http':
+        logging.info(f"Serving MCP over streamable HTTP at http://{args.host}:{args.port}/mcp")
+        mcp.settings.host = args.host
+        mcp.settings.port = args.port
+        asyncio.run(serve('streamable-http'))
+    elif args.transport == 'http':
         logging.info(f"HTTP server will run on {args.host}:{args.port}")
         logging.warning("FastMCP does not support http transport, falling back to stdio transport")
         # Fallback to stdio due to missing fastapi module or FastMCP not supporting http
-        mcp.run(transport='stdio')
+        asyncio.run(serve('stdio'))
     else:
         logging.info("Using stdio transport")
-        mcp.run(transport='stdio')
+        asyncio.run(serve('stdio'))
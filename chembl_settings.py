@@ -0,0 +1,16 @@
+import os
+from chembl_webresource_client.settings import Settings
+
+# Environment overrides of the ChEMBL client settings. This module must be imported before
+# chembl_webresource_client.new_client and .utils, which fetch their API descriptions on import.
+#   CHEMBL_API_URL: Base URL of the web services, e.g. http://127.0.0.1:8765/chembl/api for a stand-in
+#   CHEMBL_HTTP_CACHE: Set to 0 to turn off the client's on-disk HTTP cache
+
+API_URL = os.environ.get('CHEMBL_API_URL')
+
+if API_URL:
+    Settings.Instance().NEW_CLIENT_URL = API_URL.rstrip('/') + '/data'
+    Settings.Instance().UTILS_SPORE_URL = API_URL.rstrip('/') + '/utils/spore'
+
+if os.environ.get('CHEMBL_HTTP_CACHE', '').lower() in ('0', 'false', 'no', 'off'):
+    Settings.Instance().CACHING = False
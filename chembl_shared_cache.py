@@ -0,0 +1,284 @@
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple
+import contextlib
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from chembl_metrics import Counters
+
+try:
+    import fcntl
+except ImportError:  # Windows; the shared tier needs flock
+    fcntl = None
+
+MAGIC = b'CHEMBLC1'
+
+# Default size of the shared cache file
+DEFAULT_SIZE = 256 * 1024 * 1024
+
+# Index slots probed for a key; 16 slots span four cache lines
+PROBE = 16
+
+# Expected average size of a record in bytes, which the index of a new file is sized for
+RECORD_SIZE = 128
+
+# Index slots per record that fits in the ring; at two, a full ring of average records fills half the
+# index, where all PROBE slots of a key are rarely taken, so live records are seldom evicted from the index
+SLOTS_PER_RECORD = 2
+
+# Largest value stored, as a fraction of the data area
+MAX_VALUE_FRACTION = 0.25
+
+# magic, index slots, data size, write position, records written
+_HEADER = struct.Struct('<8sQQQQ')
+_WRITE_POSITION = 24
+_WRITTEN = 32
+_HEADER_SIZE = 64
+
+# key hash, position + 1 (0 marks an empty slot)
+_SLOT = struct.Struct('<QQ')
+
+# key hash, key length, payload length, CRC-32 of key and payload, expiry (Unix time)
+_RECORD = struct.Struct('<QIIIxxxxd')
+
+
+def _key_bytes(key: Hashable) -> bytes:
+    # Cache keys are tuples of strings, numbers and None, whose repr is the same in every process
+    return repr(key).encode()
+
+
+def _hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+class SharedCache:
+    """Cache tier in a memory-mapped file that all server processes on a host share
+
+    The file holds an index of key hashes and a ring buffer of records, each
+    a pickled (release, value) pair with its key, expiry and checksum. New
+    records are appended at the write position, which wraps around and
+    overwrites the oldest records, so eviction needs no bookkeeping: a
+    record is live while it lies within one ring length behind the write
+    position. Readers take no locks. They verify the key and checksum of a
+    record in place, unpickle it straight from the mapping and check that
+    the writer did not pass over it meanwhile. Writers hold the file lock
+    only while they append one record and update its index slot.
+
+    Args:
+        path: Cache file, created if missing; put it on a RAM-backed file system such as /dev/shm
+        size: Size of a new file in bytes; an existing file keeps its size
+        record_size: Expected average record size in bytes the index of a new file is sized for;
+            smaller records fill the index before the ring, so that live records are evicted early
+    """
+
+    def __init__(self, path: str, size: int = DEFAULT_SIZE, record_size: int = RECORD_SIZE):
+        if fcntl is None:
+            raise RuntimeError("The shared cache needs fcntl.flock, which this platform does not provide")
+        self.path = path
+        self.counters = Counters()
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._file_lock():
+                if os.fstat(self._fd).st_size == 0:
+                    self._create(size, record_size)
+                self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+            magic, self.slots, self.data_size, _, _ = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a ChEMBL shared cache file")
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._index = _HEADER_SIZE
+        self._data = self._index + _align(self.slots * _SLOT.size, mmap.PAGESIZE)
+        self.max_value = int(self.data_size * MAX_VALUE_FRACTION)
+
+    def _create(self, size: int, record_size: int):
+        if record_size < 1:
+            raise ValueError("record_size must be at least 1")
+        # Split the file so that slots = SLOTS_PER_RECORD * data_size / record_size
+        index_share = _SLOT.size * SLOTS_PER_RECORD / (record_size + _SLOT.size * SLOTS_PER_RECORD)
+        data_size = max(1024 * 1024, int((size - _HEADER_SIZE) * (1 - index_share)))
+        slots = max(1024, SLOTS_PER_RECORD * data_size // record_size)
+        total = _HEADER_SIZE + _align(slots * _SLOT.size, mmap.PAGESIZE) + data_size
+        os.ftruncate(self._fd, total)
+        os.pwrite(self._fd, _HEADER.pack(MAGIC, slots, data_size, 0, 0), 0)
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # flock excludes other processes; threads of this one share the descriptor and use _lock
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _write_position(self) -> int:
+        return struct.unpack_from('<Q', self._map, _WRITE_POSITION)[0]
+
+    def _live(self, position: int) -> bool:
+        return position >= self._write_position() - self.data_size
+
+    def _slots(self, digest: int) -> range:
+        first = digest % self.slots
+        return range(first, first + PROBE)
+
+    def _slot_offset(self, slot: int) -> int:
+        return self._index + (slot % self.slots) * _SLOT.size
+
+    def get(self, key: Hashable, not_before: float = 0) -> Optional[Tuple[float, Optional[str], Any]]:
+        """Return (expires, release, value) for key, or None
+
+        Args:
+            key: Cache key
+            not_before: Ignore records that expired before this Unix time
+        """
+        key_bytes = _key_bytes(key)
+        digest = _hash(key_bytes)
+        for slot in self._slots(digest):
+            slot_digest, stored = _SLOT.unpack_from(self._map, self._slot_offset(slot))
+            if slot_digest != digest or not stored or not self._live(stored - 1):
+                continue
+            found = self._read(stored - 1, digest, key_bytes, not_before)
+            if found is not None:
+                self.counters.increment('shared', 'hit')
+                return found
+        self.counters.increment('shared', 'miss')
+        return None
+
+    def _read(self, position: int, digest: int, key_bytes: bytes,
+              not_before: float) -> Optional[Tuple[float, Optional[str], Any]]:
+        offset = self._data + position % self.data_size
+        record_digest, key_length, payload_length, crc, expires = _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size
+        end = start + key_length + payload_length
+        if record_digest != digest or key_length != len(key_bytes) or end > self._data + self.data_size:
+            return None
+        if expires < not_before:
+            return None
+        with memoryview(self._map) as view:
+            body = view[start:end]
+            try:
+                if body[:key_length] != key_bytes or zlib.crc32(body) != crc:
+                    return None
+                release, value = pickle.loads(body[key_length:])
+            except Exception:
+                # Overwritten while being read
+                return None
+            finally:
+                body.release()
+        if not self._live(position):
+            return None
+        return expires, release, value
+
+    def put(self, key: Hashable, value: Any, expires: float, release: Optional[str]) -> bool:
+        """Store value for key until expires (Unix time)
+
+        Returns:
+            False if value cannot be pickled or is too large for the cache
+        """
+        key_bytes = _key_bytes(key)
+        try:
+            payload = pickle.dumps((release, value), pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logging.debug(f"Not sharing cache entry {key!r}: {str(e)}")
+            self.counters.increment('shared', 'unpicklable')
+            return False
+        size = _align(_RECORD.size + len(key_bytes) + len(payload), 8)
+        if size > self.max_value:
+            self.counters.increment('shared', 'too_large')
+            return False
+        digest = _hash(key_bytes)
+        crc = zlib.crc32(payload, zlib.crc32(key_bytes))
+        with self._file_lock():
+            position = self._write_position()
+            offset = position % self.data_size
+            if offset + size > self.data_size:
+                # Records never wrap; skip the tail of the ring
+                position += self.data_size - offset
+                offset = 0
+            # Advance the write position first, so readers of the records being overwritten discard them
+            struct.pack_into('<QQ', self._map, _WRITE_POSITION, position + size,
+                             struct.unpack_from('<Q', self._map, _WRITTEN)[0] + 1)
+            start = self._data + offset
+            _RECORD.pack_into(self._map, start, digest, len(key_bytes), len(payload), crc, expires)
+            start += _RECORD.size
+            self._map[start:start + len(key_bytes)] = key_bytes
+            start += len(key_bytes)
+            self._map[start:start + len(payload)] = payload
+            _SLOT.pack_into(self._map, self._slot_offset(self._free_slot(digest)), digest, position + 1)
+        self.counters.increment('shared', 'store')
+        return True
+
+    def _free_slot(self, digest: int) -> int:
+        """Slot for digest: its own, else an empty or dead one, else the one with the oldest record"""
+        entries = [(slot, *_SLOT.unpack_from(self._map, self._slot_offset(slot))) for slot in self._slots(digest)]
+        for slot, slot_digest, _ in entries:
+            if slot_digest == digest:
+                return slot
+        for slot, _, stored in entries:
+            if not stored or not self._live(stored - 1):
+                return slot
+        return min(entries, key=lambda entry: entry[2])[0]
+
+    def discard(self, key: Hashable) -> bool:
+        """Remove key from the index, so no process finds it any more
+
+        Returns:
+            Whether key was indexed
+        """
+        digest = _hash(_key_bytes(key))
+        with self._file_lock():
+            for slot in self._slots(digest):
+                slot_digest, stored = _SLOT.unpack_from(self._map, self._slot_offset(slot))
+                if slot_digest == digest and stored:
+                    _SLOT.pack_into(self._map, self._slot_offset(slot), 0, 0)
+                    return True
+        return False
+
+    def clear(self):
+        with self._file_lock():
+            self._map[self._index:self._data] = bytes(self._data - self._index)
+
+    def stats(self) -> Dict[str, Any]:
+        live = 0
+        for slot in range(self.slots):
+            _, stored = _SLOT.unpack_from(self._map, self._slot_offset(slot))
+            live += bool(stored) and self._live(stored - 1)
+        position = self._write_position()
+        return {
+            'path': self.path,
+            'entries': live,
+            'index_slots': self.slots,
+            'bytes': self.data_size,
+            'bytes_used': min(position, self.data_size),
+            'written': struct.unpack_from('<Q', self._map, _WRITTEN)[0],
+            'counters': self.counters.snapshot().get('shared', {}),
+        }
+
+    def available(self) -> bool:
+        """Whether the file is still mapped and intact, checked without a lock"""
+        try:
+            return _HEADER.unpack_from(self._map, 0)[0] == MAGIC
+        except (ValueError, struct.error):
+            return False
+
+    def close(self):
+        with self._lock:
+            self._map.close()
+            os.close(self._fd)
+
+
+def _align(n: int, alignment: int) -> int:
+    return (n + alignment - 1) // alignment * alignment
+
+
+def wall_clock(monotonic_time: float) -> float:
+    """Unix time of a time.monotonic() value"""
+    return time.time() + monotonic_time - time.monotonic()
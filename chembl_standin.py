@@ -0,0 +1,404 @@
+# Offline stand-in for the ChEMBL web services. Serves a synthetic data set through the data API,
+# utils and status endpoints the ChEMBL client uses, with configurable latency, so the server can be
+# developed and load-tested without network access.
+from typing import Any, Dict, List, Optional, Tuple
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl, unquote
+import copy
+import json
+import random
+import re
+import threading
+import time
+
+# Resource name to the collection key of its list responses
+RESOURCES = {
+    'activity': 'activities', 'assay': 'assays', 'atc_class': 'atc', 'binding_site': 'binding_sites',
+    'biotherapeutic': 'biotherapeutics', 'cell_line': 'cell_lines', 'chembl_id_lookup': 'chembl_id_lookups',
+    'chembl_release': 'chembl_releases', 'compound_record': 'compound_records',
+    'compound_structural_alert': 'compound_structural_alerts', 'document': 'documents',
+    'document_similarity': 'document_similarities', 'drug': 'drugs', 'drug_indication': 'drug_indications',
+    'drug_warning': 'drug_warnings', 'go_slim': 'go_slims', 'mechanism': 'mechanisms', 'metabolism': 'metabolisms',
+    'molecule': 'molecules', 'molecule_form': 'molecule_forms', 'organism': 'organisms',
+    'protein_classification': 'protein_classifications', 'similarity': 'molecules', 'source': 'sources',
+    'substructure': 'molecules', 'target': 'targets', 'target_component': 'target_components',
+    'target_relation': 'target_relations', 'tissue': 'tissues', 'xref_source': 'xref_sources',
+    'activity_supplementary_data_by_activity': 'activity_supplementary_data',
+}
+
+# Lookup operators understood by the stand-in
+OPERATORS = ('exact', 'iexact', 'contains', 'icontains', 'startswith', 'istartswith',
+             'in', 'gt', 'gte', 'lt', 'lte', 'range', 'isnull')
+
+# 'description' is left out: the client would bind it over its own description attribute
+UTILS_METHODS = ('canonicalizeSmiles', 'chemblDescriptors', 'descriptors', 'getParent',
+                 'highlightSmilesFragmentSvg', 'inchi2inchiKey', 'inchi2svg', 'is3D', 'official',
+                 'removeHs', 'smiles2inchi', 'smiles2inchiKey', 'smiles2svg', 'standardize', 'structuralAlerts')
+
+SMILES = ['CC(=O)Oc1ccccc1C(=O)O', 'CN1C=NC2=C1C(=O)N(C(=O)N2C)C', 'CC(C)Cc1ccc(cc1)C(C)C(=O)O',
+          'CC(=O)Nc1ccc(O)cc1', 'OC(=O)c1ccccc1O', 'c1ccc2c(c1)cccc2', 'CCN(CC)CC', 'CCO']
+
+
+def build_data(molecules: int = 2000, seed: int = 1) -> Dict[str, List[Dict[str, Any]]]:
+    """Generate a consistent synthetic data set
+
+    Args:
+        molecules: Number of molecules; other resources scale with it
+        seed: Random seed
+
+    Returns:
+        Mapping of resource name to its records
+    """
+    rnd = random.Random(seed)
+    data: Dict[str, List[Dict[str, Any]]] = {name: [] for name in RESOURCES}
+    targets = max(5, molecules // 40)
+    assays = max(3, molecules // 10)
+    for i in range(targets):
+        data['target'].append({'target_chembl_id': f'CHEMBL_T{i}', 'pref_name': f'Kinase {i}',
+                               'target_type': 'SINGLE PROTEIN', 'organism': 'Homo sapiens'})
+    for i in range(assays):
+        data['assay'].append({'assay_chembl_id': f'CHEMBL_A{i}', 'assay_type': rnd.choice('BFA'),
+                              'target_chembl_id': f'CHEMBL_T{i % targets}', 'description': f'Assay {i}'})
+    for i in range(molecules):
+        molecule_id = f'CHEMBL_M{i}'
+        smiles = SMILES[i % len(SMILES)] + 'C' * (i % 5)
+        data['molecule'].append({
+            'molecule_chembl_id': molecule_id, 'pref_name': f'MOLECULE {i}', 'molecule_type': 'Small molecule',
+            'max_phase': str(i % 5), 'first_approval': 1950 + i % 70 if i % 5 == 4 else None,
+            'molecule_properties': {
+                'full_mwt': f'{100 + rnd.random() * 500:.2f}', 'alogp': f'{rnd.uniform(-2, 7):.2f}',
+                'hbd': rnd.randint(0, 6), 'hba': rnd.randint(0, 12), 'psa': f'{rnd.uniform(0, 180):.2f}',
+                'rtb': rnd.randint(0, 12), 'num_ro5_violations': rnd.randint(0, 2),
+                'qed_weighted': f'{rnd.random():.2f}', 'aromatic_rings': rnd.randint(0, 4),
+                'heavy_atoms': rnd.randint(5, 40),
+            },
+            'molecule_structures': {'canonical_smiles': smiles, 'standard_inchi_key': f'KEY{i:010d}-UHFFFAOYSA-N'},
+            'molecule_synonyms': [{'molecule_synonym': f'SYN-{i}', 'syn_type': 'RESEARCH_CODE'}],
+        })
+        data['chembl_id_lookup'].append({'chembl_id': molecule_id, 'entity_type': 'COMPOUND', 'status': 'ACTIVE'})
+        data['compound_record'].append({'record_id': i, 'molecule_chembl_id': molecule_id, 'compound_name': f'compound {i}'})
+        for j in range(5):
+            data['activity'].append({
+                'activity_id': i * 5 + j, 'assay_chembl_id': f'CHEMBL_A{(i + j) % assays}',
+                'target_chembl_id': f'CHEMBL_T{(i + j) % targets}', 'molecule_chembl_id': molecule_id,
+                'standard_type': rnd.choice(['IC50', 'Ki', 'EC50', 'Kd']),
+                'standard_value': f'{rnd.random() * 10000:.2f}', 'standard_units': 'nM',
+                'pchembl_value': None if rnd.random() < 0.15 else f'{rnd.uniform(4, 10):.2f}',
+                'document_chembl_id': f'CHEMBL_D{i % 50}',
+            })
+        if i % 10 == 0:
+            data['drug'].append({'molecule_chembl_id': molecule_id, 'drug_type': i % 3 + 1, 'pref_name': f'DRUG {i}'})
+            data['drug_indication'].append({'drugind_id': i, 'molecule_chembl_id': molecule_id,
+                                            'mesh_heading': rnd.choice(['Hypertension', 'Asthma', 'Neoplasms']),
+                                            'efo_term': 'disease', 'max_phase_for_ind': '4'})
+            data['mechanism'].append({'mec_id': i, 'molecule_chembl_id': molecule_id,
+                                      'mechanism_of_action': rnd.choice(['ACE inhibitor', 'Kinase inhibitor']),
+                                      'action_type': 'INHIBITOR', 'target_chembl_id': f'CHEMBL_T{i % targets}'})
+            data['drug_warning'].append({'warning_id': i, 'molecule_chembl_id': molecule_id, 'warning_type': 'Black Box Warning',
+                                         'warning_class': 'hepatotoxicity', 'meddra_term': 'Liver injury'})
+            data['atc_class'].append({'level5': f'A01AA{i:04d}', 'level1': 'A', 'level1_description': 'ALIMENTARY TRACT AND METABOLISM',
+                                      'who_name': f'drug {i}'})
+    for i in range(50):
+        data['document'].append({'document_chembl_id': f'CHEMBL_D{i}', 'journal': 'J. Med. Chem.', 'year': 2000 + i % 25,
+                                 'title': f'Document {i}'})
+    data['organism'] = [{'tax_id': 9606, 'l1': 'Eukaryotes', 'l2': 'Mammalia', 'l3': 'Primates'}]
+    data['source'] = [{'src_id': 1, 'src_description': 'Scientific Literature', 'src_short_name': 'LITERATURE'}]
+    return data
+
+
+def release_changes(data: Dict[str, List[Dict[str, Any]]], fraction: float = 0.01,
+                    seed: int = 2) -> List[Dict[str, Any]]:
+    """Change data in place as a new ChEMBL release would and return the change feed lines
+
+    Updates the properties (and some names) of a fraction of the molecules,
+    deletes a few molecules that are not drugs, inserts new molecules,
+    renames some targets and moves some drug indications to other MeSH headings.
+
+    Args:
+        data: Data set from build_data
+        fraction: Fraction of molecules and targets changed
+        seed: Random seed
+
+    Returns:
+        Feed lines in the format read by chembl_sync.ChangeFeed, without the header
+    """
+    rnd = random.Random(seed)
+    changes = []
+    molecules = data['molecule']
+    count = max(1, int(len(molecules) * fraction))
+    drugs = {d['molecule_chembl_id'] for d in data['drug']}
+    candidates = [i for i, m in enumerate(molecules) if m['molecule_chembl_id'] not in drugs]
+    chosen = rnd.sample(candidates, min(len(candidates), count + max(1, count // 5)))
+    for i in chosen[:count]:
+        record = molecules[i]
+        previous = copy.deepcopy(record)
+        record['molecule_properties']['alogp'] = f'{rnd.uniform(-2, 7):.2f}'
+        record['molecule_properties']['full_mwt'] = f'{100 + rnd.random() * 500:.2f}'
+        if rnd.random() < 0.3:
+            record['pref_name'] = f"{record['pref_name']} HYDROCHLORIDE"
+        changes.append({'resource': 'molecule', 'op': 'update', 'id': record['molecule_chembl_id'],
+                        'record': copy.deepcopy(record), 'previous': previous})
+    deleted = {molecules[i]['molecule_chembl_id'] for i in chosen[count:]}
+    for record in [m for m in molecules if m['molecule_chembl_id'] in deleted]:
+        changes.append({'resource': 'molecule', 'op': 'delete', 'id': record['molecule_chembl_id'], 'previous': record})
+    molecules[:] = [m for m in molecules if m['molecule_chembl_id'] not in deleted]
+    next_id = 1 + max(int(m['molecule_chembl_id'][len('CHEMBL_M'):]) for m in molecules)
+    for i in range(next_id, next_id + max(1, count // 5)):
+        template = copy.deepcopy(rnd.choice(molecules))
+        template.update({'molecule_chembl_id': f'CHEMBL_M{i}', 'pref_name': f'MOLECULE {i}',
+                         'molecule_synonyms': [{'molecule_synonym': f'SYN-{i}', 'syn_type': 'RESEARCH_CODE'}]})
+        molecules.append(template)
+        changes.append({'resource': 'molecule', 'op': 'insert', 'id': template['molecule_chembl_id'],
+                        'record': copy.deepcopy(template)})
+    for record in rnd.sample(data['target'], max(1, int(len(data['target']) * fraction))):
+        previous = copy.deepcopy(record)
+        record['pref_name'] = f"{record['pref_name']} (renamed)"
+        changes.append({'resource': 'target', 'op': 'update', 'id': record['target_chembl_id'],
+                        'record': copy.deepcopy(record), 'previous': previous})
+    for record in rnd.sample(data['drug_indication'], max(1, int(len(data['drug_indication']) * fraction))):
+        previous = copy.deepcopy(record)
+        record['mesh_heading'] = rnd.choice(['Diabetes Mellitus', 'Migraine Disorders'])
+        changes.append({'resource': 'drug_indication', 'op': 'update', 'id': record['drugind_id'],
+                        'record': copy.deepcopy(record), 'previous': previous})
+    return changes
+
+
+class StandinState:
+    """Mutable settings of a running stand-in
+
+    Args:
+        release: Release name reported by the status endpoint
+        latency: Seconds added to every data and utils request
+        jitter: Random extra seconds, uniform in [0, jitter]
+        slow_fraction: Fraction of requests that take slow_latency instead, to model tail latency
+        slow_latency: Seconds taken by slow requests
+    """
+
+    def __init__(self, release: str = 'CHEMBL_35', latency: float = 0.0, jitter: float = 0.0,
+                 slow_fraction: float = 0.0, slow_latency: float = 2.0):
+        self.release = release
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            self.requests += 1
+        if self.slow_fraction and random.random() < self.slow_fraction:
+            time.sleep(self.slow_latency)
+        elif self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+
+def _value(record: Dict[str, Any], path: List[str]) -> Any:
+    value: Any = record
+    for name in path:
+        value = value.get(name) if isinstance(value, dict) else None
+    return value
+
+
+def _matches(record: Dict[str, Any], lookup: str, expected: str) -> bool:
+    path = lookup.split('__')
+    operator = path.pop() if len(path) > 1 and path[-1] in OPERATORS else 'exact'
+    value = _value(record, path)
+    if operator == 'isnull':
+        return (value is None) == (str(expected).lower() in ('true', '1'))
+    if value is None:
+        return False
+    text, expected = str(value), str(expected)
+    if operator == 'in':
+        return text in [v.strip() for v in expected.split(',')]
+    if operator in ('gt', 'gte', 'lt', 'lte', 'range'):
+        try:
+            number = float(value)
+            bounds = [float(v) for v in expected.split(',')]
+        except ValueError:
+            return False
+        if operator == 'range':
+            return bounds[0] <= number <= bounds[1]
+        return {'gt': number > bounds[0], 'gte': number >= bounds[0],
+                'lt': number < bounds[0], 'lte': number <= bounds[0]}[operator]
+    if operator.startswith('i'):
+        text, expected, operator = text.lower(), expected.lower(), operator[1:]
+    if operator == 'contains':
+        return expected in text
+    if operator == 'startswith':
+        return text.startswith(expected)
+    return text == expected
+
+
+def _field_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'integer'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, (dict, list)):
+        return 'related'
+    return 'string'
+
+
+def _utils_response(method: str, body: str) -> Any:
+    if method == 'structuralAlerts':
+        return [{'alert_name': 'Michael acceptor', 'smarts': 'C=CC=O', 'set_name': 'Glaxo'}]
+    if method in ('chemblDescriptors', 'descriptors'):
+        return [{'MolWt': 180.16, 'NumHDonors': 1, 'NumHAcceptors': 3, 'MolLogP': 1.31}]
+    if method == 'is3D':
+        return False
+    if method in ('smiles2svg', 'inchi2svg', 'highlightSmilesFragmentSvg'):
+        return '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"/>'
+    if method in ('inchi2inchiKey', 'smiles2inchiKey'):
+        return 'BSYNRYMUTXBXSQ-UHFFFAOYSA-N'
+    if method == 'smiles2inchi':
+        return 'InChI=1S/C9H8O4/c1-6(10)13-8-5-3-2-4-7(8)9(11)12/h2-5H,1H3,(H,11,12)'
+    return body
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Request handler; the server it belongs to carries data and state attributes"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, payload: Any, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        # The client sleeps 3600 / limit seconds after each utils call
+        self.send_header('x-hourlyratelimit-limit', '360000000')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _base(self, api: str) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/chembl/api/{api}/'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith('/data/spore'):
+            return self._send({'base_url': self._base('data'), 'methods': {
+                f'GET_{name}_detail': {'resource_name': name, 'collection_name': collection,
+                                       'formats': ['json', 'xml'], 'default_format': 'application/json'}
+                for name, collection in RESOURCES.items()}})
+        if url.path.endswith('/utils/spore'):
+            methods = {f'POST_{name}': {'path': f'/{name}', 'method': 'POST', 'formats': ['json']}
+                       for name in UTILS_METHODS}
+            methods['GET_status'] = {'path': '/status', 'method': 'GET', 'formats': ['json']}
+            return self._send({'base_url': self._base('utils'), 'methods': methods})
+        if url.path.endswith('/utils/status') or url.path.endswith('/data/status.json'):
+            return self._send({'chembl_db_version': self.server.state.release, 'status': 'UP',
+                               'chembl_release_date': '2025-01-01'})
+        match = re.match(r'.*/data/(\w+)/schema(\.json)?$', url.path)
+        if match:
+            records = self.server.data.get(match.group(1)) or [{}]
+            return self._send({'fields': {k: {'type': _field_type(v)} for k, v in records[0].items()}})
+        match = re.match(r'.*/data/(\w+)\.json$', url.path)
+        if match:
+            return self._query(match.group(1), parse_qsl(url.query))
+        self._send({'error_message': 'Not found'}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+        match = re.match(r'.*/utils/(\w+)$', url.path)
+        if match:
+            self.server.state.delay()
+            return self._send(_utils_response(match.group(1), body))
+        match = re.match(r'.*/data/(\w+)\.json$', url.path)
+        if match:
+            if '=' in body and not body.startswith('['):
+                params = parse_qsl(body)
+            else:
+                # The client sends [name, value] pairs with URL-quoted values, or lists for __in
+                params = [(k, ','.join(map(str, v)) if isinstance(v, list) else unquote(str(v)))
+                          for k, v in json.loads(body or '[]')]
+            return self._query(match.group(1), params)
+        self._send({'error_message': 'Not found'}, 404)
+
+    def _query(self, resource: str, params: List[Tuple[str, Any]]):
+        if resource not in RESOURCES:
+            return self._send({'error_message': f'Unknown resource {resource}'}, 404)
+        self.server.state.delay()
+        records = self.server.data.get(resource, [])
+        controls = {'limit', 'offset', 'only', 'order_by', 'format'}
+        for lookup, expected in params:
+            if lookup not in controls:
+                records = [r for r in records if _matches(r, lookup, expected)]
+        for field in reversed([v for k, v in params if k == 'order_by']):
+            name = field.lstrip('-')
+            records = sorted(records, key=lambda r: (r.get(name) is None, str(r.get(name))), reverse=field.startswith('-'))
+        settings = dict(p for p in params if p[0] in ('limit', 'offset'))
+        limit, offset = int(settings.get('limit', 20)), int(settings.get('offset', 0))
+        page = records[offset:offset + limit]
+        only = [v for k, v in params if k == 'only']
+        only = [f for value in only for f in str(value).split(',')]
+        if only:
+            page = [{f: r.get(f) for f in only} for r in page]
+        self._send({RESOURCES[resource]: page, 'page_meta': {
+            'limit': limit, 'offset': offset, 'total_count': len(records),
+            'next': None if offset + limit >= len(records) else 'next', 'previous': None}})
+
+
+def serve(host: str = '127.0.0.1', port: int = 8765, state: Optional[StandinState] = None,
+          molecules: int = 2000) -> ThreadingHTTPServer:
+    """Start the stand-in in a daemon thread
+
+    Args:
+        host: Address to listen on
+        port: Port to listen on; 0 picks a free one
+        state: Latency and release settings
+        molecules: Size of the synthetic data set
+
+    Returns:
+        The running server; its base API URL is http://host:port/chembl/api
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.data = build_data(molecules)
+    server.state = state or StandinState()
+    threading.Thread(target=server.serve_forever, name='chembl_standin', daemon=True).start()
+    return server
+
+
+def api_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}/chembl/api'
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Offline stand-in for the ChEMBL web services')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--molecules', type=int, default=2000, help='Number of synthetic molecules')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Random extra seconds per request')
+    parser.add_argument('--slow-fraction', type=float, default=0.0, help='Fraction of requests that are slow')
+    parser.add_argument('--slow-latency', type=float, default=2.0, help='Seconds taken by slow requests')
+    parser.add_argument('--release', type=str, default='CHEMBL_35', help='Release reported by the status endpoint')
+    parser.add_argument('--changes-out', type=str, default=None,
+                        help='Serve a changed data set as --release and write the change feed from --previous-release to this file')
+    parser.add_argument('--previous-release', type=str, default='CHEMBL_34', help='Release of the unchanged data set')
+    parser.add_argument('--change-fraction', type=float, default=0.01, help='Fraction of records changed for --changes-out')
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, StandinState(args.release, args.latency, args.jitter,
+                                                      args.slow_fraction, args.slow_latency), args.molecules)
+    if args.changes_out:
+        changes = release_changes(server.data, args.change_fraction)
+        with open(args.changes_out, 'w') as f:
+            header = {'previous_release': args.previous_release, 'release': args.release,
+                      'resources': ['molecule', 'drug', 'target', 'drug_indication']}
+            f.writelines(json.dumps(line) + '\n' for line in [header] + changes)
+        print(f"Wrote {len(changes)} changes from {args.previous_release} to {args.release} to {args.changes_out}")
+    print(f"ChEMBL stand-in serving on {api_url(server)}; start the server with CHEMBL_API_URL={api_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
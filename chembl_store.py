@@ -0,0 +1,304 @@
+from typing import Any, Dict, Hashable, List, Optional
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from chembl_paging import fetch_into, PAGE_SIZE, FAN_OUT
+
+# In-memory bytes across all result sets above which the largest are spilled to disk
+MEMORY_LIMIT = 256 * 1024 * 1024
+
+# Seconds a result set is kept after its last use
+IDLE_TTL = 30 * 60
+
+# Result sets of a new release filled at once in the background while the old release's are served
+REFRESH_WORKERS = 2
+
+
+class RecordBuffer:
+    """Append-only record list that can move its contents to a memory-mapped file
+
+    Until spill() is called records are kept as Python objects. Afterwards
+    each record is stored as a JSON line in a file and read back through mmap,
+    so only the requested slice is decoded.
+
+    Args:
+        directory: Directory for the spill file
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.estimated_bytes = 0
+        self._records: Optional[List[Dict[str, Any]]] = []
+        self._offsets = array('q')
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    @property
+    def spilled(self) -> bool:
+        return self._records is None
+
+    def __len__(self) -> int:
+        return len(self._offsets) if self.spilled else len(self._records)
+
+    def extend(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        with self._lock:
+            if self.spilled:
+                self._write(records)
+            else:
+                # Sizing every record would cost as much as serialising it; sample the first
+                self.estimated_bytes += len(json.dumps(records[0])) * len(records)
+                self._records.extend(records)
+
+    def spill(self):
+        """Move the buffered records to the spill file"""
+        with self._lock:
+            if self.spilled:
+                return
+            fd, path = tempfile.mkstemp(suffix='.jsonl', dir=self.directory)
+            self._file = os.fdopen(fd, 'w+b')
+            os.unlink(path)
+            records, self._records = self._records, None
+            self._write(records)
+            self.estimated_bytes = 0
+
+    def _write(self, records: List[Dict[str, Any]]):
+        position = self._file.seek(0, os.SEEK_END)
+        lines = []
+        for record in records:
+            line = json.dumps(record).encode() + b'\n'
+            self._offsets.append(position)
+            position += len(line)
+            lines.append(line)
+        self._file.write(b''.join(lines))
+        self._file.flush()
+
+    def read(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            if not self.spilled:
+                return self._records[start:stop]
+            stop = min(stop, len(self._offsets))
+            if start >= stop:
+                return []
+            size = self._file.seek(0, os.SEEK_END)
+            if self._map is None or len(self._map) != size:
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+            end = self._offsets[stop] if stop < len(self._offsets) else size
+            return [json.loads(line) for line in self._map[self._offsets[start]:end].splitlines()]
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+            if self._file is not None:
+                self._file.close()
+            self._records, self._map, self._file = [], None, None
+            self._offsets = array('q')
+
+
+class ResultSet:
+    """Records of one entity query fetched so far, addressed by an opaque cursor"""
+
+    def __init__(self, store: 'ResultStore', key: Hashable, queryset, buffer: RecordBuffer):
+        self.cursor = uuid.uuid4().hex
+        self.store = store
+        self.key = key
+        self.queryset = queryset
+        self.records = buffer
+        self.release = store.release
+        self.total: Optional[int] = None
+        self.complete = False
+        self.last_used = time.monotonic()
+        self.fill_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def fill(self, stop: Optional[int] = None, page_size: int = PAGE_SIZE, fan_out: int = FAN_OUT):
+        """Fetch records until stop (or all of them), continuing after those already stored
+
+        Only one thread fills a result set at a time; others wait for it and
+        then continue from wherever it got to.
+        """
+        if self.complete or (stop is not None and len(self.records) >= stop):
+            return
+        with self.fill_lock:
+            start = len(self.records)
+            if self.complete or (stop is not None and start >= stop):
+                return
+            if stop is not None:
+                page_size = max(1, min(page_size, stop - start))
+            self.total = fetch_into(self.queryset, self._append, start, stop, page_size, fan_out, self._set_total)
+            if len(self.records) >= self.total or len(self.records) == start:
+                self.complete = True
+
+    def _set_total(self, total: int):
+        self.total = total
+
+    def _append(self, records: List[Dict[str, Any]]):
+        self.records.extend(records)
+        self.last_used = time.monotonic()
+        self.store.enforce_memory_limit()
+
+    def read(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        self.last_used = time.monotonic()
+        return self.records.read(start, len(self.records) if stop is None else stop)
+
+    @property
+    def stale(self) -> bool:
+        """Whether the records were fetched under an earlier ChEMBL release"""
+        return self.release != self.store.release
+
+    def info(self) -> Dict[str, Any]:
+        return {'cursor': self.cursor, 'fetched': len(self.records), 'total': self.total,
+                'complete': self.complete, 'spilled': self.records.spilled, 'stale': self.stale}
+
+
+class ResultStore:
+    """Result sets of entity queries, kept across tool calls so retries resume
+
+    Args:
+        memory_limit: In-memory bytes above which the largest result sets are spilled to disk
+        idle_ttl: Seconds a result set is kept after its last use
+    """
+
+    def __init__(self, memory_limit: int = MEMORY_LIMIT, idle_ttl: float = IDLE_TTL):
+        self.memory_limit = memory_limit
+        self.idle_ttl = idle_ttl
+        self.release: Optional[str] = None
+        self._by_cursor: Dict[str, ResultSet] = {}
+        self._by_key: Dict[Hashable, ResultSet] = {}
+        # Result sets of the current release filling in the background, by key
+        self._refreshing: Dict[Hashable, ResultSet] = {}
+        self._lock = threading.Lock()
+        self._directory: Optional[str] = None
+        self._refresh_executor: Optional[ThreadPoolExecutor] = None
+
+    def _spill_directory(self) -> str:
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='chembl_store_')
+        return self._directory
+
+    def open(self, key: Hashable, queryset, refresh: bool = False) -> ResultSet:
+        """Return the result set for key, creating it if needed
+
+        A complete result set fetched under an earlier ChEMBL release is
+        still returned, flagged stale, while the set of the current release
+        fills in the background; it replaces the old one once complete.
+        An incomplete old set, or any existing one if refresh is set, is
+        replaced straight away, so releases are never mixed in one set.
+        Replaced sets stay readable under their cursors until they expire.
+        """
+        with self._lock:
+            self._expire()
+            result_set = self._by_key.get(key)
+            if result_set is not None and not refresh and result_set.stale and result_set.complete:
+                if key not in self._refreshing:
+                    self._refresh(key, queryset)
+            elif result_set is None or refresh or result_set.stale:
+                result_set = self._new(key, queryset)
+                self._by_key[key] = result_set
+            result_set.last_used = time.monotonic()
+            return result_set
+
+    def _new(self, key: Hashable, queryset) -> ResultSet:
+        result_set = ResultSet(self, key, queryset, RecordBuffer(self._spill_directory()))
+        self._by_cursor[result_set.cursor] = result_set
+        return result_set
+
+    def _refresh(self, key: Hashable, queryset):
+        # Called with _lock held
+        result_set = self._new(key, queryset)
+        self._refreshing[key] = result_set
+        if self._refresh_executor is None:
+            self._refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS,
+                                                        thread_name_prefix='chembl_store_refresh')
+        self._refresh_executor.submit(self._fill_and_swap, result_set)
+
+    def _fill_and_swap(self, result_set: ResultSet):
+        try:
+            result_set.fill()
+        except Exception as e:
+            logging.warning(f"Refreshing result set {result_set.cursor} for release {result_set.release} failed: {str(e)}")
+        with self._lock:
+            if self._refreshing.get(result_set.key) is result_set:
+                del self._refreshing[result_set.key]
+            if result_set.complete and not result_set.stale:
+                self._by_key[result_set.key] = result_set
+            else:
+                # Failed, or overtaken by yet another release; the next open starts over
+                self._by_cursor.pop(result_set.cursor, None)
+                result_set.records.close()
+
+    def get(self, cursor: str) -> ResultSet:
+        with self._lock:
+            self._expire()
+            result_set = self._by_cursor.get(cursor)
+        if result_set is None:
+            raise ValueError(f"Unknown or expired cursor: {cursor}")
+        result_set.last_used = time.monotonic()
+        return result_set
+
+    def enforce_memory_limit(self):
+        """Spill the largest in-memory result sets until under the memory limit"""
+        with self._lock:
+            in_memory = [r for r in self._by_cursor.values() if not r.records.spilled]
+        in_memory.sort(key=lambda r: r.records.estimated_bytes, reverse=True)
+        used = sum(r.records.estimated_bytes for r in in_memory)
+        for result_set in in_memory:
+            if used <= self.memory_limit:
+                break
+            used -= result_set.records.estimated_bytes
+            logging.info(f"Spilling result set {result_set.cursor} ({len(result_set)} records) to disk")
+            result_set.records.spill()
+
+    def set_release(self, release: str):
+        """Switch to a new ChEMBL release; later queries get older result sets only until new ones are complete"""
+        with self._lock:
+            self.release = release
+
+    def _expire(self):
+        now = time.monotonic()
+        for cursor, result_set in list(self._by_cursor.items()):
+            if now - result_set.last_used > self.idle_ttl and not result_set.fill_lock.locked():
+                del self._by_cursor[cursor]
+                if self._by_key.get(result_set.key) is result_set:
+                    del self._by_key[result_set.key]
+                result_set.records.close()
+
+    def close(self):
+        with self._lock:
+            for result_set in self._by_cursor.values():
+                result_set.records.close()
+            self._by_key.clear()
+            self._by_cursor.clear()
+            self._refreshing.clear()
+            if self._refresh_executor is not None:
+                self._refresh_executor.shutdown(wait=False, cancel_futures=True)
+                self._refresh_executor = None
+            if self._directory is not None:
+                shutil.rmtree(self._directory, ignore_errors=True)
+                self._directory = None
+
+
+def query_key(queryset) -> Hashable:
+    """Key identifying the records a queryset selects, independent of paging"""
+    query = queryset.query
+    filters = tuple((name, repr(value)) for name, value in query.filters)
+    return (query.model.name, query.base_url, filters, tuple(query.ordering), tuple(query.only))
+
+
+# Result store shared by all tools of the server process
+store = ResultStore()
@@ -0,0 +1,149 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence
+import codecs
+import json
+import re
+import sys
+
+# Bytes read from a response body at a time
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Records are decoded one at a time, so the decoder's own key sharing only spans a
+# record; interning keeps one copy of each field name across all records instead
+_decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {sys.intern(key): value for key, value in pairs})
+
+# Returned by _decode while a value is not yet complete
+_INCOMPLETE = object()
+
+
+class CollectionDecoder:
+    """Incremental decoder of a ChEMBL list response, e.g. {"molecules": [...], "page_meta": {...}}
+
+    Text is fed in chunks as it arrives. Each record of the collection array
+    is decoded as soon as it is complete and the text before it is dropped,
+    so only the unfinished record and one chunk are held, never the whole
+    body or its fully decoded tree. Other top-level members, such as
+    page_meta, are decoded whole into meta, in whatever order they come.
+
+    Args:
+        collection: Key of the record array
+    """
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.meta: Dict[str, Any] = {}
+        self.count = 0
+        self._text = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == 'done'
+
+    def feed(self, text: str, final: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield the records completed by text
+
+        Args:
+            text: Next chunk of the response body
+            final: Whether this is the last chunk; a truncated body then raises ValueError
+        """
+        self._text = self._text[self._pos:] + text
+        self._pos = 0
+        while True:
+            self._pos = _WHITESPACE.match(self._text, self._pos).end()
+            if self._pos >= len(self._text):
+                break
+            char = self._text[self._pos]
+            if self._state == 'start':
+                self._expect(char, '{')
+                self._state = 'key'
+            elif self._state == 'key':
+                if char in ',}':
+                    self._pos += 1
+                    if char == '}':
+                        self._state = 'done'
+                    continue
+                key = self._decode(final)
+                if key is _INCOMPLETE:
+                    break
+                self._key = key
+                self._state = 'colon'
+            elif self._state == 'colon':
+                self._expect(char, ':')
+                self._state = 'array' if self._key == self.collection else 'value'
+            elif self._state == 'array':
+                self._expect(char, '[')
+                self._state = 'records'
+            elif self._state == 'records':
+                if char in ',]':
+                    self._pos += 1
+                    if char == ']':
+                        self._state = 'key'
+                    continue
+                record = self._decode(final)
+                if record is _INCOMPLETE:
+                    break
+                self.count += 1
+                yield record
+            elif self._state == 'value':
+                value = self._decode(final)
+                if value is _INCOMPLETE:
+                    break
+                self.meta[self._key] = value
+                self._state = 'key'
+            else:
+                raise ValueError(f"Unexpected {char!r} after the end of the response")
+        if final and not self.done:
+            raise ValueError("Response ended before the JSON document was complete")
+
+    def _expect(self, char: str, expected: str):
+        if char != expected:
+            raise ValueError(f"Expected {expected!r} at offset {self._pos} of the response, found {char!r}")
+        self._pos += 1
+
+    def _decode(self, final: bool) -> Any:
+        try:
+            value, end = _decoder.raw_decode(self._text, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return _INCOMPLETE
+        if end == len(self._text) and not final and self._text[end - 1].isdigit():
+            # A number at the end of the chunk may continue in the next one
+            return _INCOMPLETE
+        self._pos = end
+        return value
+
+
+def projection(fields: Optional[Sequence[str]]) -> Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]:
+    """Return a function keeping only fields of a record, or None to keep every field
+
+    Lookups such as molecule_properties__full_mwt keep their top-level field.
+    """
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(field.split('__')[0] for field in fields))
+
+    def project(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {name: record[name] for name in names if name in record}
+    return project
+
+
+def iter_collection(chunks: Iterable[bytes], decoder: CollectionDecoder,
+                    encoding: str = 'utf-8') -> Iterator[Dict[str, Any]]:
+    """Decode the records of a list response from its body, chunk by chunk
+
+    Args:
+        chunks: Body of the response, e.g. response.iter_content(CHUNK_SIZE)
+        decoder: Decoder for the response's collection; holds meta once the body is exhausted
+        encoding: Character encoding of the body
+
+    Returns:
+        Iterator over the records in response order
+    """
+    text = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        yield from decoder.feed(text.decode(chunk))
+    yield from decoder.feed(text.decode(b'', final=True), final=True)
@@ -0,0 +1,313 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from collections import defaultdict
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+import chembl_fuzzy
+import chembl_properties
+from chembl_cache import cache
+
+# Operations of a change feed line
+OPERATIONS = ('insert', 'update', 'delete')
+
+# Directory searched for change feeds; set from the server command line
+feed_dir: Optional[str] = None
+
+# Resources a feed must cover completely before a store is moved to its release
+STORE_SOURCES = {
+    'property_table': ('molecule',),
+    'fuzzy_index': tuple(chembl_fuzzy.SOURCES),
+}
+
+
+def _open(path: str):
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+
+class ChangeFeed:
+    """Records that differ between two ChEMBL releases, read from a JSON-lines file
+
+    The first line is a header naming the releases and the resources the
+    feed covers completely:
+
+        {"previous_release": "CHEMBL_35", "release": "CHEMBL_36", "resources": ["molecule", "target"]}
+
+    Every further line is one changed record:
+
+        {"resource": "molecule", "op": "update", "id": "CHEMBL25", "record": {...}, "previous": {...}}
+
+    op is insert, update or delete and id is the record's primary key.
+    record is the complete new version (insert and update), previous the old
+    one (update and delete); previous may be left out unless the record's
+    links changed, e.g. a drug indication's MeSH heading or a mechanism's
+    molecule. Files ending in .gz are read gzipped.
+
+    Args:
+        path: Feed file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with _open(path) as f:
+            header = json.loads(f.readline())
+            self.changes = [json.loads(line) for line in f if line.strip()]
+        self.previous_release = header.get('previous_release')
+        self.release = header.get('release')
+        # Only the resources the header names are covered completely; a resource that merely
+        # appears in change lines may have changed elsewhere too, so its cache is not carried over
+        self.resources: Set[str] = set(header.get('resources') or [])
+        if not self.release:
+            raise ValueError(f"Change feed {path} does not name the release it leads to")
+        for change in self.changes:
+            if change.get('op') not in OPERATIONS:
+                raise ValueError(f"Change feed {path} has an unknown operation {change.get('op')!r}")
+
+    def of(self, resource: str) -> List[Dict[str, Any]]:
+        return [change for change in self.changes if change['resource'] == resource]
+
+    def summary(self) -> Dict[str, Any]:
+        counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for change in self.changes:
+            counts[change['resource']][change['op']] += 1
+        return {'path': self.path, 'previous_release': self.previous_release, 'release': self.release,
+                'resources': sorted(self.resources), 'changes': {resource: dict(ops) for resource, ops in counts.items()}}
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    with _open(path) as f:
+        return json.loads(f.readline())
+
+
+def sync_property_table(path: str, feed: ChangeFeed) -> Dict[str, Any]:
+    """Write the next generation of the property table with the feed's molecule changes applied
+
+    Returns:
+        Counts of molecules inserted, updated and deleted, and the new generation
+    """
+    table = chembl_properties.PropertyTable(path)
+    changes = feed.of('molecule')
+    upserts = [((c.get('record') or {}).get('molecule_properties') or {}) for c in changes if c['op'] != 'delete']
+    names = list(table.columns) + [name for name in chembl_properties.COLUMNS if name not in table.columns
+                                   and any(p.get(name) is not None for p in upserts)]
+    columns = {name: np.array(table.columns[name]) if name in table.columns
+               else np.full(len(table), np.nan, dtype=np.float32) for name in names}
+    row_of = {chembl_id: row for row, chembl_id in enumerate(table.ids.tolist())}
+    keep = np.ones(len(table), dtype=bool)
+    inserted: Dict[bytes, Dict[str, Any]] = {}
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    for change in changes:
+        chembl_id = change['id'].encode()
+        row = row_of.get(chembl_id)
+        if change['op'] == 'delete':
+            inserted.pop(chembl_id, None)
+            if row is not None and keep[row]:
+                keep[row] = False
+                counts['deleted'] += 1
+            continue
+        properties = (change.get('record') or {}).get('molecule_properties') or {}
+        if row is None:
+            inserted[chembl_id] = properties
+            counts['inserted'] += 1
+            continue
+        keep[row] = True
+        for name, column in columns.items():
+            column[row] = chembl_properties.as_number(properties.get(name))
+        counts['updated'] += 1
+    ids = np.concatenate([table.ids[keep], np.array(list(inserted), dtype='S')]) if inserted else table.ids[keep]
+    new_columns = {name: np.concatenate([column[keep], np.array([chembl_properties.as_number(p.get(name))
+                                                                 for p in inserted.values()], dtype=np.float32)])
+                   for name, column in columns.items()}
+    synced = chembl_properties.write_table(path, ids, new_columns, feed.release)
+    if os.path.abspath(path) == os.path.abspath(chembl_properties.table_dir):
+        chembl_properties.install_table(synced)
+    counts['generation'] = synced.meta['generation']
+    return counts
+
+
+def sync_fuzzy_index(path: str, feed: ChangeFeed) -> Dict[str, Any]:
+    """Write the next generation of the fuzzy search index with the feed's name changes applied
+
+    Returns:
+        Numbers of names removed and added, and the new generation
+    """
+    serving = os.path.abspath(path) == os.path.abspath(chembl_fuzzy.index_path)
+    index = chembl_fuzzy.get_index() if serving else chembl_fuzzy.FuzzyIndex.load(path)
+    removed: Dict[str, Set[str]] = defaultdict(set)
+    unlinked: Set[Tuple[str, str, str]] = set()
+    added: List[Tuple[str, str, str]] = []
+    for resource in chembl_fuzzy.SOURCES:
+        entity = chembl_fuzzy.SOURCE_ENTITIES[resource]
+        for change in feed.of(resource):
+            if resource == 'drug_indication':
+                # Headings are shared by many drugs; only the link of this indication changes
+                if change.get('previous'):
+                    unlinked.update(chembl_fuzzy.record_names(resource, change['previous']))
+            else:
+                removed[entity].add(change['id'])
+            if change['op'] != 'delete':
+                added.extend(chembl_fuzzy.record_names(resource, change.get('record') or {}))
+    synced = index.with_changes(removed, unlinked, added, feed.release)
+    synced.save(path)
+    if serving:
+        chembl_fuzzy.install_index(synced)
+    return {'names_before': len(index.names), 'names_after': len(synced.names),
+            'names_added': len(added), 'generation': synced.generation}
+
+
+def _linked_keys(resource: str, record: Optional[Dict[str, Any]]) -> Iterable[Tuple[str, str, Any]]:
+    for field, value in (record or {}).items():
+        if isinstance(value, (str, int)) and not isinstance(value, bool) and field.endswith('_id'):
+            # IDs reach the cache as strings from tool arguments
+            yield resource, field, str(value)
+
+
+def sync_cache(feed: ChangeFeed) -> Dict[str, Any]:
+    """Carry the cached records of the feed's resources over to its release, dropping those it changes"""
+    changed: Set[Tuple[str, str, Any]] = set()
+    for change in feed.changes:
+        changed.update(_linked_keys(change['resource'], change.get('record')))
+        changed.update(_linked_keys(change['resource'], change.get('previous')))
+    carried, dropped = cache.carry_over(feed.resources, changed, feed.previous_release, feed.release)
+    return {'carried_over': carried, 'dropped': dropped}
+
+
+class Syncer:
+    """Brings the server's local data up to a new ChEMBL release by applying change feeds
+
+    Each store (the property table and the fuzzy search index) records the
+    release it holds. A feed is applied to the stores at its previous_release,
+    in a background thread; each store writes a new generation and switches
+    to it atomically, so searches keep running on the old generation
+    meanwhile. Feeds in feed_dir are chained until no store can move further,
+    e.g. CHEMBL_34 -> CHEMBL_35 -> CHEMBL_36.
+    """
+
+    def __init__(self):
+        self.history: List[Dict[str, Any]] = []
+        self.running: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def store_releases(self) -> Dict[str, Optional[str]]:
+        """Release held by each store that exists on disk"""
+        releases = {}
+        if os.path.exists(os.path.join(chembl_properties.table_dir, 'meta.json')):
+            releases['property_table'] = chembl_properties.PropertyTable(chembl_properties.table_dir).release
+        if os.path.exists(chembl_fuzzy.index_path):
+            releases['fuzzy_index'] = chembl_fuzzy.index_meta(chembl_fuzzy.index_path).get('release')
+        return releases
+
+    def feeds(self) -> Dict[str, str]:
+        """Feeds in feed_dir by the release they start from"""
+        found = {}
+        if feed_dir and os.path.isdir(feed_dir):
+            for name in sorted(os.listdir(feed_dir)):
+                if name.endswith(('.jsonl', '.jsonl.gz')):
+                    path = os.path.join(feed_dir, name)
+                    try:
+                        found[read_header(path).get('previous_release')] = path
+                    except (OSError, ValueError) as e:
+                        logging.warning(f"Skipping change feed {path}: {str(e)}")
+        return found
+
+    def apply(self, path: str) -> Dict[str, Any]:
+        """Apply one feed to every store at its previous release, and to the cache
+
+        A store is only synced when the feed covers every resource it is
+        built from; otherwise it stays at its release, to be rebuilt.
+        """
+        feed = ChangeFeed(path)
+        result = feed.summary()
+        result['started'] = time.time()
+        result['stores'] = {}
+        releases = self.store_releases()
+        for name, sync in (('property_table', lambda: sync_property_table(chembl_properties.table_dir, feed)),
+                           ('fuzzy_index', lambda: sync_fuzzy_index(chembl_fuzzy.index_path, feed))):
+            if name not in releases:
+                continue
+            if releases[name] != feed.previous_release:
+                result['stores'][name] = {'skipped': f"holds release {releases[name]}"}
+                continue
+            uncovered = [resource for resource in STORE_SOURCES[name] if resource not in feed.resources]
+            if uncovered:
+                result['stores'][name] = {'skipped': f"feed does not cover {', '.join(uncovered)}"}
+                continue
+            result['stores'][name] = sync()
+        result['cache'] = sync_cache(feed)
+        result['seconds'] = round(time.time() - result['started'], 3)
+        logging.info(f"Applied change feed {path} ({feed.previous_release} -> {feed.release}): {result['stores']}")
+        return result
+
+    def catch_up(self) -> List[Dict[str, Any]]:
+        """Apply feeds from feed_dir until no store is left at a release a feed starts from"""
+        results = []
+        applied: Set[str] = set()
+        while True:
+            feeds = self.feeds()
+            pending = [feeds[r] for r in set(self.store_releases().values()) if r in feeds and feeds[r] not in applied]
+            if not pending:
+                return results
+            for path in pending:
+                applied.add(path)
+                results.append(self.apply(path))
+
+    def start(self, path: Optional[str] = None) -> bool:
+        """Apply path, or catch up with feed_dir, in a background thread
+
+        Returns:
+            False if a sync is already running
+        """
+        with self._lock:
+            if self.running is not None:
+                return False
+            self.running = path or 'catch_up'
+            self._thread = threading.Thread(target=self._run, args=(path,), name='chembl_sync', daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, path: Optional[str]):
+        try:
+            results = [self.apply(path)] if path else self.catch_up()
+            with self._lock:
+                self.history.extend(results)
+        except Exception as e:
+            logging.error(f"Sync of {path or feed_dir} failed: {str(e)}")
+            with self._lock:
+                self.history.append({'path': path or feed_dir, 'error': str(e), 'finished': time.time()})
+        finally:
+            with self._lock:
+                self.running = None
+
+    def on_release(self, previous: Optional[str], release: str):
+        """Release watcher hook: look for feeds leading to the new release"""
+        if feed_dir:
+            self.start()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'feed_dir': feed_dir, 'running': self.running, 'stores': self.store_releases(),
+                    'available_feeds': self.feeds(), 'history': list(self.history)}
+
+
+# Syncer of the server process
+syncer = Syncer()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Apply ChEMBL change feeds to the local property table and fuzzy search index')
+    parser.add_argument('feeds', nargs='*', help='Feed files to apply in order (default: every applicable feed in --feed-dir)')
+    parser.add_argument('--feed-dir', type=str, default=None, help='Directory of change feeds to catch up with')
+    parser.add_argument('--property-table', type=str, default=chembl_properties.table_dir, help='Property table directory')
+    parser.add_argument('--fuzzy-index', type=str, default=chembl_fuzzy.index_path, help='Fuzzy search index file')
+    args = parser.parse_args()
+    chembl_properties.table_dir = args.property_table
+    chembl_fuzzy.index_path = args.fuzzy_index
+    feed_dir = args.feed_dir
+    results = [syncer.apply(path) for path in args.feeds] if args.feeds else syncer.catch_up()
+    print(json.dumps(results, indent=2, default=str))
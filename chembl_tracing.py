@@ -0,0 +1,293 @@
+from typing import Any, Callable, Dict, List, Optional
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import requests
+from chembl_profiling import in_profile
+
+# Spans buffered before the exporter thread writes a batch
+BATCH_SIZE = 512
+
+# Seconds between exports of a partial batch
+FLUSH_INTERVAL = 2.0
+
+SERVICE_NAME = 'chembl-mcp-server'
+
+
+class Span:
+    """One timed operation of a trace
+
+    Spans are created with span() and finished when its block exits. Only
+    sampled traces create Span objects; otherwise span() yields NOOP_SPAN.
+    """
+
+    sampled = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name: str, amount: int = 1):
+        """Add amount to a numeric attribute, e.g. span.add('pages')"""
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def event(self, name: str, **attributes):
+        self.events.append({'name': name, 'time_ns': time.time_ns(), 'attributes': attributes})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'duration_ms': (self.end_ns - self.start_ns) / 1e6,
+            'attributes': self.attributes,
+            'events': self.events,
+            'error': self.error,
+        }
+
+
+class _NoopSpan:
+    sampled = False
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, name: str, amount: int = 1):
+        pass
+
+    def event(self, name: str, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+# Span of the operation running in the current context
+current_span: contextvars.ContextVar[Any] = contextvars.ContextVar('current_span', default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': k, 'value': _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def otlp_payload(spans: List[Span]) -> Dict[str, Any]:
+    """Encode spans as an OTLP/HTTP JSON ExportTraceServiceRequest"""
+    encoded = []
+    for span in spans:
+        item = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 1,
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': _otlp_attributes(span.attributes),
+            'events': [{'name': e['name'], 'timeUnixNano': str(e['time_ns']),
+                        'attributes': _otlp_attributes(e['attributes'])} for e in span.events],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+        }
+        if span.parent_id:
+            item['parentSpanId'] = span.parent_id
+        encoded.append(item)
+    return {'resourceSpans': [{
+        'resource': {'attributes': _otlp_attributes({'service.name': SERVICE_NAME})},
+        'scopeSpans': [{'scope': {'name': 'chembl_tracing'}, 'spans': encoded}],
+    }]}
+
+
+class JsonLinesExporter:
+    """Appends finished spans to a file, one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, 'a') as f:
+            f.write(''.join(json.dumps(span.as_dict(), default=str) + '\n' for span in spans))
+
+
+class OtlpExporter:
+    """Posts finished spans to an OTLP/HTTP collector as JSON
+
+    Args:
+        endpoint: Collector base URL, e.g. http://localhost:4318; /v1/traces is appended
+    """
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.url = endpoint.rstrip('/')
+        if not self.url.endswith('/v1/traces'):
+            self.url += '/v1/traces'
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def export(self, spans: List[Span]):
+        res = self.session.post(self.url, json=otlp_payload(spans), timeout=self.timeout)
+        res.raise_for_status()
+
+
+class Tracer:
+    """Samples traces and hands finished spans to exporters from a background thread
+
+    Tracing is off until configure() is given at least one exporter. The
+    sampling decision is made once per trace, when its root span starts.
+    """
+
+    def __init__(self):
+        self.exporters: List[Any] = []
+        self.sample_rate = 0.0
+        self._queue: 'queue.Queue[Optional[Span]]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters) and self.sample_rate > 0
+
+    def configure(self, exporters: List[Any], sample_rate: float = 1.0):
+        with self._lock:
+            self.exporters = list(exporters)
+            self.sample_rate = sample_rate
+            if self.exporters and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chembl_trace_export', daemon=True)
+                self._thread.start()
+
+    def finish(self, span: Span):
+        if self._queue.qsize() > BATCH_SIZE * 20:
+            self.dropped += 1
+            return
+        self._queue.put(span)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            flush_at = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                try:
+                    span = self._queue.get(timeout=max(0.0, flush_at - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                self._export(batch)
+
+    def _export(self, batch: List[Span]):
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logging.warning(f"Could not export {len(batch)} spans with {type(exporter).__name__}: {str(e)}")
+
+    def shutdown(self):
+        """Export the spans still queued and stop the exporter thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=10)
+
+
+# Tracer of the server process
+tracer = Tracer()
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Time the enclosed block as a span, child of the current span if there is one
+
+    Without a current span a new trace is started, subject to sampling. When
+    tracing is off or the trace is not sampled this only costs a context
+    variable lookup and yields NOOP_SPAN.
+    """
+    parent = current_span.get()
+    if parent is None:
+        if not tracer.enabled:
+            yield NOOP_SPAN
+            return
+        if random.random() >= tracer.sample_rate:
+            # Keep the rest of the trace from starting traces of its own
+            token = current_span.set(NOOP_SPAN)
+            try:
+                yield NOOP_SPAN
+            finally:
+                current_span.reset(token)
+            return
+        trace_id = os.urandom(16).hex()
+        parent_id = None
+    elif not parent.sampled:
+        yield NOOP_SPAN
+        return
+    else:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    current = Span(name, trace_id, parent_id, attributes)
+    token = current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        current_span.reset(token)
+        current.end_ns = time.time_ns()
+        tracer.finish(current)
+
+
+def record_span(name: str, start_ns: int, **attributes):
+    """Record an already finished span, from start_ns until now, as a child of the current span"""
+    parent = current_span.get()
+    if parent is None or not parent.sampled:
+        return
+    finished = Span(name, parent.trace_id, parent.span_id, attributes)
+    finished.start_ns = start_ns
+    finished.end_ns = time.time_ns()
+    tracer.finish(finished)
+
+
+def queued(fn: Callable, *args) -> Callable[[], Any]:
+    """Wrap fn for a worker thread so the time it waits in the queue is recorded as an executor.wait span
+
+    The work also joins the profile of the current tool call, if it is being
+    profiled. The worker must run the wrapper in a copy of the caller's context.
+    """
+    work = in_profile(functools.partial(fn, *args))
+    parent = current_span.get()
+    if parent is None or not parent.sampled:
+        return work
+    submitted = time.time_ns()
+
+    def run():
+        record_span('executor.wait', submitted)
+        return work()
+    return run
@@ -0,0 +1,214 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import Counter
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+import time
+from chembl_metrics import Counters
+
+# Query log or scenario file the server warms its cache from when it starts; set from the server command line
+warm_path: Optional[str] = None
+
+# Most frequent distinct calls replayed when warming
+TOP_CALLS = 1000
+
+# Warm-up calls running at once
+CONCURRENCY = 4
+
+# Time budget of one warm-up call; larger than a client's, so that big results are fetched whole and cached
+CALL_BUDGET = 300.0
+
+# Set while a tool call is a warm-up call, so it is neither logged nor scheduled as a client's
+warming_call: contextvars.ContextVar[bool] = contextvars.ContextVar('warming_call', default=False)
+
+Call = Tuple[str, Dict[str, Any]]
+
+
+class QueryLog:
+    """Appends the tool calls a server answers to a JSON-lines file
+
+    Each line is {"time": ..., "tool": ..., "arguments": {...}}. Replaying
+    the most frequent calls of a production log warms a new server's cache.
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self, path: str):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self.path = path
+            self._file = open(path, 'a', buffering=1)
+
+    def record(self, tool: str, arguments: Dict[str, Any]):
+        if self._file is None or warming_call.get():
+            return
+        try:
+            line = json.dumps({'time': time.time(), 'tool': tool, 'arguments': arguments})
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_calls(path: str, top: int = TOP_CALLS) -> List[Call]:
+    """Read the calls to warm with from a query log or a load test scenario
+
+    A query log is ranked by how often each distinct call occurs. In a
+    scenario (see chembl_loadtest.py) every arguments object of every call
+    is used, calls of higher weight first.
+
+    Args:
+        path: JSON-lines query log or JSON scenario file
+        top: Most calls returned
+
+    Returns:
+        Distinct (tool, arguments) pairs, most important first
+    """
+    with open(path) as f:
+        text = f.read()
+    try:
+        scenario = json.loads(text)
+    except ValueError:
+        scenario = None
+    if isinstance(scenario, dict) and 'calls' in scenario:
+        calls = []
+        for call in sorted(scenario['calls'], key=lambda call: -call.get('weight', 1)):
+            arguments = call.get('arguments', {})
+            for each in arguments if isinstance(arguments, list) else [arguments]:
+                calls.append((call['tool'], each))
+        return _distinct(calls)[:top]
+    counts: Counter = Counter()
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            counts[(entry['tool'], json.dumps(entry.get('arguments', {}), sort_keys=True))] += 1
+        except (ValueError, KeyError, TypeError):
+            logging.warning(f"Skipping malformed line {number} of query log {path}")
+    return [(tool, json.loads(arguments)) for (tool, arguments), _ in counts.most_common(top)]
+
+
+def _distinct(calls: List[Call]) -> List[Call]:
+    seen = set()
+    distinct = []
+    for tool, arguments in calls:
+        key = (tool, json.dumps(arguments, sort_keys=True))
+        if key not in seen:
+            seen.add(key)
+            distinct.append((tool, arguments))
+    return distinct
+
+
+class Warmer:
+    """Replays tool calls in the background to fill the cache before clients need it
+
+    Warm-up calls go through the tools like client calls, under the
+    scheduler client 'warming', so they take their fair share of each lane
+    and never starve real clients. Calls to tools without a cache policy
+    are skipped, as their results would not be kept.
+    """
+
+    def __init__(self):
+        self.counters = Counters()
+        self.source: Optional[str] = None
+        self.total = 0
+        self.done = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.startup = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, calls: List[Call], call: Callable[[str, Dict[str, Any]], Awaitable[str]],
+              concurrency: int = CONCURRENCY, source: Optional[str] = None, startup: bool = False):
+        """Start replaying calls on the running event loop
+
+        Args:
+            calls: (tool, arguments) pairs, most important first
+            call: Runs one call and returns its outcome, e.g. 'warmed', 'partial' or 'skipped'
+            concurrency: Calls running at once
+            source: Where the calls came from, for status()
+            startup: Whether this is the warm-up of a starting server, which is not ready until it finishes
+        """
+        if self.running:
+            raise RuntimeError("A cache warm-up is already running")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.counters.reset()
+        self.source = source
+        self.startup = startup
+        self.total = len(calls)
+        self.done = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._task = asyncio.get_running_loop().create_task(self._run(calls, call, concurrency))
+
+    async def _run(self, calls: List[Call], call: Callable[[str, Dict[str, Any]], Awaitable[str]], concurrency: int):
+        token = warming_call.set(True)
+        pending = iter(calls)
+
+        async def worker():
+            for tool, arguments in pending:
+                try:
+                    outcome = await call(tool, arguments)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    outcome = 'error'
+                    logging.warning(f"Warm-up call {tool}({arguments}) failed: {str(e)}")
+                self.counters.increment(tool, outcome)
+                self.done += 1
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            logging.info(f"Cache warm-up from {self.source} finished: {self.done} calls in "
+                         f"{time.time() - self.started_at:.1f} seconds")
+        finally:
+            self.finished_at = time.time()
+            warming_call.reset(token)
+
+    def cancel(self) -> bool:
+        if not self.running:
+            return False
+        self._task.cancel()
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        by_tool = self.counters.snapshot()
+        totals: Dict[str, int] = {}
+        for outcomes in by_tool.values():
+            for outcome, count in outcomes.items():
+                totals[outcome] = totals.get(outcome, 0) + count
+        end = self.finished_at or time.time()
+        return {
+            'running': self.running,
+            'startup': self.startup,
+            'source': self.source,
+            'calls': self.total,
+            'done': self.done,
+            'seconds': round(end - self.started_at, 1) if self.started_at else None,
+            'totals': totals,
+            'tools': by_tool,
+        }
+
+
+# Query log and warmer of the server process
+query_log = QueryLog()
+warmer = Warmer()
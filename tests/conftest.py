@@ -0,0 +1,26 @@
+import os
+import sys
+import pytest
+
+# The server modules are top-level files in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def chembl_api():
+    """Point the ChEMBL client at an offline stand-in, without its HTTP cache
+
+    Modules that import chembl_webresource_client.new_client fetch the API
+    description on import, so tests import them only after requesting this.
+    """
+    import chembl_standin
+    server = chembl_standin.serve(port=0, molecules=200)
+    os.environ['CHEMBL_API_URL'] = chembl_standin.api_url(server)
+    os.environ['CHEMBL_HTTP_CACHE'] = '0'
+    import chembl_settings
+    from chembl_webresource_client.settings import Settings
+    Settings.Instance().NEW_CLIENT_URL = chembl_standin.api_url(server) + '/data'
+    Settings.Instance().UTILS_SPORE_URL = chembl_standin.api_url(server) + '/utils/spore'
+    Settings.Instance().CACHING = False
+    yield chembl_standin.api_url(server)
+    server.shutdown()
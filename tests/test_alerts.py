@@ -0,0 +1,112 @@
+import pytest
+
+pytest.importorskip('rdkit')
+
+import chembl_alerts
+from chembl_alerts import AlertEngine, MIN_LIBRARY_BATCH
+
+ALERTS = [
+    {'alert_id': 1, 'alert_name': 'Carboxylic acid', 'set_name': 'Glaxo', 'priority': 1, 'smarts': 'C(=O)[OX2H1]'},
+    {'alert_id': 2, 'alert_name': 'Ester', 'set_name': 'Glaxo', 'priority': 1, 'smarts': '[CX3](=O)[OX2][#6]'},
+    {'alert_id': 3, 'alert_name': 'Nitro group', 'set_name': 'PAINS', 'priority': 2, 'smarts': '[N+](=O)[O-]'},
+    {'alert_id': 4, 'alert_name': 'Aldehyde', 'set_name': 'Dundee', 'priority': 3, 'smarts': '[CX3H1](=O)[#6]'},
+    {'alert_id': 5, 'alert_name': 'Broken', 'set_name': 'Dundee', 'priority': 3, 'smarts': 'C(('},
+]
+
+# SMILES and the IDs of the alerts they match
+MOLECULES = {
+    'CC(=O)Oc1ccccc1C(=O)O': [1, 2],  # aspirin
+    'CCO': [],
+    'O=[N+]([O-])c1ccccc1': [3],
+    'O=Cc1ccccc1': [4],
+    'C[C@H](N)C(=O)O': [1],  # L-alanine; stereochemistry is ignored
+    'CCCCCC': [],
+}
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return AlertEngine(ALERTS, 'CHEMBL_35')
+
+
+def ids(alerts):
+    return [alert['alert_id'] for alert in alerts]
+
+
+def test_invalid_smarts_are_skipped(engine):
+    assert engine.info() == {'release': 'CHEMBL_35', 'alerts': 4, 'sets': {'Glaxo': 2, 'PAINS': 1, 'Dundee': 1},
+                             'invalid_smarts': 1}
+    assert ids(engine.invalid) == [5]
+
+
+@pytest.mark.parametrize('smiles, expected', MOLECULES.items())
+def test_screen_hits_and_misses(engine, smiles, expected):
+    alerts = engine.screen(smiles)
+    assert ids(alerts) == expected
+    for alert in alerts:
+        assert set(alert) == set(chembl_alerts.ALERT_FIELDS)
+
+
+def test_screen_selected_sets(engine):
+    assert ids(engine.screen('CC(=O)Oc1ccccc1C(=O)O', ['PAINS'])) == []
+    assert ids(engine.screen('O=[N+]([O-])c1ccccc1', ['PAINS', 'Dundee'])) == [3]
+
+
+def test_unknown_sets_raise(engine):
+    with pytest.raises(ValueError, match='Unknown alert set'):
+        engine.screen('CCO', ['Glaxo', 'Nonexistent'])
+    with pytest.raises(ValueError, match='Unknown alert set'):
+        engine.screen_many(['CCO'], ['Nonexistent'])
+
+
+def test_invalid_smiles(engine):
+    with pytest.raises(ValueError, match='Invalid SMILES'):
+        engine.screen('not a molecule')
+    results = engine.screen_many(['CCO', 'not a molecule', 'O=Cc1ccccc1'])
+    assert results[1] == {'smiles': 'not a molecule', 'error': 'Invalid SMILES'}
+    assert ids(results[2]['alerts']) == [4]
+
+
+@pytest.mark.parametrize('count', [MIN_LIBRARY_BATCH // 2, MIN_LIBRARY_BATCH, 5 * MIN_LIBRARY_BATCH])
+@pytest.mark.parametrize('sets', [None, ['Glaxo']])
+def test_screen_many_agrees_with_screen(engine, monkeypatch, count, sets):
+    # Small libraries, so that large batches span several of them
+    monkeypatch.setattr(chembl_alerts, 'LIBRARY_SIZE', 2 * MIN_LIBRARY_BATCH)
+    smiles = [list(MOLECULES)[i % len(MOLECULES)] for i in range(count)] + ['not a molecule']
+    results = engine.screen_many(smiles, sets, threads=2)
+    assert [result['smiles'] for result in results] == smiles
+    for result in results[:-1]:
+        assert result['alerts'] == engine.screen(result['smiles'], sets)
+    assert 'error' in results[-1]
+
+
+def test_engine_from_alerts_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'alerts.json')
+    chembl_alerts.write_alerts(path, {'release': 'CHEMBL_35', 'alerts': ALERTS})
+    monkeypatch.setattr(chembl_alerts, 'alerts_path', path)
+    monkeypatch.setattr(chembl_alerts, '_engine', None)
+    monkeypatch.setattr(chembl_alerts, 'local_single', False)
+    assert not chembl_alerts.local_alerts_available()
+    monkeypatch.setattr(chembl_alerts, 'local_single', True)
+    assert chembl_alerts.local_alerts_available()
+    assert ids(chembl_alerts.get_engine().screen('CC(=O)Oc1ccccc1C(=O)O')) == [1, 2]
+
+
+def test_alerts_from_sqlite(tmp_path):
+    import sqlite3
+    path = str(tmp_path / 'chembl.db')
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE structural_alert_sets (alert_set_id INTEGER, set_name TEXT, priority INTEGER);
+        CREATE TABLE structural_alerts (alert_id INTEGER, alert_set_id INTEGER, alert_name TEXT, smarts TEXT);
+        CREATE TABLE version (name TEXT);
+        INSERT INTO structural_alert_sets VALUES (1, 'Glaxo', 1), (2, 'PAINS', 2);
+        INSERT INTO structural_alerts VALUES (2, 1, 'Ester', '[CX3](=O)[OX2][#6]'), (3, 2, 'Nitro group', '[N+](=O)[O-]');
+        INSERT INTO version VALUES ('ChEMBL_35');
+    """)
+    connection.commit()
+    connection.close()
+    document = chembl_alerts.alerts_from_sqlite(path)
+    assert document['release'] == 'ChEMBL_35'
+    assert [(a['alert_id'], a['set_name']) for a in document['alerts']] == [(2, 'Glaxo'), (3, 'PAINS')]
+    assert ids(AlertEngine(document['alerts']).screen('O=[N+]([O-])c1ccccc1')) == [3]
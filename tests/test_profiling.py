@@ -0,0 +1,51 @@
+import asyncio
+import os
+import time
+import tracemalloc
+import chembl_profiling
+from chembl_profiling import Profiler
+
+
+def test_overlapping_memory_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(chembl_profiling, 'profile_dir', str(tmp_path))
+    profiler = Profiler()
+    profiler.arm('tool', 'sampling', calls=2, memory=True)
+    assert not tracemalloc.is_tracing()
+
+    async def call(delay, duration):
+        await asyncio.sleep(delay)
+        with profiler.profile_call('tool'):
+            data = [bytes(1000) for _ in range(100)]
+            await asyncio.sleep(duration)
+        return len(data)
+
+    async def main():
+        # The first call ends while the second is still running
+        results = await asyncio.gather(call(0, 0.05), call(0.02, 0.2))
+        deadline = time.monotonic() + 10
+        while len(profiler.status()['written']) < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        return results
+
+    assert asyncio.run(main()) == [100, 100]
+    written = profiler.status()['written']
+    assert len(written) == 2
+    for run in written:
+        assert [os.path.splitext(path)[1] for path in run['files']][-2:] == ['.tracemalloc', '.txt']
+        assert all(os.path.exists(path) for path in run['files'])
+    reports = sorted(open(run['files'][-1]).readline() for run in written)
+    assert any('during the call' in line for line in reports)
+    assert any('overlapping' in line for line in reports)
+    assert not tracemalloc.is_tracing()
+
+
+def test_write_errors_do_not_fail_the_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(chembl_profiling, 'profile_dir', str(tmp_path / 'file'))
+    (tmp_path / 'file').write_text('not a directory')
+    profiler = Profiler()
+    profiler.arm('tool', memory=True)
+    with profiler.profile_call('tool'):
+        result = sum(range(1000))
+    assert result == 499500
+    assert profiler.status()['written'][0]['files'] == []
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,151 @@
+import multiprocessing
+import pytest
+from chembl_shared_cache import SharedCache, _RECORD, _key_bytes
+
+SIZE = 2 * 1024 * 1024
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'shared_cache')
+
+
+@pytest.fixture
+def cache(path):
+    cache = SharedCache(path, SIZE)
+    yield cache
+    cache.close()
+
+
+def test_put_and_get(cache):
+    assert cache.get(('example_drug', 'CHEMBL25')) is None
+    assert cache.put(('example_drug', 'CHEMBL25'), {'name': 'ASPIRIN'}, 2e9, '35')
+    assert cache.get(('example_drug', 'CHEMBL25')) == (2e9, '35', {'name': 'ASPIRIN'})
+    assert cache.get(('example_drug', 'CHEMBL1')) is None
+    counters = cache.stats()['counters']
+    assert counters['hit'] == 1 and counters['miss'] == 2 and counters['store'] == 1
+
+
+def test_overwrite_returns_latest_value(cache):
+    cache.put(('k',), 1, 2e9, '34')
+    cache.put(('k',), 2, 2e9, '35')
+    assert cache.get(('k',)) == (2e9, '35', 2)
+    assert cache.stats()['entries'] == 1
+
+
+def test_expired_records_are_ignored(cache):
+    cache.put(('k',), 'v', 1000.0, None)
+    assert cache.get(('k',), not_before=999.0) == (1000.0, None, 'v')
+    assert cache.get(('k',), not_before=1001.0) is None
+
+
+def test_wrap_evicts_oldest_records(cache):
+    value = b'x' * (100 * 1024)
+    keys = [('big', i) for i in range(40)]
+    for key in keys:
+        assert cache.put(key, value, 2e9, None)
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) == (2e9, None, value)
+    live = [key for key in keys if cache.get(key) is not None]
+    # Only the most recent ring's worth survive, and they are the newest keys
+    assert live == keys[-len(live):]
+    assert len(live) * len(value) <= cache.data_size
+    assert cache.stats()['written'] == len(keys)
+
+
+def test_too_large_and_unpicklable_values_are_refused(cache):
+    assert not cache.put(('large',), b'x' * cache.max_value, 2e9, None)
+    assert not cache.put(('lambda',), lambda: None, 2e9, None)
+    assert cache.get(('large',)) is None and cache.get(('lambda',)) is None
+
+
+def test_discard_and_clear(cache):
+    cache.put(('a',), 1, 2e9, None)
+    cache.put(('b',), 2, 2e9, None)
+    assert cache.discard(('a',))
+    assert not cache.discard(('a',))
+    assert cache.get(('a',)) is None
+    assert cache.get(('b',)) == (2e9, None, 2)
+    cache.clear()
+    assert cache.get(('b',)) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_corrupted_record_fails_crc(cache):
+    key = ('example_drug', 'CHEMBL25')
+    cache.put(key, 'ASPIRIN' * 10, 2e9, None)
+    # The only record starts at the beginning of the data area; flip the last byte of its payload
+    _, key_length, payload_length, _, _ = _RECORD.unpack_from(cache._map, cache._data)
+    assert key_length == len(_key_bytes(key))
+    last = cache._data + _RECORD.size + key_length + payload_length - 1
+    cache._map[last] ^= 0xFF
+    assert cache.get(key) is None
+
+
+def test_existing_file_keeps_its_size(path, cache):
+    other = SharedCache(path, SIZE * 4)
+    try:
+        assert (other.slots, other.data_size) == (cache.slots, cache.data_size)
+    finally:
+        other.close()
+
+
+def test_not_a_cache_file(tmp_path):
+    path = tmp_path / 'other'
+    path.write_bytes(b'not a cache' + bytes(4096))
+    with pytest.raises(ValueError):
+        SharedCache(str(path))
+
+
+def _writer(path, worker, count):
+    cache = SharedCache(path)
+    for i in range(count):
+        cache.put(('worker', worker, i), {'worker': worker, 'i': i, 'payload': 'y' * (i % 500)}, 2e9, '35')
+    cache.close()
+
+
+def _reader(path, workers, count, results):
+    cache = SharedCache(path)
+    seen = bad = 0
+    for _ in range(3):
+        for worker in range(workers):
+            for i in range(count):
+                found = cache.get(('worker', worker, i))
+                if found is None:
+                    continue
+                seen += 1
+                if found[2] != {'worker': worker, 'i': i, 'payload': 'y' * (i % 500)}:
+                    bad += 1
+    cache.close()
+    results.put((seen, bad))
+
+
+def test_processes_share_entries(path, cache):
+    context = multiprocessing.get_context('spawn')
+    workers, count = 3, 300
+    results = context.Queue()
+    processes = [context.Process(target=_writer, args=(path, worker, count)) for worker in range(workers)]
+    processes.append(context.Process(target=_reader, args=(path, workers, count, results)))
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    _, bad = results.get(timeout=10)
+    # Readers racing the writers never see a torn or mismatched record
+    assert bad == 0
+    assert cache.stats()['written'] == workers * count
+    for worker in range(workers):
+        for i in range(count):
+            found = cache.get(('worker', worker, i))
+            assert found is None or found[2] == {'worker': worker, 'i': i, 'payload': 'y' * (i % 500)}
+
+
+def test_index_holds_a_ring_of_records_of_the_expected_size(cache):
+    # Records of about RECORD_SIZE bytes; the keys hash the same in every run
+    keys = [('example_canonicalizeSmiles', f'CC(=O)Oc1ccccc1C(=O)O {i}') for i in range(8000)]
+    for key in keys:
+        assert cache.put(key, 'C' * 20, 2e9, None)
+    assert cache.stats()['bytes_used'] < cache.data_size
+    assert all(cache.get(key) is not None for key in keys)
+    assert cache.stats()['entries'] == len(keys)
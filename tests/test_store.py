@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+import chembl_store
+from chembl_store import ResultStore
+
+
+class FakeQuery:
+    """Records an entity query would return; fetches block while gate is clear"""
+
+    def __init__(self, records):
+        self.records = records
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fetches = 0
+
+
+def fake_fetch_into(queryset, append, start=0, stop=None, page_size=2, fan_out=1, on_total=None):
+    queryset.fetches += 1
+    assert queryset.gate.wait(10)
+    total = len(queryset.records)
+    if on_total is not None:
+        on_total(total)
+    end = total if stop is None else min(stop, total)
+    for offset in range(start, end, page_size):
+        append(queryset.records[offset:min(offset + page_size, end)])
+    return total
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(chembl_store, 'fetch_into', fake_fetch_into)
+    store = ResultStore()
+    store.set_release('CHEMBL_34')
+    yield store
+    store.close()
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_same_key_reuses_the_result_set(store):
+    query = FakeQuery([{'id': i} for i in range(5)])
+    first = store.open('key', query)
+    first.fill()
+    assert store.open('key', query) is first
+    assert first.read() == query.records and first.complete and not first.stale
+    assert store.get(first.cursor) is first
+
+
+def test_complete_old_release_is_served_until_the_new_one_is_complete(store):
+    old_query = FakeQuery([{'id': i, 'release': 34} for i in range(5)])
+    old = store.open('key', old_query)
+    old.fill()
+    store.set_release('CHEMBL_35')
+    new_query = FakeQuery([{'id': i, 'release': 35} for i in range(7)])
+    new_query.gate.clear()
+
+    served = store.open('key', new_query)
+    assert served is old
+    assert served.stale and served.info()['stale']
+    assert served.read() == old_query.records
+    # A second query while the refresh runs neither starts another one nor gets partial records
+    assert store.open('key', new_query) is old
+    new_query.gate.set()
+    wait_for(lambda: store.open('key', new_query) is not old)
+
+    current = store.open('key', new_query)
+    assert current.complete and not current.stale
+    assert current.read() == new_query.records
+    assert new_query.fetches == 1
+    # The old cursor stays readable until it expires
+    assert store.get(old.cursor).read() == old_query.records
+
+
+def test_incomplete_old_release_is_replaced_at_once(store):
+    query = FakeQuery([{'id': i} for i in range(10)])
+    old = store.open('key', query)
+    old.fill(stop=4)
+    store.set_release('CHEMBL_35')
+    new = store.open('key', query)
+    assert new is not old and not new.stale and len(new) == 0
+
+
+def test_refresh_replaces_at_once(store):
+    query = FakeQuery([{'id': 1}])
+    old = store.open('key', query)
+    old.fill()
+    assert store.open('key', query, refresh=True) is not old
+
+
+def test_failed_refresh_keeps_serving_the_old_set(store, monkeypatch):
+    query = FakeQuery([{'id': 1}])
+    old = store.open('key', query)
+    old.fill()
+    store.set_release('CHEMBL_35')
+    failed = threading.Event()
+
+    def failing_fetch(*args, **kwargs):
+        failed.set()
+        raise ConnectionError('upstream down')
+    monkeypatch.setattr(chembl_store, 'fetch_into', failing_fetch)
+    assert store.open('key', query) is old
+    assert failed.wait(10)
+    wait_for(lambda: not store._refreshing)
+    assert store.open('key', query) is old
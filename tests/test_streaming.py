@@ -0,0 +1,94 @@
+import json
+import pytest
+from chembl_streaming import CollectionDecoder, iter_collection, projection
+
+RECORDS = [
+    {'molecule_chembl_id': 'CHEMBL25', 'pref_name': 'ASPIRIN', 'molecule_properties': {'full_mwt': '180.16'}},
+    {'molecule_chembl_id': 'CHEMBL1', 'pref_name': None, 'max_phase': 4, 'synonyms': ['a', 'b']},
+    {'molecule_chembl_id': 'CHEMBL2', 'pref_name': 'Ünïcödé — 日本', 'molecule_properties': None},
+]
+META = {'limit': 3, 'offset': 0, 'total_count': 1234, 'next': None, 'previous': None}
+
+
+def body(**members) -> bytes:
+    return json.dumps(members, indent=1, ensure_ascii=False).encode('utf-8')
+
+
+def decode(chunks, collection='molecules'):
+    decoder = CollectionDecoder(collection)
+    return list(iter_collection(chunks, decoder)), decoder
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 1 << 20])
+def test_records_and_meta_across_chunk_boundaries(size):
+    data = body(molecules=RECORDS, page_meta=META)
+    records, decoder = decode(split(data, size))
+    assert records == RECORDS
+    assert decoder.meta == {'page_meta': META}
+    assert decoder.count == len(RECORDS)
+    assert decoder.done
+
+
+def test_every_split_point():
+    # Includes splits inside multi-byte characters, keys, strings and numbers
+    data = body(molecules=RECORDS, page_meta=META)
+    for cut in range(1, len(data)):
+        records, decoder = decode([data[:cut], data[cut:]])
+        assert records == RECORDS, cut
+        assert decoder.meta == {'page_meta': META}, cut
+
+
+def test_members_in_any_order():
+    data = body(page_meta=META, molecules=RECORDS, extra=12345)
+    records, decoder = decode(split(data, 5))
+    assert records == RECORDS
+    assert decoder.meta == {'page_meta': META, 'extra': 12345}
+
+
+def test_number_at_chunk_end_waits_for_the_rest():
+    records, decoder = decode([b'{"molecules": [], "total": 12', b'34}'])
+    assert records == []
+    assert decoder.meta == {'total': 1234}
+
+
+def test_empty_collection():
+    records, decoder = decode([b'{"molecules":[],"page_meta":{}}'])
+    assert records == []
+    assert decoder.count == 0
+    assert decoder.done
+
+
+def test_records_are_yielded_as_they_complete():
+    decoder = CollectionDecoder('molecules')
+    assert list(decoder.feed('{"molecules": [{"a": 1}, {"a"')) == [{'a': 1}]
+    assert list(decoder.feed(': 2}')) == [{'a': 2}]
+    assert list(decoder.feed(']}', final=True)) == []
+    assert decoder.done
+
+
+@pytest.mark.parametrize('cut', [1, 20, 100, -30, -2, -1])
+def test_truncated_body_raises(cut):
+    data = body(molecules=RECORDS, page_meta=META)
+    with pytest.raises(ValueError):
+        decode(split(data[:cut], 16))
+
+
+def test_not_a_collection_raises():
+    with pytest.raises(ValueError):
+        decode([b'[{"a": 1}]'])
+
+
+def test_content_after_the_document_raises():
+    with pytest.raises(ValueError):
+        decode([b'{"molecules": []} {}'])
+
+
+def test_projection_keeps_top_level_fields_of_lookups():
+    project = projection(['molecule_chembl_id', 'molecule_properties__full_mwt'])
+    assert project(RECORDS[0]) == {'molecule_chembl_id': 'CHEMBL25', 'molecule_properties': {'full_mwt': '180.16'}}
+    assert project({'pref_name': 'X'}) == {}
+    assert projection(None) is None
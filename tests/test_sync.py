@@ -0,0 +1,112 @@
+import json
+import numpy as np
+import pytest
+
+PREVIOUS, RELEASE = 'CHEMBL_34', 'CHEMBL_35'
+ALL_SOURCES = ['molecule', 'drug', 'target', 'drug_indication']
+
+
+@pytest.fixture
+def stores(chembl_api, tmp_path, monkeypatch):
+    """A property table and fuzzy index of three molecules at PREVIOUS, served from tmp_path"""
+    import chembl_fuzzy
+    import chembl_properties
+    import chembl_sync
+    monkeypatch.setattr(chembl_properties, 'table_dir', str(tmp_path / 'table'))
+    monkeypatch.setattr(chembl_fuzzy, 'index_path', str(tmp_path / 'index.json.gz'))
+    monkeypatch.setattr(chembl_sync, 'feed_dir', None)
+    # Restored afterwards, so the stores of one test are not served to the next
+    monkeypatch.setattr(chembl_properties, '_table', None)
+    monkeypatch.setattr(chembl_fuzzy, '_index', None)
+    ids = np.array([b'CHEMBL_M1', b'CHEMBL_M2', b'CHEMBL_M3'])
+    columns = {'full_mwt': np.array([100, 200, 300], dtype=np.float32),
+               'alogp': np.array([1, 2, 3], dtype=np.float32)}
+    chembl_properties.install_table(chembl_properties.write_table(chembl_properties.table_dir, ids, columns, PREVIOUS))
+    index = chembl_fuzzy.FuzzyIndex.from_records([('ASPIRIN', 'compound', 'CHEMBL_M1'),
+                                                  ('CAFFEINE', 'compound', 'CHEMBL_M2'),
+                                                  ('IBUPROFEN', 'compound', 'CHEMBL_M3')], PREVIOUS)
+    index.save(chembl_fuzzy.index_path)
+    chembl_fuzzy.install_index(index)
+    return chembl_sync
+
+
+def write_feed(path, resources, changes):
+    with open(path, 'w') as f:
+        f.write(json.dumps({'previous_release': PREVIOUS, 'release': RELEASE, 'resources': resources}) + '\n')
+        for change in changes:
+            f.write(json.dumps(change) + '\n')
+    return str(path)
+
+
+CHANGES = [
+    {'resource': 'molecule', 'op': 'insert', 'id': 'CHEMBL_M4',
+     'record': {'molecule_chembl_id': 'CHEMBL_M4', 'pref_name': 'PARACETAMOL',
+                'molecule_properties': {'full_mwt': '151.16', 'alogp': '0.51'}}},
+    {'resource': 'molecule', 'op': 'update', 'id': 'CHEMBL_M1',
+     'record': {'molecule_chembl_id': 'CHEMBL_M1', 'pref_name': 'ACETYLSALICYLIC ACID',
+                'molecule_properties': {'full_mwt': '180.16', 'alogp': '1.31'}},
+     'previous': {'molecule_chembl_id': 'CHEMBL_M1', 'pref_name': 'ASPIRIN'}},
+    {'resource': 'molecule', 'op': 'delete', 'id': 'CHEMBL_M2',
+     'previous': {'molecule_chembl_id': 'CHEMBL_M2', 'pref_name': 'CAFFEINE'}},
+]
+
+
+def test_insert_update_delete_round_trip(stores, tmp_path):
+    import chembl_fuzzy
+    import chembl_properties
+    from chembl_cache import cache
+    cache.clear()
+    cache.set_release(PREVIOUS)
+    cache.set(('molecule', 'molecule_chembl_id', 'CHEMBL_M1', None), 'changed')
+    cache.set(('molecule', 'molecule_chembl_id', 'CHEMBL_M3', None), 'unchanged')
+    try:
+        result = stores.Syncer().apply(write_feed(tmp_path / 'feed.jsonl', ALL_SOURCES, CHANGES))
+        assert result['stores']['property_table'] == {'inserted': 1, 'updated': 1, 'deleted': 1, 'generation': 2}
+        assert result['stores']['fuzzy_index']['generation'] == 2
+        assert result['cache'] == {'carried_over': 1, 'dropped': 1}
+
+        table = chembl_properties.PropertyTable(chembl_properties.table_dir)
+        assert table.release == RELEASE
+        records = {r['molecule_chembl_id']: r for r in table.records(np.arange(len(table)))}
+        assert set(records) == {'CHEMBL_M1', 'CHEMBL_M3', 'CHEMBL_M4'}
+        assert records['CHEMBL_M1']['full_mwt'] == pytest.approx(180.16, abs=1e-3)
+        assert records['CHEMBL_M3']['full_mwt'] == 300
+        assert records['CHEMBL_M4']['alogp'] == pytest.approx(0.51, abs=1e-3)
+
+        index = chembl_fuzzy.get_index()
+        assert index.release == RELEASE
+        names = {name: ids for name, _, ids in index.names}
+        assert names['PARACETAMOL'] == ['CHEMBL_M4']
+        assert names['ACETYLSALICYLIC ACID'] == ['CHEMBL_M1']
+        assert 'ASPIRIN' not in names and 'CAFFEINE' not in names
+        assert names['IBUPROFEN'] == ['CHEMBL_M3']
+
+        cache.set_release(RELEASE)
+        assert cache.lookup(('molecule', 'molecule_chembl_id', 'CHEMBL_M3', None)) == ('unchanged', True)
+        assert cache.get(('molecule', 'molecule_chembl_id', 'CHEMBL_M1', None)) is None
+    finally:
+        cache.clear()
+
+
+def test_partial_feed_leaves_uncovered_stores_alone(stores, tmp_path):
+    import chembl_fuzzy
+    import chembl_properties
+    target = {'resource': 'target', 'op': 'update', 'id': 'CHEMBL_T1',
+              'record': {'target_chembl_id': 'CHEMBL_T1', 'pref_name': 'Renamed target'}}
+    result = stores.Syncer().apply(write_feed(tmp_path / 'feed.jsonl', ['target'], [target] + CHANGES))
+    assert result['stores']['property_table'] == {'skipped': 'feed does not cover molecule'}
+    assert result['stores']['fuzzy_index'] == {'skipped': 'feed does not cover molecule, drug, drug_indication'}
+    assert chembl_properties.PropertyTable(chembl_properties.table_dir).release == PREVIOUS
+    assert chembl_properties.table_generation(chembl_properties.table_dir) == 1
+    assert chembl_fuzzy.index_meta(chembl_fuzzy.index_path) == {'release': PREVIOUS, 'generation': 1}
+    assert stores.Syncer().store_releases() == {'property_table': PREVIOUS, 'fuzzy_index': PREVIOUS}
+
+
+def test_store_at_another_release_is_skipped(stores, tmp_path):
+    path = tmp_path / 'feed.jsonl'
+    write_feed(path, ALL_SOURCES, CHANGES)
+    text = path.read_text().replace(PREVIOUS, 'CHEMBL_33', 1)
+    path.write_text(text)
+    result = stores.Syncer().apply(str(path))
+    assert result['stores'] == {'property_table': {'skipped': f'holds release {PREVIOUS}'},
+                                'fuzzy_index': {'skipped': f'holds release {PREVIOUS}'}}